@@ -4,7 +4,7 @@ Add sample assessment questions for A01 - Broken Access Control
 """
 
 from database_postgresql import get_db_connection, get_dict_cursor
-import json
+from psycopg2.extras import Json, execute_values
 
 def add_sample_questions():
     """Add sample assessment questions for A01"""
@@ -81,21 +81,17 @@ def add_sample_questions():
             }
         ]
         
-        # Insert questions
+        # Insert all questions in one multi-row INSERT
         for i, q in enumerate(questions):
             print(f"Inserting question {i+1}: {q['question_text'][:50]}...")
-            cursor.execute('''
-                INSERT INTO assessment_questions 
-                (module_id, question_text, options, correct_answer, points, is_active)
-                VALUES (%s, %s, %s, %s, %s, TRUE)
-            ''', (
-                q['module_id'],
-                q['question_text'],
-                json.dumps(q['options']),
-                q['correct_answer'],
-                q['points']
-            ))
-            print(f"✓ Question {i+1} inserted successfully")
+        execute_values(cursor, '''
+            INSERT INTO assessment_questions 
+            (module_id, question_text, options, correct_answer, points, is_active)
+            VALUES %s
+        ''', [
+            (q['module_id'], q['question_text'], Json(q['options']), q['correct_answer'], q['points'])
+            for q in questions
+        ], template='(%s, %s, %s, %s, %s, TRUE)')
         
         conn.commit()
         print(f"✅ Added {len(questions)} sample questions for A01")
@@ -1,22 +1,37 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, session, flash, make_response, send_from_directory, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, make_response, send_from_directory, jsonify, g
 from functools import wraps
+from itertools import cycle, islice
 from datetime import datetime
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import FileSystemBytecodeCache
 import hashlib, sqlite3, json, os, io, textwrap, requests, re  # requests used in SSRF lab (intentionally)
+import markdown
+import atexit, logging, queue
+from logging.handlers import QueueHandler, QueueListener
+try:
+    import orjson  # Faster JSON encoding for API responses
+except ImportError:
+    orjson = None
 from data import DEFAULT_QUESTIONS  # Keep for fallback
+from data import MODULES as FALLBACK_MODULES  # Used when the database has no modules
 from database_postgresql import get_all_learning_modules, get_learning_module_by_id
 from config import Config
+from cache_utils import TTLCache
 from database_postgresql import (
-    init_database, create_user, authenticate_user, authenticate_admin,
+    init_database, create_user, authenticate_user, authenticate_admin, get_admin_by_id,
     get_user_by_id, get_user_by_username, get_user_progress, mark_module_completed,
     get_all_users, delete_user, reset_user_progress, reset_all_users_progress, log_activity,
     create_user_enhanced, get_user_by_email, update_user_password,
-    record_learning_activity, get_documentation_by_module, get_all_documentation,
+    record_learning_activity, get_documentation_by_module, get_all_documentation, invalidate_documentation_cache,
     update_documentation_progress, get_user_documentation_progress, complete_learning_activity,
-    get_assessment_questions, create_assessment_attempt, complete_assessment_attempt,
+    get_assessment_questions, grade_quiz_answers, create_assessment_attempt, complete_assessment_attempt,
     get_user_assessment_attempts, get_assessment_statistics, start_module_tracking,
     award_module_badge, get_user_badges, get_module_badges,
-    is_module_completed, get_next_module_id, unlock_next_module
+    is_module_completed, get_next_module_id, unlock_next_module, get_leaderboard_rankings, start_leaderboard_refresher,
+    get_module_completion_details, get_completed_module_ids, empty_module_completion,
+    get_db_connection, get_dict_cursor, get_animations_by_module, get_user_gamification_data
 )
 from auth_security import (
     PasswordPolicy, AuthSecurity, EmailService, 
@@ -45,14 +60,13 @@ def get_modules():
                 })
             return modules
     except Exception as e:
+        # Runs at import time, before the app logger exists
         print(f"Warning: Could not load modules from database: {e}")
         # Fallback to hardcoded data
-        from data import MODULES
-        return MODULES
+        return FALLBACK_MODULES
     
     # If no modules found, return hardcoded data
-    from data import MODULES
-    return MODULES
+    return FALLBACK_MODULES
 
 def get_module_by_id(module_id):
     """Get single module by ID from database with fallback"""
@@ -69,18 +83,93 @@ def get_module_by_id(module_id):
                 "labAvailable": db_module.get("lab_available", True)
             }
     except Exception as e:
-        print(f"Warning: Could not load module {module_id} from database: {e}")
+        app.logger.warning("Could not load module %s from database: %s", module_id, e)
     
     # Fallback to hardcoded data
-    from data import MODULES
-    return next((m for m in MODULES if m["id"] == module_id), None)
+    return next((m for m in FALLBACK_MODULES if m["id"] == module_id), None)
 
 # Update MODULES to use database
 MODULES = get_modules()  # Load from database
+MODULE_IDS_ORDERED = tuple(module["id"] for module in MODULES)
+MODULE_IDS = frozenset(MODULE_IDS_ORDERED)
+NEXT_MODULE_ID = dict(zip(MODULE_IDS_ORDERED, MODULE_IDS_ORDERED[1:]))
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, used by jsonify() and dict/list responses"""
+
+    @staticmethod
+    def _default(obj):
+        """Encode types orjson does not handle natively"""
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return DefaultJSONProvider.default(obj)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self._default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
 app.secret_key = Config.SECRET_KEY
 
+if orjson is not None:
+    app.json = OrjsonJSONProvider(app)
+else:
+    app.json.compact = True
+
+# Logging: records go straight to stderr until the serving entry point calls
+# start_log_listener(); from then on request threads only enqueue records and
+# formatting and stream I/O happen on the listener thread
+_APP_LOGGERS = (app.logger, logging.getLogger('auth_security'), logging.getLogger('database_postgresql'), logging.getLogger('module_manager'))
+_log_queue = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s'))
+_log_listener = None
+for _logger in _APP_LOGGERS:
+    _logger.handlers.clear()
+    _logger.addHandler(_log_stream_handler)
+    _logger.setLevel(logging.DEBUG if Config.DEBUG else logging.INFO)
+    _logger.propagate = False
+
+def start_log_listener():
+    """Hand app logging to a background listener thread (call once from the server entry point)"""
+    global _log_listener
+    if _log_listener is not None:
+        return
+    _log_listener = QueueListener(_log_queue, _log_stream_handler)
+    _log_listener.start()
+    for _logger in _APP_LOGGERS:
+        _logger.handlers[:] = [QueueHandler(_log_queue)]
+
+def _restart_log_listener_after_fork():
+    """The listener thread doesn't survive fork(); give each forked worker its own"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener = QueueListener(_log_queue, _log_stream_handler)
+        _log_listener.start()
+
+def _stop_log_listener():
+    """Flush queued records on exit"""
+    if _log_listener is not None:
+        _log_listener.stop()
+
+os.register_at_fork(after_in_child=_restart_log_listener_after_fork)
+atexit.register(_stop_log_listener)
+
+# Let a fronting proxy (nginx/Apache) stream files instead of the worker
+app.config['USE_X_SENDFILE'] = Config.USE_X_SENDFILE
+
+# Template caching: only re-check templates on disk while developing
+app.config['TEMPLATES_AUTO_RELOAD'] = Config.DEBUG
+app.jinja_env.auto_reload = Config.DEBUG
+if not Config.DEBUG:
+    try:
+        os.makedirs(Config.JINJA_CACHE_DIR, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(Config.JINJA_CACHE_DIR)
+    except OSError as e:
+        app.logger.warning("Jinja bytecode cache disabled: %s", e)
+
 # Register custom Jinja2 filters
 @app.template_filter('from_json')
 def from_json_filter(value):
@@ -128,25 +217,22 @@ def internal_flag():
 # Helpers
 # --------------------------------
 def current_user():
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    return get_user_by_id(user_id)
+    """Return the logged-in user, loading it at most once per request"""
+    if "user" not in g:
+        user_id = session.get("user_id")
+        g.user = get_user_by_id(user_id) if user_id else None
+    return g.user
 
 def current_admin():
     admin_id = session.get("admin_id")
     if not admin_id:
         return None
-    # For admin, we'll use a simple lookup since we have fewer admins
-    from database_postgresql import get_db_connection
-    import psycopg2.extras
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cursor.execute('SELECT id, username, name, role FROM admins WHERE id = %s', (admin_id,))
-    admin = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return dict(admin) if admin else None
+    # Served from a short-lived in-process cache shared by every request, so hand
+    # out a copy (never carrying password_hash) that callers are free to modify
+    admin = get_admin_by_id(admin_id)
+    if not admin:
+        return None
+    return {key: value for key, value in admin.items() if key != 'password_hash'}
 
 # Import dynamic module management functions
 from module_manager import (
@@ -204,6 +290,29 @@ def award_xp(module_id):
         flash(f" Lab completed! +75 XP earned", "ok")
         log_activity(user_id, f"Completed {module_id} lab", f"Earned 75 XP", request.remote_addr)
 
+def json_response(payload, status=200):
+    """Serialize an API payload with an explicit status code"""
+    return app.response_class(app.json.dumps(payload), status=status, mimetype='application/json')
+
+# Rendered module page bodies keyed by (template, module_id). The body only
+# depends on module/documentation data, so it is rendered once and reused;
+# the TTL bounds how long other workers serve a body after an admin edit.
+MODULE_FRAGMENT_CACHE = TTLCache(ttl_seconds=Config.DOCUMENTATION_CACHE_TTL)
+
+def render_module_fragment(template_name, module_id, load_context):
+    """Render a static module body once per module and reuse it"""
+    key = (template_name, module_id)
+    html = MODULE_FRAGMENT_CACHE.get(key)
+    if html is None:
+        html = render_template(template_name, **load_context())
+        MODULE_FRAGMENT_CACHE.set(key, html)
+    return html
+
+def invalidate_module_fragments():
+    """Drop cached module bodies and documentation after module or documentation edits"""
+    MODULE_FRAGMENT_CACHE.clear()
+    invalidate_documentation_cache()
+
 def is_completed(module_id):
     user_id = session.get("user_id")
     if not user_id:
@@ -306,15 +415,12 @@ def signup():
         try:
             user_id = create_user_enhanced(username, name, email, hashed_password, ip_address)
             if user_id:
-                # Send welcome email if email is provided
+                # Send welcome email if email is provided; the delivery records whether it
+                # was sent or failed, which with EMAIL_ASYNC happens after this request
                 if email:
-                    try:
-                        EmailService.send_welcome_email(email, name)
-                        log_activity(user_id, "Welcome email sent", f"Welcome email sent to {email}", ip_address)
-                    except Exception as email_error:
-                        # Log error but don't fail registration
-                        print(f"Warning: Failed to send welcome email to {email}: {email_error}")
-                        log_activity(user_id, "Welcome email failed", f"Failed to send welcome email to {email}: {str(email_error)}", ip_address)
+                    EmailService.send_welcome_email(email, name, user_id, ip_address)
+                    if Config.EMAIL_ASYNC:
+                        log_activity(user_id, "Welcome email queued", f"Welcome email queued for {email}", ip_address)
                 
                 # Auto-login after successful registration
                 session["user_id"] = user_id
@@ -327,7 +433,7 @@ def signup():
                 flash("Username or email already exists. Please choose different credentials.", "error")
         except Exception as e:
             flash("Registration failed. Please try again.", "error")
-            print(f"Registration error: {e}")
+            app.logger.exception("Registration error")
     
     return render_template("auth_signup.html")
 
@@ -399,13 +505,18 @@ def reset_password():
         # Hash new password
         hashed_password = AuthSecurity.hash_password(password)
         
-        # Update password and mark token as used
-        if update_user_password(user_id, hashed_password) and AuthSecurity.use_password_reset_token(token):
+        # Claim the token before changing the password so it can only be redeemed once
+        if AuthSecurity.consume_password_reset_token(token) != user_id:
+            flash("Invalid or expired password reset token", "error")
+            return redirect(url_for("login"))
+        
+        if update_user_password(user_id, hashed_password):
             flash("Your password has been successfully reset. Please log in with your new password.", "ok")
             log_activity(user_id, "Password reset completed", f"Password reset from token", get_client_ip(request))
             return redirect(url_for("login"))
         else:
-            flash("Failed to reset password. Please try again.", "error")
+            flash("Failed to reset password. Please request a new reset link.", "error")
+            return redirect(url_for("forgot_password"))
     
     return render_template("auth_reset_password.html", token=token)
 
@@ -450,8 +561,9 @@ def home():
                 "attempt_number": latest_attempt.get("attempt_number", 1)
             })
     
+    completed_set = get_completed_module_ids(user_id)
     modules = [
-        {**m, "completed": is_completed(m["id"]), "labAvailable": True}
+        {**m, "completed": m["id"] in completed_set, "labAvailable": True}
         for m in MODULES
     ]
     
@@ -468,13 +580,11 @@ def home():
             "completed_modules": gamification_profile.get("completed_modules", [])
         }
     except Exception as e:
-        print(f"Error getting gamification data: {e}")
+        app.logger.exception("Error getting gamification data")
         # Fallback to legacy system
-        from database_postgresql import get_user_gamification_data
         gamification_data = get_user_gamification_data(user_id)
     
-    # Get completed modules count using authoritative method
-    completed_modules_count = sum(1 for module in MODULES if is_completed(module["id"]))
+    completed_modules_count = sum(1 for module in MODULES if module["id"] in completed_set)
     
     profile = {
         "name": u["name"],
@@ -529,9 +639,6 @@ def documentation():
 @app.route("/docs/<filename>")
 def serve_documentation(filename):
     """Serve documentation markdown files with enhanced viewing"""
-    import os
-    import markdown
-    
     # Security check - only allow .md files
     if not filename.endswith('.md'):
         return "File not found", 404
@@ -582,9 +689,7 @@ def serve_documentation(filename):
         html_content = md.convert(markdown_content)
         toc_html = getattr(md, 'toc', '')
     except Exception as e:
-        print(f"Error converting markdown: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        app.logger.exception("Error converting markdown")
         return f"Error converting markdown: {str(e)}", 500
     
     # Extract module info from filename
@@ -594,7 +699,7 @@ def serve_documentation(filename):
         current_modules = get_modules()
         module_info = next((m for m in current_modules if m["id"] == module_id), None)
     except Exception as e:
-        print(f"Error getting module info: {e}")
+        app.logger.exception("Error getting module info")
         module_id = filename.replace('.md', '').split('-')[0]
         module_info = None
     
@@ -603,7 +708,7 @@ def serve_documentation(filename):
         user_id = session.get("user_id")
         user = current_user() if user_id else None
     except Exception as e:
-        print(f"Error getting user info: {e}")
+        app.logger.exception("Error getting user info")
         user = None
     
     try:
@@ -661,7 +766,6 @@ def debug_user_progress():
         unlocked_modules = get_user_unlocked_modules(user_id)
         
         # Get activity counts
-        from database_postgresql import get_db_connection, get_dict_cursor
         conn = get_db_connection()
         cursor = get_dict_cursor(conn)
         
@@ -682,7 +786,7 @@ def debug_user_progress():
             "user_id": user_id,
             "completed_modules": completed_modules,
             "unlocked_modules": unlocked_modules,
-            "activities": [dict(row) for row in activities]
+            "activities": activities
         }
         
     except Exception as e:
@@ -758,7 +862,7 @@ def track_doc_reading():
                 "achievements": result.get('new_achievements', [])
             }
         except Exception as e:
-            print(f"Error tracking documentation reading: {e}")
+            app.logger.exception("Error tracking documentation reading")
             return {"success": False, "error": str(e)}
     
     return {"success": True, "xp_earned": 0, "first_time": False}
@@ -768,9 +872,8 @@ def track_doc_reading():
 @app.route("/api/gamification/leaderboard", methods=["GET"])
 def get_gamification_leaderboard():
     """Get leaderboard data"""
-    from database_postgresql import get_leaderboard
     limit = request.args.get('limit', 10, type=int)
-    leaderboard = get_leaderboard(limit)
+    leaderboard = gamification_system.get_leaderboard(limit)
     return {"success": True, "leaderboard": leaderboard}
 
 @app.route("/api/gamification/award-xp", methods=["POST"])
@@ -780,7 +883,7 @@ def award_xp_endpoint():
     if not user_id:
         return {"success": False, "error": "Not logged in"}
     
-    data = request.get_json()
+    data = request.get_json(silent=True, cache=False) or {}
     xp_amount = data.get("xp", 0)
     source = data.get("source", "general")
     activity_type = data.get("activity_type", "general")
@@ -788,7 +891,7 @@ def award_xp_endpoint():
     score = data.get("score")
     time_spent = data.get("time_spent", 0)
     
-    if xp_amount <= 0:
+    if not isinstance(xp_amount, (int, float)) or xp_amount <= 0:
         return {"success": False, "error": "Invalid XP amount"}
     
     # Use modern gamification system if module_id provided
@@ -801,6 +904,7 @@ def award_xp_endpoint():
                 score=score or 0,
                 time_spent=time_spent
             )
+            invalidate_leaderboard()
             
             # Log activity
             log_activity(user_id, f"Earned XP: {source}", 
@@ -817,7 +921,7 @@ def award_xp_endpoint():
                 "achievements": result.get('new_achievements', [])
             }
         except Exception as e:
-            print(f"Error awarding XP: {e}")
+            app.logger.exception("Error awarding XP")
             return {"success": False, "error": str(e)}
     else:
         # For general XP without activity tracking, just return success
@@ -905,7 +1009,6 @@ def api_complete_learning_activity():
         return result
     
     # Get updated user stats
-    from database_postgresql import get_user_gamification_data
     user_data = get_user_gamification_data(user_id)
     
     return {
@@ -1268,10 +1371,9 @@ def api_complete_activity():
             if module_completed:
                 # Unlock next module using dynamic logic
                 next_module_unlocked = unlock_next_module_dynamic(user_id, module_id)
-                print(f"🎉 Module {module_id} completed! Next module: {next_module_unlocked}")
+                app.logger.info("Module %s completed, next module: %s", module_id, next_module_unlocked)
             
             # Get all completed modules for this user
-            from database_postgresql import get_db_connection
             conn = get_db_connection()
             cursor = conn.cursor()
             
@@ -1383,7 +1485,6 @@ def api_debug_progress():
         return {"success": False, "error": "Not authenticated"}, 401
     
     try:
-        from database_postgresql import get_db_connection
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -1428,7 +1529,6 @@ def api_user_progress():
     try:
         # Get user's completed modules and activity progress
         try:
-            from database_postgresql import get_db_connection
             conn = get_db_connection()
             cursor = conn.cursor()
             
@@ -1459,13 +1559,13 @@ def api_user_progress():
             all_completed = list(set(completed_modules + activity_completed_modules))
             completed_modules = all_completed
             
-            print(f"📊 Progress tracking: {len(completed_modules)} completed modules: {completed_modules}")
+            app.logger.debug("Progress tracking: %d completed modules: %s", len(completed_modules), completed_modules)
             
             cursor.close()
             conn.close()
             
         except Exception as db_error:
-            print(f"Database error in user-progress: {db_error}")
+            app.logger.exception("Database error in user-progress")
             # Fallback to empty lists if database fails
             completed_modules = []
         
@@ -1482,7 +1582,7 @@ def api_user_progress():
         }
         
     except Exception as e:
-        print(f"Error in api_user_progress: {e}")
+        app.logger.exception("Error in api_user_progress")
         return {"success": False, "error": str(e)}, 500
 
 @app.route("/api/bootstrap")
@@ -1515,7 +1615,6 @@ def api_bootstrap():
                 u = current_user()
                 
                 # Get completed modules (those with module_completion activity)
-                from database_postgresql import get_db_connection
                 conn = get_db_connection()
                 cursor = conn.cursor()
                 
@@ -1591,7 +1690,7 @@ def api_bootstrap():
                     "joinDate": u["joined_date"].isoformat() if hasattr(u["joined_date"], 'isoformat') else str(u["joined_date"])
                 }
             except Exception as e:
-                print(f"Error loading user data: {e}")
+                app.logger.exception("Error loading user data")
                 bootstrap_data["progress"] = []
                 bootstrap_data["unlocked_modules"] = ["A01"]  # Default for new users
                 bootstrap_data["userProfile"] = None
@@ -1660,7 +1759,6 @@ def admin_edit_module_enhanced(module_id):
                 # Check if documentation exists for this module
                 existing_doc = get_documentation_by_module(module_id)
                 
-                from database_postgresql import get_db_connection
                 conn = get_db_connection()
                 cursor = conn.cursor()
                 
@@ -1685,6 +1783,7 @@ def admin_edit_module_enhanced(module_id):
                 cursor.close()
                 conn.close()
             
+            invalidate_module_fragments()
             flash(f"Module {module_id} updated successfully", "ok")
             return redirect(url_for("admin_modules"))
             
@@ -1724,7 +1823,6 @@ def admin_assessments():
     admin = current_admin()
     
     # Get all assessment questions grouped by module
-    from database_postgresql import get_db_connection, get_dict_cursor
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
@@ -1743,7 +1841,7 @@ def admin_assessments():
             module_id = question['module_id']
             if module_id not in questions_by_module:
                 questions_by_module[module_id] = []
-            questions_by_module[module_id].append(dict(question))
+            questions_by_module[module_id].append(question)
         
         # Get assessment statistics
         cursor.execute('''
@@ -1760,7 +1858,7 @@ def admin_assessments():
             ORDER BY module_id
         ''')
         stats = cursor.fetchall()
-        stats_by_module = {stat['module_id']: dict(stat) for stat in stats}
+        stats_by_module = {stat['module_id']: stat for stat in stats}
         
         return render_template("admin/assessments.html", 
                              admin=admin, 
@@ -1809,7 +1907,6 @@ def admin_create_assessment():
                 return render_template("admin/create_assessment.html", admin=admin)
             
             # Insert into database
-            from database_postgresql import get_db_connection
             conn = get_db_connection()
             cursor = conn.cursor()
             
@@ -1841,7 +1938,6 @@ def admin_edit_assessment(question_id):
     """Edit assessment question"""
     admin = current_admin()
     
-    from database_postgresql import get_db_connection, get_dict_cursor
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
@@ -1854,8 +1950,6 @@ def admin_edit_assessment(question_id):
             flash("Assessment question not found", "error")
             return redirect(url_for("admin_assessments"))
         
-        question = dict(question)
-        
         if request.method == "POST":
             module_id = request.form.get("module_id", "").strip()
             question_text = request.form.get("question_text", "").strip()
@@ -1918,7 +2012,6 @@ def admin_delete_assessment(question_id):
         flash("Super admin access required", "error")
         return redirect(url_for("admin_assessments"))
     
-    from database_postgresql import get_db_connection
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -1953,7 +2046,6 @@ def admin_assessment_statistics(module_id):
     """View detailed assessment statistics for a module"""
     admin = current_admin()
     
-    from database_postgresql import get_db_connection, get_dict_cursor
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
@@ -1975,7 +2067,6 @@ def admin_assessment_statistics(module_id):
         
         stats = cursor.fetchone()
         if stats:
-            stats = dict(stats)
             if stats['total_attempts'] > 0:
                 stats['pass_rate'] = (stats['passed_attempts'] / stats['total_attempts']) * 100
             else:
@@ -1991,7 +2082,7 @@ def admin_assessment_statistics(module_id):
             LIMIT 20
         ''', (module_id,))
         
-        recent_attempts = [dict(attempt) for attempt in cursor.fetchall()]
+        recent_attempts = cursor.fetchall()
         
         # Get question-level statistics
         cursor.execute('''
@@ -2006,8 +2097,7 @@ def admin_assessment_statistics(module_id):
         ''', (module_id,))
         
         question_stats = []
-        for row in cursor.fetchall():
-            row_dict = dict(row)
+        for row_dict in cursor.fetchall():
             if row_dict['total_responses'] > 0:
                 row_dict['success_rate'] = (row_dict['correct_responses'] / row_dict['total_responses']) * 100
             else:
@@ -2038,7 +2128,6 @@ def admin_documentation():
         docs = get_all_documentation()
         
         # Get documentation statistics
-        from database_postgresql import get_db_connection, get_dict_cursor
         conn = get_db_connection()
         cursor = get_dict_cursor(conn)
         
@@ -2056,7 +2145,7 @@ def admin_documentation():
         ''')
         
         stats = cursor.fetchall()
-        stats_by_module = {stat['module_id']: dict(stat) for stat in stats}
+        stats_by_module = {stat['module_id']: stat for stat in stats}
         
         return render_template("admin/documentation.html", 
                              admin=admin, 
@@ -2097,7 +2186,6 @@ def admin_create_documentation():
                 return render_template("admin/create_documentation.html", admin=admin)
             
             # Insert into database
-            from database_postgresql import get_db_connection
             conn = get_db_connection()
             cursor = conn.cursor()
             
@@ -2110,6 +2198,7 @@ def admin_create_documentation():
                   estimated_read_time, tags_list, is_published))
             
             conn.commit()
+            invalidate_module_fragments()
             flash(f"Documentation created successfully for {module_id}", "ok")
             return redirect(url_for("admin_documentation"))
             
@@ -2131,7 +2220,6 @@ def admin_edit_documentation(doc_id):
     
     try:
         # Get documentation by ID
-        from database_postgresql import get_db_connection, get_dict_cursor
         conn = get_db_connection()
         cursor = get_dict_cursor(conn)
         
@@ -2142,8 +2230,6 @@ def admin_edit_documentation(doc_id):
             flash("Documentation not found", "error")
             return redirect(url_for("admin_documentation"))
         
-        doc = dict(doc)
-        
         if request.method == "POST":
             module_id = request.form.get("module_id", "").strip()
             title = request.form.get("title", "").strip()
@@ -2173,6 +2259,7 @@ def admin_edit_documentation(doc_id):
                   estimated_read_time, tags_list, is_published, doc_id))
             
             conn.commit()
+            invalidate_module_fragments()
             flash("Documentation updated successfully", "ok")
             return redirect(url_for("admin_documentation"))
         
@@ -2196,7 +2283,6 @@ def admin_delete_documentation(doc_id):
         return redirect(url_for("admin_documentation"))
     
     try:
-        from database_postgresql import get_db_connection
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -2213,6 +2299,7 @@ def admin_delete_documentation(doc_id):
         # Delete the documentation
         cursor.execute('DELETE FROM documentation WHERE id = %s', (doc_id,))
         conn.commit()
+        invalidate_module_fragments()
         
         flash(f"Documentation deleted for {module_id}", "ok")
         
@@ -2330,6 +2417,12 @@ def assessment_page(module_id):
 # ADMIN ROUTES
 # ================================
 
+# Assessment answers arrive as option indexes (0='a', 1='b', 2='c', 3='d')
+OPTION_KEYS = ('a', 'b', 'c', 'd')
+
+# Aggregate attempt statistics, keyed by "stats:<module_id>" / "stats:all"
+ASSESSMENT_STATS_CACHE = TTLCache(ttl_seconds=Config.STATS_CACHE_TTL)
+
 @app.route('/api/assessments/<module_id>/questions')
 def api_get_assessment_questions(module_id):
     """Get assessment questions for a module"""
@@ -2339,11 +2432,8 @@ def api_get_assessment_questions(module_id):
         # Transform questions to frontend format
         frontend_questions = []
         for q in db_questions:
-            # Parse options from JSON
-            options_dict = q.get('options', {})
-            if isinstance(options_dict, str):
-                import json
-                options_dict = json.loads(options_dict)
+            # options is a JSONB column, so psycopg2 already returns a dict
+            options_dict = q.get('options') or {}
             
             # Convert options dict to array
             options_array = []
@@ -2364,10 +2454,10 @@ def api_get_assessment_questions(module_id):
                 'points': q.get('points', 10)
             })
         
-        return {"success": True, "questions": frontend_questions}
+        return json_response({"success": True, "questions": frontend_questions})
     except Exception as e:
-        print(f"Error transforming assessment questions: {e}")
-        return {"success": False, "error": str(e)}, 500
+        app.logger.exception("Error transforming assessment questions for %s", module_id)
+        return json_response({"success": False, "error": str(e)}, 500)
 
 @app.route('/api/assessments/<module_id>/start', methods=['POST'])
 def api_start_assessment(module_id):
@@ -2399,16 +2489,14 @@ def api_start_assessment(module_id):
         else:
             return {"success": False, "error": "Failed to create assessment attempt"}, 500
     except Exception as e:
-        print(f"Error starting assessment for {module_id}: {e}")
-        import traceback
-        traceback.print_exc()
+        app.logger.exception("Error starting assessment for %s", module_id)
         return {"success": False, "error": str(e)}, 500
 
 @app.route('/api/assessments/<module_id>/submit', methods=['POST'])
 def api_submit_assessment(module_id):
     """Submit assessment answers"""
     if 'user_id' not in session:
-        return {"success": False, "error": "Not authenticated"}, 401
+        return json_response({"success": False, "error": "Not authenticated"}, 401)
     
     try:
         data = request.get_json()
@@ -2430,7 +2518,7 @@ def api_submit_assessment(module_id):
             module_completion_result = gamification_system.complete_module(user_id, module_id)
             next_module_unlocked = unlock_next_module_dynamic(user_id, module_id)
             
-            return {
+            return json_response({
                 "success": True,
                 "data": {
                     "score_percentage": 100,
@@ -2449,15 +2537,17 @@ def api_submit_assessment(module_id):
                     "no_questions": True,
                     "message": f"Module {module_id} completed! Assessment questions coming soon."
                 }
-            }
+            })
         
         if not attempt_id:
-            return {"success": False, "error": "Attempt ID required"}, 400
+            return json_response({"success": False, "error": "Attempt ID required"}, 400)
         
         # Get correct answers
         questions = get_assessment_questions(module_id)
         correct_answers = 0
         detailed_results = []
+        # Per-question review data is only built for clients that ask for it
+        include_review = request.args.get('review') == '1'
         
         for question in questions:
             question_id = str(question['id'])
@@ -2467,23 +2557,22 @@ def api_submit_assessment(module_id):
             is_correct = False
             user_answer_key = ''
             
-            if user_answer_index is not None and user_answer_index != '':
-                try:
-                    # Convert index to option key (0='a', 1='b', 2='c', 3='d')
-                    option_keys = ['a', 'b', 'c', 'd']
-                    if isinstance(user_answer_index, (int, str)) and str(user_answer_index).isdigit():
-                        index = int(user_answer_index)
-                        if 0 <= index < len(option_keys):
-                            user_answer_key = option_keys[index]
-                            is_correct = user_answer_key == question['correct_answer']
-                except (ValueError, IndexError):
-                    pass
+            try:
+                index = int(user_answer_index)
+                if index >= 0:
+                    user_answer_key = OPTION_KEYS[index]
+                    is_correct = user_answer_key == question['correct_answer']
+            except (ValueError, TypeError, IndexError):
+                pass
             
             if is_correct:
                 correct_answers += 1
             
+            if not include_review:
+                continue
+            
             # Get the actual answer text for display
-            options = question.get('options', {})
+            options = question['options'] or {}
             user_answer_text = options.get(user_answer_key, 'No answer') if user_answer_key else 'No answer'
             correct_answer_text = options.get(question['correct_answer'], question['correct_answer'])
             
@@ -2493,7 +2582,7 @@ def api_submit_assessment(module_id):
                 'user_answer': user_answer_text,
                 'correct_answer': correct_answer_text,
                 'is_correct': is_correct,
-                'explanation': question.get('explanation', ''),
+                'explanation': question['explanation'] or '',
                 'points': question['points'] if is_correct else 0
             })
         
@@ -2501,6 +2590,7 @@ def api_submit_assessment(module_id):
         success = complete_assessment_attempt(attempt_id, answers, correct_answers, time_taken)
         
         if success:
+            ASSESSMENT_STATS_CACHE.delete(f"stats:{module_id}", "stats:all")
             score_percentage = (correct_answers / len(questions) * 100) if questions else 0
             user_id = session['user_id']
             
@@ -2523,7 +2613,7 @@ def api_submit_assessment(module_id):
                 # Award module completion XP using legacy system for compatibility
                 mark_module_completed(user_id, f"{module_id}_assessment", gamification_result.get('xp_earned', 0))
             
-            return {
+            return json_response({
                 "success": True, 
                 "data": {
                     "score_percentage": score_percentage,
@@ -2540,11 +2630,12 @@ def api_submit_assessment(module_id):
                     "module_completion_bonus": module_completion_result.get('completion_bonus', 0) if module_completed else 0,
                     "module_achievements": module_completion_result.get('new_achievements', []) if module_completed else []
                 }
-            }
+            })
         else:
-            return {"success": False, "error": "Failed to submit assessment"}, 500
+            return json_response({"success": False, "error": "Failed to submit assessment"}, 500)
     except Exception as e:
-        return {"success": False, "error": str(e)}, 500
+        app.logger.exception("Error submitting assessment for %s", module_id)
+        return json_response({"success": False, "error": str(e)}, 500)
 
 @app.route('/api/assessments/<module_id>/attempts')
 def api_get_assessment_attempts(module_id):
@@ -2562,8 +2653,15 @@ def api_get_assessment_attempts(module_id):
 @app.route('/api/assessments/<module_id>/statistics')
 def api_get_assessment_statistics(module_id=None):
     """Get assessment statistics"""
+    key = f"stats:{module_id or 'all'}"
+    stats = ASSESSMENT_STATS_CACHE.get(key)
+    if stats is not None:
+        return {"success": True, "data": stats}
+    
     try:
         stats = get_assessment_statistics(module_id)
+        if stats:
+            ASSESSMENT_STATS_CACHE.set(key, stats)
         return {"success": True, "data": stats}
     except Exception as e:
         return {"success": False, "error": str(e)}, 500
@@ -2586,12 +2684,15 @@ def module_documentation(module_id):
         flash("Module not found.", "error")
         return redirect(url_for('home'))
     
-    # Get documentation content
-    documentation = get_documentation_by_module(module_id)
-    
-    return render_template('module_documentation.html', 
-                         module=module, 
-                         documentation=documentation,
+    # Documentation content is only fetched when the body is not cached yet
+    module_body = render_module_fragment(
+        'partials/module_documentation_body.html', module_id,
+        lambda: {"module": module, "documentation": get_documentation_by_module(module_id)}
+    )
+
+    return render_template('module_documentation.html',
+                         module=module,
+                         module_body=module_body,
                          user=user)
 
 @app.route("/api/complete-documentation", methods=["POST"])
@@ -2640,8 +2741,14 @@ def module_animation(module_id):
         flash("Module not found.", "error")
         return redirect(url_for('home'))
     
-    return render_template('module_animation.html', 
+    module_body = render_module_fragment(
+        'partials/module_animation_body.html', module_id,
+        lambda: {"module": module}
+    )
+
+    return render_template('module_animation.html',
                          module=module,
+                         module_body=module_body,
                          user=user)
 
 @app.route("/api/complete-animation", methods=["POST"])
@@ -2787,18 +2894,12 @@ def api_complete_quiz():
         return {"success": False, "error": "Module ID required"}
     
     try:
-        # Get questions and calculate score
-        questions = get_assessment_questions(module_id)
-        if not questions:
+        # Answers are option indexes; anything else counts as unanswered
+        answer_indexes = [a if isinstance(a, int) and not isinstance(a, bool) else -1 for a in answers]
+        correct_answers, total_questions = grade_quiz_answers(module_id, answer_indexes)
+        if not total_questions:
             return {"success": False, "error": "No questions found for this module"}
         
-        correct_answers = 0
-        total_questions = len(questions)
-        
-        for i, answer in enumerate(answers):
-            if i < len(questions) and answer == questions[i].get('c', 0):
-                correct_answers += 1
-        
         score = int((correct_answers / total_questions) * 100) if total_questions > 0 else 0
         
         # Complete quiz activity and award 50 XP (+ bonus for high scores)
@@ -2830,17 +2931,16 @@ def api_check_module_completion():
     """Check if module is fully completed and award badge"""
     user_id = session.get("user_id")
     if not user_id:
-        return {"success": False, "error": "Not logged in"}
+        return json_response({"success": False, "error": "Not logged in"})
     
     data = request.get_json()
     module_id = data.get("module_id")
     
     if not module_id:
-        return {"success": False, "error": "Module ID required"}
+        return json_response({"success": False, "error": "Module ID required"})
     
     try:
         # Check if all activities are completed
-        from database_postgresql import get_db_connection
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -2872,24 +2972,24 @@ def api_check_module_completion():
                 module = get_module_by_id(module_id)
                 module_name = module["title"] if module else module_id
                 
-                return {
+                return json_response({
                     "success": True,
                     "module_completed": True,
                     "badge_awarded": True,
                     "message": f"Congratulations! You've completed {module_name} and earned the module badge!",
                     "completed_activities": completed_activities
-                }
+                })
         
-        return {
+        return json_response({
             "success": True,
             "module_completed": module_completed,
             "badge_awarded": False,
             "completed_activities": completed_activities,
             "required_activities": 4
-        }
+        })
         
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        return json_response({"success": False, "error": str(e)})
 
 # ================================
 # GAMIFICATION API ENDPOINTS
@@ -2908,9 +3008,7 @@ def api_gamification_profile():
         else:
             return jsonify({"success": False, "error": "User not found"}), 404
     except Exception as e:
-        print(f"Error in api_gamification_profile: {e}")
-        import traceback
-        traceback.print_exc()
+        app.logger.exception("Error in api_gamification_profile")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/gamification/award-xp', methods=['POST'])
@@ -2919,25 +3017,27 @@ def api_award_xp():
     if 'user_id' not in session:
         return jsonify({"success": False, "error": "Not authenticated"}), 401
     
+    # Malformed or missing JSON becomes {} and fails validation below
+    data = request.get_json(silent=True, cache=False) or {}
+    xp_amount = data.get('xp_amount', 0)
+    activity_type = data.get('activity_type', 'general')
+    module_id = data.get('module_id')
+    score = data.get('score')
+    time_spent = data.get('time_spent', 0)
+    
+    if not isinstance(xp_amount, (int, float)) or xp_amount <= 0:
+        return jsonify({"success": False, "error": "Invalid XP amount"}), 400
+    
     try:
-        data = request.get_json()
-        xp_amount = data.get('xp_amount', 0)
-        activity_type = data.get('activity_type', 'general')
-        module_id = data.get('module_id')
-        score = data.get('score')
-        time_spent = data.get('time_spent', 0)
-        
-        if xp_amount <= 0:
-            return jsonify({"success": False, "error": "Invalid XP amount"}), 400
-        
         result = gamification_system.complete_activity(
             session['user_id'], module_id, activity_type, score, time_spent
         )
+        invalidate_leaderboard()
         
         return jsonify({"success": True, "data": result})
         
     except Exception as e:
-        print(f"Error in api_award_xp: {e}")
+        app.logger.exception("Error in api_award_xp")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/gamification/complete-module', methods=['POST'])
@@ -2946,18 +3046,19 @@ def api_complete_module():
     if 'user_id' not in session:
         return jsonify({"success": False, "error": "Not authenticated"}), 401
     
+    data = request.get_json(silent=True, cache=False) or {}
+    module_id = data.get('module_id')
+    
+    if not module_id:
+        return jsonify({"success": False, "error": "Module ID required"}), 400
+    
     try:
-        data = request.get_json()
-        module_id = data.get('module_id')
-        
-        if not module_id:
-            return jsonify({"success": False, "error": "Module ID required"}), 400
-        
         result = gamification_system.complete_module(session['user_id'], module_id)
+        invalidate_leaderboard()
         return jsonify({"success": True, "data": result})
         
     except Exception as e:
-        print(f"Error in api_complete_module: {e}")
+        app.logger.exception("Error in api_complete_module")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/gamification/leaderboard')
@@ -2968,7 +3069,7 @@ def api_leaderboard():
         leaderboard = gamification_system.get_leaderboard(limit)
         return jsonify({"success": True, "data": leaderboard})
     except Exception as e:
-        print(f"Error in api_leaderboard: {e}")
+        app.logger.exception("Error in api_leaderboard")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/gamification/user-stats')
@@ -2996,27 +3097,25 @@ def api_get_user_stats():
                 "completed_modules": gamification_profile.get("completed_modules", [])
             }
         except Exception as e:
-            print(f"Error getting gamification data: {e}")
+            app.logger.exception("Error getting gamification data")
             # Fallback to legacy system
-            from database_postgresql import get_user_gamification_data
             gamification_data = get_user_gamification_data(user_id)
         
-        # Get completed modules count using authoritative method
-        completed_modules_count = sum(1 for module in MODULES if is_completed(module["id"]))
+        # Completed modules computed once (same rule as is_module_completed) and reused below
+        completed_set = get_completed_module_ids(user_id)
+        completed_modules = [module["id"] for module in MODULES if module["id"] in completed_set]
+        completed_modules_count = len(completed_modules)
         
         # Get unlocked modules (first module + any unlocked via completion)
-        unlocked_modules = ["A01"]  # First module is always unlocked
-        progress = get_user_progress(user_id)
-        for p in progress:
-            if p["module_id"] not in unlocked_modules and not p["module_id"].endswith("_assessment") and not p["module_id"].endswith("_doc"):
-                unlocked_modules.append(p["module_id"])
-        
-        # Check for next modules unlocked via completion
-        for module in MODULES:
-            if is_completed(module["id"]):
-                next_module_id = get_next_module_id(module["id"])
-                if next_module_id and next_module_id not in unlocked_modules:
-                    unlocked_modules.append(next_module_id)
+        unlocked = {"A01"}  # First module is always unlocked
+        # Progress rows that are real modules (skips "A01_assessment" / "A01_doc" bookkeeping rows)
+        unlocked.update(p["module_id"] for p in get_user_progress(user_id) if p["module_id"] in MODULE_IDS)
+        
+        # Next modules unlocked via completion
+        unlocked.update(NEXT_MODULE_ID[module_id] for module_id in completed_modules if module_id in NEXT_MODULE_ID)
+        
+        # Report in course order
+        unlocked_modules = [module_id for module_id in MODULE_IDS_ORDERED if module_id in unlocked]
         
         stats = {
             "user_id": user_id,
@@ -3027,12 +3126,12 @@ def api_get_user_stats():
             "modulesCompleted": completed_modules_count,
             "streak": gamification_data.get("streak", 0),
             "unlocked_modules": unlocked_modules,
-            "completed_modules": [module["id"] for module in MODULES if is_completed(module["id"])],
+            "completed_modules": completed_modules,
             "achievements": gamification_data.get("achievements", [])
         }
         return {"success": True, "data": stats}
     except Exception as e:
-        print(f"Error in api_get_user_stats: {e}")
+        app.logger.exception("Error in api_get_user_stats")
         return {"success": False, "error": str(e)}, 500
 
 @app.route('/api/gamification/achievements')
@@ -3051,13 +3150,13 @@ def api_get_achievements():
         
         return {"success": True, "data": achievements}
     except Exception as e:
-        print(f"Error getting achievements: {e}")
+        app.logger.exception("Error getting achievements")
         return {"success": False, "error": str(e)}, 500
 
 @app.route("/test-gamification")
 def test_gamification():
     """Test page for gamification system"""
-    return send_from_directory(".", "test_gamification.html")
+    return send_from_directory(".", "test_gamification.html", max_age=Config.STATIC_PAGE_MAX_AGE)
 
 @app.route("/api/debug/module-completion")
 def debug_module_completion():
@@ -3068,44 +3167,20 @@ def debug_module_completion():
     user_id = session['user_id']
     debug_info = {}
     
+    # Activity and assessment counts for every module in three grouped queries
+    completion_details = get_module_completion_details(user_id)
+    
     for module in MODULES:
         module_id = module["id"]
+        details = completion_details.get(module_id) or empty_module_completion()
         debug_info[module_id] = {
-            "is_completed": is_completed(module_id),
-            "is_module_completed": is_module_completed(user_id, module_id)
+            "is_completed": details["completed"],
+            "is_module_completed": details["completed"],
+            "assessment_attempts": details["assessment_attempts"],
+            "assessment_passed": details["assessment_passed"],
+            "modern_activities": details["modern_activities"],
+            "legacy_activities": details["legacy_activities"]
         }
-        
-        # Check assessment attempts
-        attempts = get_user_assessment_attempts(user_id, module_id)
-        debug_info[module_id]["assessment_attempts"] = len(attempts) if attempts else 0
-        debug_info[module_id]["assessment_passed"] = any(
-            attempt.get("score_percentage", 0) >= 70 and attempt.get("is_completed", False)
-            for attempt in (attempts or [])
-        )
-        
-        # Check activities in modern system
-        conn = get_db_connection()
-        cursor = get_dict_cursor(conn)
-        cursor.execute('''
-            SELECT COUNT(DISTINCT activity_type) as activity_count
-            FROM activity_completions 
-            WHERE user_id = %s AND module_id = %s
-        ''', (user_id, module_id))
-        modern_activities = cursor.fetchone()['activity_count']
-        
-        # Check activities in legacy system
-        cursor.execute('''
-            SELECT COUNT(DISTINCT activity_type) as activity_count
-            FROM learning_activities 
-            WHERE user_id = %s AND module_id = %s AND completed_at IS NOT NULL
-        ''', (user_id, module_id))
-        legacy_activities = cursor.fetchone()['activity_count']
-        
-        debug_info[module_id]["modern_activities"] = modern_activities
-        debug_info[module_id]["legacy_activities"] = legacy_activities
-        
-        cursor.close()
-        conn.close()
     
     return {"success": True, "debug_info": debug_info}
 
@@ -3122,70 +3197,73 @@ def debug_database_state():
     cursor = get_dict_cursor(conn)
     
     try:
-        # Check user basic info
-        cursor.execute('SELECT id, username, name, xp FROM users WHERE id = %s', (user_id,))
-        user_row = cursor.fetchone()
-        debug_data["user_info"] = dict(user_row) if user_row else None
-        
-        # Check activity_completions table (modern system)
-        cursor.execute('''
-            SELECT module_id, activity_type, score, time_spent, xp_earned, completed_at
-            FROM activity_completions 
-            WHERE user_id = %s 
-            ORDER BY completed_at DESC
-        ''', (user_id,))
-        debug_data["activity_completions"] = [dict(row) for row in cursor.fetchall()]
-        
-        # Check learning_activities table (legacy system)
+        # Every section is built as JSON by PostgreSQL in a single round-trip.
+        # History tables are capped: this is a debug view, not a full export
         cursor.execute('''
-            SELECT module_id, activity_type, score, time_spent, xp_earned, completed_at
-            FROM learning_activities 
-            WHERE user_id = %s AND completed_at IS NOT NULL
-            ORDER BY completed_at DESC
-        ''', (user_id,))
-        debug_data["learning_activities"] = [dict(row) for row in cursor.fetchall()]
-        
-        # Check user_progress table
-        cursor.execute('''
-            SELECT module_id, xp_earned, completed_at
-            FROM user_progress 
-            WHERE user_id = %s
-            ORDER BY completed_at DESC
-        ''', (user_id,))
-        debug_data["user_progress"] = [dict(row) for row in cursor.fetchall()]
-        
-        # Check assessment attempts
-        cursor.execute('''
-            SELECT module_id, score_percentage, is_completed, completed_at, attempt_number
-            FROM user_assessment_attempts 
-            WHERE user_id = %s
-            ORDER BY completed_at DESC
-        ''', (user_id,))
-        debug_data["assessment_attempts"] = [dict(row) for row in cursor.fetchall()]
-        
-        # Check gamification tables
-        cursor.execute('''
-            SELECT level, current_xp, total_xp, streak, last_activity_date
-            FROM user_gamification 
-            WHERE user_id = %s
-        ''', (user_id,))
-        gamification_row = cursor.fetchone()
-        debug_data["user_gamification"] = dict(gamification_row) if gamification_row else None
-        
-        cursor.execute('''
-            SELECT module_id, completed_at, total_xp_earned
-            FROM module_completions 
-            WHERE user_id = %s
-        ''', (user_id,))
-        debug_data["module_completions"] = [dict(row) for row in cursor.fetchall()]
-        
-        # Check if tables exist
-        cursor.execute("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_name IN ('activity_completions', 'learning_activities', 'user_gamification', 'module_completions')
-        """)
-        debug_data["existing_tables"] = [row['table_name'] for row in cursor.fetchall()]
+            SELECT json_build_object(
+                'user_info', (
+                    SELECT row_to_json(u) FROM (
+                        SELECT id, username, name, xp FROM users WHERE id = %(user_id)s
+                    ) u
+                ),
+                'activity_completions', COALESCE((
+                    SELECT json_agg(ac ORDER BY ac.completed_at DESC) FROM (
+                        SELECT module_id, activity_type, score, xp_earned, completed_at
+                        FROM activity_completions 
+                        WHERE user_id = %(user_id)s 
+                        ORDER BY completed_at DESC
+                        LIMIT 50
+                    ) ac
+                ), '[]'::json),
+                'learning_activities', COALESCE((
+                    SELECT json_agg(la ORDER BY la.completed_at DESC) FROM (
+                        SELECT module_id, activity_type, score, xp_earned, completed_at
+                        FROM learning_activities 
+                        WHERE user_id = %(user_id)s AND completed_at IS NOT NULL
+                        ORDER BY completed_at DESC
+                        LIMIT 50
+                    ) la
+                ), '[]'::json),
+                'user_progress', COALESCE((
+                    SELECT json_agg(up ORDER BY up.completed_at DESC) FROM (
+                        SELECT module_id, xp_earned, completed_at
+                        FROM user_progress 
+                        WHERE user_id = %(user_id)s
+                        ORDER BY completed_at DESC
+                        LIMIT 50
+                    ) up
+                ), '[]'::json),
+                'assessment_attempts', COALESCE((
+                    SELECT json_agg(aa ORDER BY aa.completed_at DESC) FROM (
+                        SELECT module_id, score_percentage, is_completed, completed_at, attempt_number
+                        FROM user_assessment_attempts 
+                        WHERE user_id = %(user_id)s
+                        ORDER BY completed_at DESC
+                        LIMIT 50
+                    ) aa
+                ), '[]'::json),
+                'user_gamification', (
+                    SELECT row_to_json(ug) FROM (
+                        SELECT level, current_xp, total_xp, streak, last_activity_date
+                        FROM user_gamification 
+                        WHERE user_id = %(user_id)s
+                    ) ug
+                ),
+                'module_completions', COALESCE((
+                    SELECT json_agg(mc) FROM (
+                        SELECT module_id, completed_at, total_xp_earned
+                        FROM module_completions 
+                        WHERE user_id = %(user_id)s
+                    ) mc
+                ), '[]'::json),
+                'existing_tables', COALESCE((
+                    SELECT json_agg(table_name) FROM information_schema.tables 
+                    WHERE table_schema = 'public' 
+                    AND table_name IN ('activity_completions', 'learning_activities', 'user_gamification', 'module_completions')
+                ), '[]'::json)
+            ) as debug_data
+        ''', {'user_id': user_id})
+        debug_data.update(cursor.fetchone()['debug_data'])
         
         return {"success": True, "debug_data": debug_data}
         
@@ -3217,7 +3295,6 @@ def trigger_completion_check(module_id):
             
             # Trigger module completion in gamification system
             try:
-                from gamification_system import gamification_system
                 completion_result = gamification_system.complete_module(user_id, module_id)
                 result["gamification_result"] = completion_result
                 result["actions_taken"].append("Gamification module completion triggered")
@@ -3249,49 +3326,20 @@ def debug_unlock_status():
         return {"success": False, "error": "Not authenticated"}, 401
     
     try:
-        from database_postgresql import get_db_connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Get module completion status
         module_order = ["A01", "A02", "A03", "A04", "A05", "A06", "A07", "A08", "A09", "A10"]
         module_status = {}
+        completion_details = get_module_completion_details(user_id)
         
         for module_id in module_order:
-            # Check completion
-            completed = is_module_completed(user_id, module_id)
-            
-            # Check activities
-            cursor.execute('''
-                SELECT activity_type, COUNT(*) as count
-                FROM learning_activities 
-                WHERE user_id = %s AND module_id = %s AND completed_at IS NOT NULL
-                GROUP BY activity_type
-            ''', (user_id, module_id))
-            
-            activities = {row[0]: row[1] for row in cursor.fetchall()}
-            
-            # Check assessments
-            cursor.execute('''
-                SELECT COUNT(*) as count, MAX(score_percentage) as best_score
-                FROM user_assessment_attempts 
-                WHERE user_id = %s AND module_id = %s AND is_completed = TRUE
-            ''', (user_id, module_id))
-            
-            assessment_data = cursor.fetchone()
-            assessment_count = assessment_data[0] if assessment_data else 0
-            best_score = assessment_data[1] if assessment_data else 0
-            
+            details = completion_details.get(module_id) or empty_module_completion()
             module_status[module_id] = {
-                'completed': completed,
-                'activities': activities,
-                'assessment_attempts': assessment_count,
-                'best_assessment_score': best_score
+                'completed': details['completed'],
+                'activities': details['legacy_activity_counts'],
+                'assessment_attempts': details['completed_attempts'],
+                'best_assessment_score': details['best_score']
             }
         
-        cursor.close()
-        conn.close()
-        
         return {
             "success": True,
             "user_id": user_id,
@@ -3354,7 +3402,6 @@ def api_get_module(module_id):
 def api_get_animations(module_id):
     """Get animations for a module"""
     try:
-        from database_postgresql import get_animations_by_module
         animations = get_animations_by_module(module_id)
         return {"success": True, "animations": animations}
     except Exception as e:
@@ -3367,7 +3414,6 @@ def debug_init_gamification():
         return {"success": False, "error": "Not authenticated"}, 401
     
     try:
-        from gamification_system import gamification_system
         
         # Initialize the system
         gamification_system.initialize_system()
@@ -3402,11 +3448,10 @@ def force_complete_module(module_id):
             success = complete_learning_activity(user_id, module_id, activity, score=100, time_spent=120)
             results.append(f"{activity}: {'✅' if success else '❌'}")
         
-        # Check if module is now completed
-        module_completed = is_module_completed(user_id, module_id)
-        
-        # Get updated stats
-        completed_count = sum(1 for module in MODULES if is_completed(module["id"]))
+        # Check if module is now completed and get updated stats
+        completed_set = get_completed_module_ids(user_id)
+        module_completed = module_id in completed_set
+        completed_count = sum(1 for module in MODULES if module["id"] in completed_set)
         
         return {
             "success": True,
@@ -3420,56 +3465,59 @@ def force_complete_module(module_id):
     except Exception as e:
         return {"success": False, "error": str(e)}, 500
 
+# (user_id, formatted row) pairs shared by every user; isCurrentUser is stamped per request
+LEADERBOARD_CACHE = TTLCache(ttl_seconds=Config.LEADERBOARD_CACHE_TTL, max_entries=1)
+
+LEADERBOARD_LIMIT = 50
+# One avatar per leaderboard slot, cycling through the emoji set
+_AVATAR_POOL = tuple(islice(cycle(['🛡️', '🔒', '⚔️', '🏆', '🔥', '⚡', '🎆', '🌟', '💪', '🥇']), LEADERBOARD_LIMIT))
+
+def invalidate_leaderboard():
+    """Drop the cached leaderboard after XP or module completion changes"""
+    LEADERBOARD_CACHE.clear()
+
+def _with_current_user_flag(leaderboard):
+    """Copy cached leaderboard rows, marking the logged-in user's entry"""
+    user_id = session.get('user_id')
+    return [dict(entry, isCurrentUser=entry_user_id == user_id) for entry_user_id, entry in leaderboard]
+
 @app.route("/api/leaderboard", methods=["GET"])
 def api_get_leaderboard():
     """Get leaderboard data with real user statistics"""
+    # Keep leaderboard_rankings (and today's rank snapshot) refreshed on a schedule from
+    # here on; started on the request path so each forked worker gets its own thread
+    start_leaderboard_refresher(Config.LEADERBOARD_REFRESH_INTERVAL)
+    leaderboard = LEADERBOARD_CACHE.get('leaderboard')
+    if leaderboard is not None:
+        leaderboard = _with_current_user_flag(leaderboard)
+        return {
+            "success": True, 
+            "leaderboard": leaderboard,
+            "total_users": len(leaderboard)
+        }
+    
     try:
-        # Get all users with their gamification data
-        from database_postgresql import get_db_connection
-        import psycopg2.extras
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # Get users with their XP, level, and completion data
-        cursor.execute('''
-            SELECT 
-                u.id,
-                u.name,
-                u.username,
-                COALESCE(g.total_xp, 0) as total_xp,
-                COALESCE(g.level, 1) as level,
-                COALESCE(g.current_streak, 0) as streak,
-                COUNT(DISTINCT up.module_id) as modules_completed
-            FROM users u
-            LEFT JOIN user_gamification g ON u.id = g.user_id
-            LEFT JOIN user_progress up ON u.id = up.user_id
-            WHERE u.is_active = TRUE
-            GROUP BY u.id, u.name, u.username, g.total_xp, g.level, g.current_streak
-            ORDER BY COALESCE(g.total_xp, 0) DESC
-            LIMIT 50
-        ''')
-        
-        users = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        # Ranked rows come precomputed from leaderboard_rankings
+        users = get_leaderboard_rankings(LEADERBOARD_LIMIT, Config.LEADERBOARD_REFRESH_INTERVAL)
         
         # Format leaderboard data
-        leaderboard = []
-        avatars = ['🛡️', '🔒', '⚔️', '🏆', '🔥', '⚡', '🎆', '🌟', '💪', '🥇']
-        
-        for i, user in enumerate(users):
-            leaderboard.append({
-                'rank': i + 1,
-                'name': user['name'] or user['username'],
-                'avatar': avatars[i % len(avatars)],
-                'level': user['level'],
-                'totalXP': user['total_xp'],
-                'modulesCompleted': user['modules_completed'],
-                'streak': user['streak'],
-                'isCurrentUser': user['id'] == session.get('user_id')
+        leaderboard = [None] * len(users)
+        
+        for i, (uid, rank, name, username, total_xp, level, streak, modules_completed, trend) in enumerate(users):
+            leaderboard[i] = (uid, {
+                'rank': rank,
+                'name': name or username,
+                'avatar': _AVATAR_POOL[i],
+                'level': level,
+                'totalXP': total_xp,
+                'modulesCompleted': modules_completed,
+                'streak': streak,
+                'trend': trend
             })
         
+        LEADERBOARD_CACHE.set('leaderboard', leaderboard)
+        leaderboard = _with_current_user_flag(leaderboard)
+        
         return {
             "success": True, 
             "leaderboard": leaderboard,
@@ -3477,7 +3525,7 @@ def api_get_leaderboard():
         }
         
     except Exception as e:
-        print(f"Error getting leaderboard: {e}")
+        app.logger.exception("Error getting leaderboard")
         return {"success": False, "error": str(e)}, 500
 
 @app.route("/api/leaderboard-stats", methods=["GET"])
@@ -3507,10 +3555,11 @@ def api_get_leaderboard_user_stats():
         }
         
     except Exception as e:
-        print(f"Error getting user stats: {e}")
+        app.logger.exception("Error getting user stats")
         return {"success": False, "error": str(e)}, 500
 
 
 if __name__ == "__main__":
     # For training only
+    start_log_listener()
     app.run(debug=Config.DEBUG, port=Config.PORT)
@@ -5,25 +5,115 @@ Provides strong authentication, password policies, and security features
 
 import re
 import secrets
+import string
 import hashlib
-import bcrypt
-from datetime import datetime, timedelta
+import atexit
+import os
+import queue
+import hmac
+import logging
+import threading
+import psycopg2.extras
+from collections import deque
+from datetime import datetime
 from typing import Optional, Dict, Any, Tuple
-from database_postgresql import get_db_connection, get_dict_cursor
+from database_postgresql import get_db_connection, get_dict_cursor, log_activity, _inet_or_none
 from config import Config
 
-# Email imports with fallback for different Python versions
+# Handlers are attached by the app (see app.py); scripts can call logging.basicConfig()
+logger = logging.getLogger('auth_security')
+
+# Under gevent workers (wsgi.py) a bcrypt call would block every greenlet in the
+# process; run it on gevent's native thread pool instead, since bcrypt releases the GIL
 try:
-    import smtplib
-    import email.mime.text
-    import email.mime.multipart
-    from email.mime.text import MIMEText as MimeText
-    from email.mime.multipart import MIMEMultipart as MimeMultipart
-    EMAIL_AVAILABLE = True
-    print("✅ Email functionality available - SMTP ready")
-except ImportError as e:
-    EMAIL_AVAILABLE = False
-    print(f"❌ Email functionality not available - using console logging for password resets. Error: {e}")
+    from gevent import monkey as _gevent_monkey, get_hub as _gevent_get_hub
+    _USE_GEVENT_THREADPOOL = _gevent_monkey.is_module_patched('threading')
+except ImportError:
+    _USE_GEVENT_THREADPOOL = False
+
+def _run_blocking(func, *args):
+    """Call a CPU-bound function without stalling the gevent event loop"""
+    if _USE_GEVENT_THREADPOOL:
+        return _gevent_get_hub().threadpool.apply(func, args)
+    return func(*args)
+
+# Login attempts are buffered and written in batches by a background flusher
+LOGIN_LOG_BATCH_SIZE = 100
+LOGIN_LOG_FLUSH_INTERVAL = 1.0  # seconds
+_login_log_buffer = deque()
+_login_log_lock = threading.Lock()
+_login_log_wakeup = threading.Event()
+_login_log_flusher = None
+_login_log_flusher_pid = None
+
+def _flush_login_attempts():
+    """Write every buffered login attempt in one INSERT"""
+    with _login_log_lock:
+        rows = list(_login_log_buffer)
+        _login_log_buffer.clear()
+    if not rows:
+        return
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO login_attempts (username, ip_address, user_agent, success, failure_reason)
+            VALUES %s
+        """, rows, page_size=LOGIN_LOG_BATCH_SIZE)
+        conn.commit()
+    except Exception as e:
+        logger.exception("Error logging %d login attempts", len(rows))
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+def _login_log_flusher_loop():
+    """Flush buffered login attempts every interval, or sooner once a batch fills up"""
+    while True:
+        _login_log_wakeup.wait(LOGIN_LOG_FLUSH_INTERVAL)
+        _login_log_wakeup.clear()
+        _flush_login_attempts()
+
+def _ensure_login_log_flusher():
+    """Start the flusher thread on first use (and again after a fork)"""
+    global _login_log_flusher, _login_log_flusher_pid
+    if _login_log_flusher is None or _login_log_flusher_pid != os.getpid():
+        with _login_log_lock:
+            if _login_log_flusher is None or _login_log_flusher_pid != os.getpid():
+                _login_log_flusher = threading.Thread(target=_login_log_flusher_loop, name="login-log-flusher", daemon=True)
+                _login_log_flusher.start()
+                _login_log_flusher_pid = os.getpid()
+
+atexit.register(_flush_login_attempts)
+
+# bcrypt (a C extension) and the SMTP/MIME modules are imported on first use so
+# worker cold starts don't pay for them before a login or email actually happens
+_bcrypt = None
+_email_modules = None
+
+def _get_bcrypt():
+    """Import bcrypt on first use"""
+    global _bcrypt
+    if _bcrypt is None:
+        import bcrypt
+        _bcrypt = bcrypt
+    return _bcrypt
+
+def _get_email_modules():
+    """Import (smtplib, MIMEText, MIMEMultipart) on first use; None if unavailable"""
+    global _email_modules
+    if _email_modules is None:
+        try:
+            import smtplib
+            from email.mime.text import MIMEText
+            from email.mime.multipart import MIMEMultipart
+            _email_modules = (smtplib, MIMEText, MIMEMultipart)
+        except ImportError as e:
+            _email_modules = ()
+            logger.warning("Email functionality not available - using console logging for password resets. Error: %s", e)
+    return _email_modules or None
 
 class PasswordPolicy:
     """Password strength and policy enforcement"""
@@ -36,6 +126,20 @@ class PasswordPolicy:
     REQUIRE_SPECIAL = True
     SPECIAL_CHARS = "!@#$%^&*()_+-=[]{}|;:,.<>?"
     
+    # Compiled once so validation doesn't go through re's pattern cache
+    _UPPER_RE = re.compile(r'[A-Z]')
+    _LOWER_RE = re.compile(r'[a-z]')
+    _DIGIT_RE = re.compile(r'\d')
+    _SPECIAL_RE = re.compile(f'[{re.escape(SPECIAL_CHARS)}]')
+    _REPEAT_RE = re.compile(r'(.)\1{2,}')
+    # Character sets for get_strength_score's single pass over the password
+    _UPPER_CHARS = frozenset(string.ascii_uppercase)
+    _LOWER_CHARS = frozenset(string.ascii_lowercase)
+    _DIGIT_CHARS = frozenset(string.digits)
+    _SPECIAL_CHARS_SET = frozenset(SPECIAL_CHARS)
+    WEAK_PATTERNS = ('123', 'abc', 'qwe', 'password', 'admin', 'user')
+    _WEAK_PATTERNS_RE = re.compile('|'.join(re.escape(pattern) for pattern in WEAK_PATTERNS))
+    
     @classmethod
     def validate_password(cls, password: str) -> Tuple[bool, list]:
         """Validate password against policy requirements"""
@@ -47,28 +151,26 @@ class PasswordPolicy:
         if len(password) > cls.MAX_LENGTH:
             errors.append(f"Password must be no more than {cls.MAX_LENGTH} characters long")
         
-        if cls.REQUIRE_UPPERCASE and not re.search(r'[A-Z]', password):
+        if cls.REQUIRE_UPPERCASE and not cls._UPPER_RE.search(password):
             errors.append("Password must contain at least one uppercase letter")
         
-        if cls.REQUIRE_LOWERCASE and not re.search(r'[a-z]', password):
+        if cls.REQUIRE_LOWERCASE and not cls._LOWER_RE.search(password):
             errors.append("Password must contain at least one lowercase letter")
         
-        if cls.REQUIRE_DIGITS and not re.search(r'\d', password):
+        if cls.REQUIRE_DIGITS and not cls._DIGIT_RE.search(password):
             errors.append("Password must contain at least one digit")
         
-        if cls.REQUIRE_SPECIAL and not re.search(f'[{re.escape(cls.SPECIAL_CHARS)}]', password):
+        if cls.REQUIRE_SPECIAL and not cls._SPECIAL_RE.search(password):
             errors.append(f"Password must contain at least one special character ({cls.SPECIAL_CHARS})")
         
         # Check for common weak patterns
-        if re.search(r'(.)\1{2,}', password):  # Three or more consecutive identical characters
+        if cls._REPEAT_RE.search(password):  # Three or more consecutive identical characters
             errors.append("Password cannot contain three or more consecutive identical characters")
         
-        # Check for common sequences
-        weak_patterns = ['123', 'abc', 'qwe', 'password', 'admin', 'user']
-        password_lower = password.lower()
-        for pattern in weak_patterns:
-            if pattern in password_lower:
-                errors.append(f"Password cannot contain common patterns like '{pattern}'")
+        # Check for common sequences in a single scan, reporting each pattern once
+        found = dict.fromkeys(match.group(0) for match in cls._WEAK_PATTERNS_RE.finditer(password.lower()))
+        for pattern in found:
+            errors.append(f"Password cannot contain common patterns like '{pattern}'")
         
         return len(errors) == 0, errors
     
@@ -76,26 +178,27 @@ class PasswordPolicy:
     def get_strength_score(cls, password: str) -> int:
         """Calculate password strength score (0-100)"""
         score = 0
+        chars = set(password)
         
         # Length bonus
         score += min(25, len(password) * 2)
         
         # Character variety bonus
-        if re.search(r'[a-z]', password):
+        if not chars.isdisjoint(cls._LOWER_CHARS):
             score += 10
-        if re.search(r'[A-Z]', password):
+        if not chars.isdisjoint(cls._UPPER_CHARS):
             score += 10
-        if re.search(r'\d', password):
+        if not chars.isdisjoint(cls._DIGIT_CHARS):
             score += 10
-        if re.search(f'[{re.escape(cls.SPECIAL_CHARS)}]', password):
+        if not chars.isdisjoint(cls._SPECIAL_CHARS_SET):
             score += 15
         
         # Complexity bonus
-        unique_chars = len(set(password))
+        unique_chars = len(chars)
         score += min(20, unique_chars * 2)
         
         # Penalty for common patterns
-        if re.search(r'(.)\1{2,}', password):
+        if cls._REPEAT_RE.search(password):
             score -= 10
         
         return min(100, max(0, score))
@@ -110,27 +213,36 @@ class AuthSecurity:
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash password using bcrypt with salt"""
-        salt = bcrypt.gensalt(rounds=12)
-        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        bcrypt = _get_bcrypt()
+        salt = bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS)
+        return _run_blocking(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+    
+    @staticmethod
+    def needs_rehash(hashed: str) -> bool:
+        """Check whether a stored hash is legacy or weaker than the configured bcrypt cost"""
+        if not hashed.startswith('$2b$'):
+            return True
+        try:
+            return int(hashed[4:6]) < Config.BCRYPT_ROUNDS
+        except ValueError:
+            return True
     
     @staticmethod
     def verify_password(password: str, hashed: str) -> bool:
         """Verify password against bcrypt hash with fallback for legacy hashes"""
+        password_bytes = password.encode('utf-8')
+        hash_length = len(hashed)
         try:
-            # Try bcrypt first (new format)
-            if hashed.startswith('$2b$'):
-                return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-        except Exception:
-            pass
-        
-        # Fallback to legacy hash formats
-        try:
+            # bcrypt (60 characters, "$2b$<cost>$...") is the common case
+            if hash_length == 60 and hashed[0] == '$':
+                return _run_blocking(_get_bcrypt().checkpw, password_bytes, hashed.encode('utf-8'))
+            # Legacy hash formats, compared in constant time
             # SHA-1 (40 characters)
-            if len(hashed) == 40:
-                return hashlib.sha1(password.encode()).hexdigest() == hashed
+            elif hash_length == 40:
+                return hmac.compare_digest(hashlib.sha1(password_bytes).hexdigest(), hashed)
             # SHA-256 (64 characters)
-            elif len(hashed) == 64:
-                return hashlib.sha256(password.encode()).hexdigest() == hashed
+            elif hash_length == 64:
+                return hmac.compare_digest(hashlib.sha256(password_bytes).hexdigest(), hashed)
         except Exception:
             pass
         
@@ -144,22 +256,16 @@ class AuthSecurity:
     @staticmethod
     def log_login_attempt(username: str, ip_address: str, user_agent: str, 
                          success: bool, failure_reason: str = None):
-        """Log login attempt for security monitoring"""
-        conn = get_db_connection()
-        cursor = get_dict_cursor(conn)
+        """Log login attempt for security monitoring (written in batches by a background thread)"""
+        # One malformed row would fail the whole batch, so fit values to the column types
+        row = (username[:50], _inet_or_none(ip_address), user_agent, success, failure_reason and failure_reason[:100])
         
-        try:
-            cursor.execute("""
-                INSERT INTO login_attempts (username, ip_address, user_agent, success, failure_reason)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (username, ip_address, user_agent, success, failure_reason))
-            conn.commit()
-        except Exception as e:
-            print(f"Error logging login attempt: {e}")
-            conn.rollback()
-        finally:
-            cursor.close()
-            conn.close()
+        _ensure_login_log_flusher()
+        with _login_log_lock:
+            _login_log_buffer.append(row)
+            batch_full = len(_login_log_buffer) >= LOGIN_LOG_BATCH_SIZE
+        if batch_full:
+            _login_log_wakeup.set()
     
     @staticmethod
     def check_account_lockout(username: str) -> Tuple[bool, Optional[datetime]]:
@@ -168,36 +274,33 @@ class AuthSecurity:
         cursor = get_dict_cursor(conn)
         
         try:
+            # Read the lock state and clear an expired lock in one round-trip;
+            # the SELECT sees the row as it was before the UPDATE
             cursor.execute("""
-                SELECT failed_login_attempts, account_locked_until
-                FROM users 
-                WHERE username = %s
-            """, (username,))
+                WITH current_lock AS (
+                    SELECT account_locked_until,
+                           account_locked_until > NOW() AS is_locked
+                    FROM users
+                    WHERE username = %s
+                ), expired_reset AS (
+                    UPDATE users
+                    SET failed_login_attempts = 0, account_locked_until = NULL
+                    WHERE username = %s AND account_locked_until <= NOW()
+                )
+                SELECT account_locked_until, is_locked FROM current_lock
+            """, (username, username))
             
             result = cursor.fetchone()
-            if not result:
-                return False, None
-            
-            failed_attempts = result['failed_login_attempts'] or 0
-            locked_until = result['account_locked_until']
+            conn.commit()
             
             # Check if account is currently locked
-            if locked_until and datetime.now() < locked_until:
-                return True, locked_until
-            
-            # Reset lock if expired
-            if locked_until and datetime.now() >= locked_until:
-                cursor.execute("""
-                    UPDATE users 
-                    SET failed_login_attempts = 0, account_locked_until = NULL
-                    WHERE username = %s
-                """, (username,))
-                conn.commit()
+            if result and result['is_locked']:
+                return True, result['account_locked_until']
             
             return False, None
             
         except Exception as e:
-            print(f"Error checking account lockout: {e}")
+            logger.exception("Error checking account lockout")
             return False, None
         finally:
             cursor.close()
@@ -210,31 +313,22 @@ class AuthSecurity:
         cursor = get_dict_cursor(conn)
         
         try:
-            # Increment failed attempts
+            # Increment failed attempts and lock the account once max attempts is reached
             cursor.execute("""
                 UPDATE users 
-                SET failed_login_attempts = COALESCE(failed_login_attempts, 0) + 1
+                SET failed_login_attempts = COALESCE(failed_login_attempts, 0) + 1,
+                    account_locked_until = CASE
+                        WHEN COALESCE(failed_login_attempts, 0) + 1 >= %s
+                        THEN NOW() + %s * INTERVAL '1 minute'
+                        ELSE account_locked_until
+                    END
                 WHERE username = %s
-                RETURNING failed_login_attempts
-            """, (username,))
-            
-            result = cursor.fetchone()
-            if result:
-                failed_attempts = result['failed_login_attempts']
-                
-                # Lock account if max attempts reached
-                if failed_attempts >= AuthSecurity.MAX_LOGIN_ATTEMPTS:
-                    lockout_until = datetime.now() + timedelta(minutes=AuthSecurity.LOCKOUT_DURATION_MINUTES)
-                    cursor.execute("""
-                        UPDATE users 
-                        SET account_locked_until = %s
-                        WHERE username = %s
-                    """, (lockout_until, username))
+            """, (AuthSecurity.MAX_LOGIN_ATTEMPTS, AuthSecurity.LOCKOUT_DURATION_MINUTES, username))
             
             conn.commit()
             
         except Exception as e:
-            print(f"Error handling failed login: {e}")
+            logger.exception("Error handling failed login")
             conn.rollback()
         finally:
             cursor.close()
@@ -257,7 +351,7 @@ class AuthSecurity:
             conn.commit()
             
         except Exception as e:
-            print(f"Error handling successful login: {e}")
+            logger.exception("Error handling successful login")
             conn.rollback()
         finally:
             cursor.close()
@@ -270,27 +364,24 @@ class AuthSecurity:
         cursor = get_dict_cursor(conn)
         
         try:
-            # Invalidate existing tokens
-            cursor.execute("""
-                UPDATE password_reset_tokens 
-                SET used = TRUE 
-                WHERE user_id = %s AND used = FALSE
-            """, (user_id,))
-            
-            # Create new token
             token = AuthSecurity.generate_secure_token()
-            expires_at = datetime.now() + timedelta(hours=AuthSecurity.TOKEN_EXPIRY_HOURS)
             
+            # Invalidate existing tokens and create the new one in a single statement
             cursor.execute("""
+                WITH invalidated AS (
+                    UPDATE password_reset_tokens 
+                    SET used = TRUE 
+                    WHERE user_id = %s AND used = FALSE
+                )
                 INSERT INTO password_reset_tokens (user_id, token, expires_at, ip_address)
-                VALUES (%s, %s, %s, %s)
-            """, (user_id, token, expires_at, ip_address))
+                VALUES (%s, %s, NOW() + %s * INTERVAL '1 hour', %s)
+            """, (user_id, user_id, token, AuthSecurity.TOKEN_EXPIRY_HOURS, _inet_or_none(ip_address)))
             
             conn.commit()
             return token
             
         except Exception as e:
-            print(f"Error creating password reset token: {e}")
+            logger.exception("Error creating password reset token")
             conn.rollback()
             return None
         finally:
@@ -305,33 +396,24 @@ class AuthSecurity:
         
         try:
             cursor.execute("""
-                SELECT user_id, expires_at, used
+                SELECT user_id
                 FROM password_reset_tokens
-                WHERE token = %s
+                WHERE token = %s AND used = FALSE AND expires_at > NOW()
             """, (token,))
             
             result = cursor.fetchone()
-            if not result:
-                return None
-            
-            if result['used']:
-                return None
-            
-            if datetime.now() > result['expires_at']:
-                return None
-            
-            return result['user_id']
+            return result['user_id'] if result else None
             
         except Exception as e:
-            print(f"Error verifying password reset token: {e}")
+            logger.exception("Error verifying password reset token")
             return None
         finally:
             cursor.close()
             conn.close()
     
     @staticmethod
-    def use_password_reset_token(token: str) -> bool:
-        """Mark password reset token as used"""
+    def consume_password_reset_token(token: str) -> Optional[int]:
+        """Atomically mark a valid, unused reset token as used and return its user_id"""
         conn = get_db_connection()
         cursor = get_dict_cursor(conn)
         
@@ -339,106 +421,49 @@ class AuthSecurity:
             cursor.execute("""
                 UPDATE password_reset_tokens 
                 SET used = TRUE 
-                WHERE token = %s AND used = FALSE
+                WHERE token = %s AND used = FALSE AND expires_at > NOW()
+                RETURNING user_id
             """, (token,))
             
+            result = cursor.fetchone()
             conn.commit()
-            return cursor.rowcount > 0
+            return result['user_id'] if result else None
             
         except Exception as e:
-            print(f"Error using password reset token: {e}")
+            logger.exception("Error consuming password reset token")
             conn.rollback()
-            return False
+            return None
         finally:
             cursor.close()
             conn.close()
-
-class EmailService:
-    """Email service for password reset and verification"""
     
     @staticmethod
-    def send_password_reset_email(email: str, username: str, reset_token: str) -> bool:
-        """Send password reset email"""
-        try:
-            reset_url = f"http://localhost:{Config.PORT}/reset-password?token={reset_token}"
-            
-            # Email content
-            subject = f"Password Reset - {Config.APP_NAME}"
-            email_body = f"""Dear {username},
+    def use_password_reset_token(token: str) -> bool:
+        """Mark password reset token as used (prefer consume_password_reset_token)"""
+        return AuthSecurity.consume_password_reset_token(token) is not None
+
+# Email subjects and bodies; only the recipient-specific $fields are filled in per send
+_APP_NAME = Config.APP_NAME.replace('$', '$$')
+_RESET_URL_PREFIX = f"http://localhost:{Config.PORT}/reset-password?token="
+_RESET_SUBJECT = f"Password Reset - {Config.APP_NAME}"
+_RESET_BODY = string.Template(f"""Dear $username,
 
-You have requested to reset your password for your {Config.APP_NAME} account.
+You have requested to reset your password for your {_APP_NAME} account.
 
 Please click the following link to reset your password:
-{reset_url}
+$reset_url
 
-This link will expire in 24 hours.
+This link will expire in {AuthSecurity.TOKEN_EXPIRY_HOURS} hours.
 
 If you did not request this password reset, please ignore this email.
 
 Best regards,
-{Config.APP_NAME} Team"""
-            
-            # Try to send real email if enabled and configured
-            if Config.EMAIL_ENABLED and Config.SMTP_USERNAME and Config.SMTP_PASSWORD and EMAIL_AVAILABLE:
-                try:
-                    # Create message
-                    msg = MimeMultipart()
-                    msg['From'] = Config.SMTP_USERNAME
-                    msg['To'] = email
-                    msg['Subject'] = subject
-                    
-                    # Add body to email
-                    msg.attach(MimeText(email_body, 'plain'))
-                    
-                    # Create SMTP session
-                    server = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT)
-                    if Config.SMTP_USE_TLS:
-                        server.starttls()  # Enable security
-                    server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
-                    
-                    # Send email
-                    text = msg.as_string()
-                    server.sendmail(Config.SMTP_USERNAME, email, text)
-                    server.quit()
-                    
-                    print(f"✅ Password reset email sent successfully to {email}")
-                    return True
-                    
-                except Exception as smtp_error:
-                    print(f"❌ Failed to send email via SMTP: {smtp_error}")
-                    print("📧 Falling back to console logging...")
-                    # Fall through to console logging
-            
-            # Console logging (fallback or when email is disabled)
-            print("=" * 60)
-            print("📧 PASSWORD RESET EMAIL")
-            print("=" * 60)
-            print(f"To: {email}")
-            print(f"Subject: {subject}")
-            print()
-            print(email_body)
-            print("=" * 60)
-            
-            if not Config.EMAIL_ENABLED:
-                print("💡 Email is disabled. Set EMAIL_ENABLED=True in .env to send real emails.")
-            elif not Config.SMTP_USERNAME or not Config.SMTP_PASSWORD:
-                print("💡 SMTP credentials not configured. Check SMTP_USERNAME and SMTP_PASSWORD in .env")
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Error in password reset email function: {e}")
-            return False
-    
-    @staticmethod
-    def send_welcome_email(email: str, username: str) -> bool:
-        """Send welcome email to new users"""
-        try:
-            # Email content
-            subject = f"Welcome to {Config.APP_NAME}!"
-            email_body = f"""Dear {username},
+{_APP_NAME} Team""")
+
+_WELCOME_SUBJECT = f"Welcome to {Config.APP_NAME}!"
+_WELCOME_BODY = string.Template(f"""Dear $username,
 
-Welcome to {Config.APP_NAME}! 🎉
+Welcome to {_APP_NAME}! 🎉
 
 Your account has been successfully created and you're now ready to start your cybersecurity learning journey.
 
@@ -453,77 +478,229 @@ Visit your dashboard to get started: http://localhost:{Config.PORT}/dashboard
 If you have any questions or need help, feel free to reach out to us.
 
 Happy learning!
-The {Config.APP_NAME} Team
+The {_APP_NAME} Team
 
 ---
-This email was sent because you registered for an account on {Config.APP_NAME}.
-If you didn't create this account, please contact us immediately."""
+This email was sent because you registered for an account on {_APP_NAME}.
+If you didn't create this account, please contact us immediately.""")
+
+# One authenticated SMTP session per process, shared by every thread/greenlet
+# under _smtp_lock so request handlers and the email worker reuse it
+_smtp_server = None
+_smtp_pid = None
+_smtp_lock = threading.RLock()
+
+# Emails are handed to a background worker so requests don't wait on SMTP
+_email_queue = queue.Queue()
+_email_worker = None
+_email_worker_pid = None
+_email_worker_lock = threading.Lock()
+
+def _email_worker_loop():
+    """Deliver queued emails until a None sentinel arrives"""
+    while True:
+        job = _email_queue.get()
+        if job is None:
+            break
+        func, args = job
+        try:
+            func(*args)
+        except Exception as e:
+            logger.exception("Error in background email worker")
+
+def _enqueue_email(func, *args) -> bool:
+    """Queue an email delivery, starting the worker thread on first use (and after a fork)"""
+    global _email_worker, _email_worker_pid
+    if _email_worker is None or _email_worker_pid != os.getpid() or not _email_worker.is_alive():
+        with _email_worker_lock:
+            if _email_worker is None or _email_worker_pid != os.getpid() or not _email_worker.is_alive():
+                _email_worker = threading.Thread(target=_email_worker_loop, name="email-worker", daemon=True)
+                _email_worker.start()
+                _email_worker_pid = os.getpid()
+    _email_queue.put((func, args))
+    return True
+
+@atexit.register
+def _drain_email_queue():
+    """Give queued emails a chance to go out before the process exits"""
+    if _email_worker is not None and _email_worker_pid == os.getpid() and _email_worker.is_alive():
+        _email_queue.put(None)
+        _email_worker.join(timeout=30)
+    EmailService._drop_smtp_connection()  # send QUIT instead of leaving the session open
+
+class EmailService:
+    """Email service for password reset and verification"""
+    
+    @staticmethod
+    def _smtp_connection():
+        """Return the process's SMTP session, reconnecting if it has gone stale; call with _smtp_lock held"""
+        global _smtp_server, _smtp_pid
+        smtplib = _get_email_modules()[0]
+        if _smtp_pid != os.getpid():
+            _smtp_server = None  # inherited across a fork; the parent owns that socket
+        server = _smtp_server
+        if server is not None:
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            EmailService._drop_smtp_connection()
+        
+        server = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT)
+        try:
+            if Config.SMTP_USE_TLS:
+                server.starttls()  # Enable security
+            server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        _smtp_server, _smtp_pid = server, os.getpid()
+        return server
+    
+    @staticmethod
+    def _drop_smtp_connection():
+        """Close the SMTP session so the next send reconnects"""
+        global _smtp_server
+        with _smtp_lock:
+            server, _smtp_server = _smtp_server, None
+            if server is None or _smtp_pid != os.getpid():
+                return
+            try:
+                server.quit()
+            except (_get_email_modules()[0].SMTPException, OSError):
+                server.close()
+    
+    @staticmethod
+    def _sendmail(to_email: str, subject: str, body: str) -> dict:
+        """Send one plain-text email over the shared SMTP session"""
+        _, MimeText, MimeMultipart = _get_email_modules()
+        msg = MimeMultipart()
+        msg['From'] = Config.SMTP_USERNAME
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MimeText(body, 'plain'))
+        
+        with _smtp_lock:
+            try:
+                server = EmailService._smtp_connection()
+                return server.sendmail(Config.SMTP_USERNAME, to_email, msg.as_string())
+            except Exception:
+                EmailService._drop_smtp_connection()
+                raise
+    
+    @staticmethod
+    def _log_email(title: str, to_email: str, subject: str, body: str):
+        """Write an email to the log instead of sending it (development fallback)"""
+        separator = "=" * 60
+        logger.info("\n%s\n📧 %s\n%s\nTo: %s\nSubject: %s\n\n%s\n%s",
+                    separator, title, separator, to_email, subject, body, separator)
+        
+        if not Config.EMAIL_ENABLED:
+            logger.info("Email is disabled. Set EMAIL_ENABLED=True in .env to send real emails.")
+        elif not Config.SMTP_USERNAME or not Config.SMTP_PASSWORD:
+            logger.info("SMTP credentials not configured. Check SMTP_USERNAME and SMTP_PASSWORD in .env")
+    
+    @staticmethod
+    def send_bulk(messages) -> int:
+        """Send (to_email, subject, body) messages over one SMTP session; returns how many were sent"""
+        if not (Config.EMAIL_ENABLED and Config.SMTP_USERNAME and Config.SMTP_PASSWORD and _get_email_modules()):
+            return 0
+        
+        sent = 0
+        for to_email, subject, body in messages:
+            try:
+                EmailService._sendmail(to_email, subject, body)
+                sent += 1
+            except Exception as e:
+                logger.warning("Failed to send email to %s: %s", to_email, e)
+        return sent
+    
+    @staticmethod
+    def send_password_reset_email(email: str, username: str, reset_token: str) -> bool:
+        """Send password reset email (in the background when EMAIL_ASYNC is set)"""
+        if Config.EMAIL_ASYNC:
+            return _enqueue_email(EmailService._deliver_password_reset_email, email, username, reset_token)
+        return EmailService._deliver_password_reset_email(email, username, reset_token)
+    
+    @staticmethod
+    def _deliver_password_reset_email(email: str, username: str, reset_token: str) -> bool:
+        """Build and send the password reset email"""
+        try:
+            # Email content
+            subject = _RESET_SUBJECT
+            email_body = _RESET_BODY.substitute(username=username, reset_url=_RESET_URL_PREFIX + reset_token)
             
             # Try to send real email if enabled and configured
-            if Config.EMAIL_ENABLED and Config.SMTP_USERNAME and Config.SMTP_PASSWORD and EMAIL_AVAILABLE:
+            if Config.EMAIL_ENABLED and Config.SMTP_USERNAME and Config.SMTP_PASSWORD and _get_email_modules():
                 try:
-                    print(f"🔄 Attempting to send welcome email to {email}...")
-                    print(f"📧 SMTP Server: {Config.SMTP_SERVER}:{Config.SMTP_PORT}")
-                    print(f"📧 From: {Config.SMTP_USERNAME}")
-                    
-                    # Create message
-                    msg = MimeMultipart()
-                    msg['From'] = Config.SMTP_USERNAME
-                    msg['To'] = email
-                    msg['Subject'] = subject
-                    
-                    # Add body to email
-                    msg.attach(MimeText(email_body, 'plain'))
-                    
-                    # Create SMTP session
-                    print("🔗 Connecting to SMTP server...")
-                    server = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT)
+                    EmailService._sendmail(email, subject, email_body)
                     
-                    if Config.SMTP_USE_TLS:
-                        print("🔒 Starting TLS encryption...")
-                        server.starttls()  # Enable security
-                    
-                    print("🔑 Authenticating with SMTP server...")
-                    server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
+                    logger.info("Password reset email sent successfully to %s", email)
+                    return True
                     
-                    # Send email
-                    print("📤 Sending email...")
-                    text = msg.as_string()
-                    result = server.sendmail(Config.SMTP_USERNAME, email, text)
-                    server.quit()
+                except Exception as smtp_error:
+                    logger.warning("Failed to send password reset email via SMTP, falling back to console logging: %s", smtp_error)
+                    # Fall through to console logging
+            
+            # Console logging (fallback or when email is disabled)
+            EmailService._log_email("PASSWORD RESET EMAIL", email, subject, email_body)
+            return True
+            
+        except Exception as e:
+            logger.exception("Error in password reset email function")
+            return False
+    
+    @staticmethod
+    def send_welcome_email(email: str, username: str, user_id: Optional[int] = None,
+                           ip_address: Optional[str] = None) -> bool:
+        """Send welcome email to new users (in the background when EMAIL_ASYNC is set).
+
+        With EMAIL_ASYNC this only queues the message; the delivery records whether
+        it was actually sent in the user's activity log.
+        """
+        if Config.EMAIL_ASYNC:
+            return _enqueue_email(EmailService._deliver_welcome_email, email, username, user_id, ip_address)
+        return EmailService._deliver_welcome_email(email, username, user_id, ip_address)
+    
+    @staticmethod
+    def _deliver_welcome_email(email: str, username: str, user_id: Optional[int] = None,
+                               ip_address: Optional[str] = None) -> bool:
+        """Build and send the welcome email, logging the outcome for user_id"""
+        try:
+            # Email content
+            subject = _WELCOME_SUBJECT
+            email_body = _WELCOME_BODY.substitute(username=username)
+            
+            # Try to send real email if enabled and configured
+            if Config.EMAIL_ENABLED and Config.SMTP_USERNAME and Config.SMTP_PASSWORD and _get_email_modules():
+                try:
+                    logger.debug("Sending welcome email to %s via %s:%s from %s",
+                                 email, Config.SMTP_SERVER, Config.SMTP_PORT, Config.SMTP_USERNAME)
+                    result = EmailService._sendmail(email, subject, email_body)
                     
                     if result:
-                        print(f"⚠️ SMTP returned warnings: {result}")
+                        logger.warning("SMTP returned warnings: %s", result)
                     
-                    print(f"✅ Welcome email sent successfully to {email}")
-                    print("💡 Check your Gmail inbox (and spam folder) in a few minutes")
+                    logger.info("Welcome email sent successfully to %s", email)
+                    if user_id:
+                        log_activity(user_id, "Welcome email sent", f"Welcome email sent to {email}", ip_address)
                     return True
                     
                 except Exception as smtp_error:
-                    print(f"❌ Failed to send welcome email via SMTP: {smtp_error}")
-                    print(f"❌ Error type: {type(smtp_error).__name__}")
-                    print("📧 Falling back to console logging...")
+                    logger.warning("Failed to send welcome email via SMTP (%s), falling back to console logging: %s",
+                                   type(smtp_error).__name__, smtp_error)
+                    if user_id:
+                        log_activity(user_id, "Welcome email failed",
+                                     f"Failed to send welcome email to {email}: {smtp_error}", ip_address)
                     # Fall through to console logging
             
             # Console logging (fallback or when email is disabled)
-            print("=" * 60)
-            print("📧 WELCOME EMAIL")
-            print("=" * 60)
-            print(f"To: {email}")
-            print(f"Subject: {subject}")
-            print()
-            print(email_body)
-            print("=" * 60)
-            
-            if not Config.EMAIL_ENABLED:
-                print("💡 Email is disabled. Set EMAIL_ENABLED=True in .env to send real emails.")
-            elif not Config.SMTP_USERNAME or not Config.SMTP_PASSWORD:
-                print("💡 SMTP credentials not configured. Check SMTP_USERNAME and SMTP_PASSWORD in .env")
-            
+            EmailService._log_email("WELCOME EMAIL", email, subject, email_body)
             return True
             
         except Exception as e:
-            print(f"❌ Error in welcome email function: {e}")
+            logger.exception("Error in welcome email function")
             return False
 
 def get_client_ip(request):
@@ -0,0 +1,76 @@
+"""
+In-process caching helpers
+Keeps slow-changing data (aggregate statistics, module metadata) out of the
+database on hot request paths
+"""
+
+import functools
+import threading
+import time
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire after ttl_seconds"""
+
+    def __init__(self, ttl_seconds=60, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        """Store value under key for ttl_seconds"""
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.max_entries:
+                self._evict()
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def delete(self, *keys):
+        """Remove the given keys if present"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def _evict(self):
+        """Drop expired entries, or the oldest one if none have expired"""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in expired:
+            del self._data[key]
+        if not expired and self._data:
+            del self._data[next(iter(self._data))]
+
+def cached(cache, prefix):
+    """Decorator: memoize fn(*args) in cache under (prefix, *args).
+
+    Empty results (None, [], {}) are not stored, so missing rows and error
+    fallbacks are looked up again on the next call.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = (prefix,) + args
+            value = cache.get(key)
+            if value is None:
+                value = fn(*args)
+                if value:
+                    cache.set(key, value)
+            return value
+        return wrapper
+    return decorator
@@ -3,6 +3,8 @@ Configuration module for OWASP Training Platform
 Handles environment variables and database configuration
 """
 import os
+from functools import lru_cache
+from types import MappingProxyType
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -15,13 +17,30 @@ class Config:
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-unsafe-secret-change-in-production')
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     PORT = int(os.getenv('FLASK_PORT', 8855))
-    
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))  # each +1 doubles hashing time
+
+    # Template Configuration
+    JINJA_CACHE_DIR = os.getenv('JINJA_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jinja_cache'))
+
+    # Cache Configuration
+    STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', 60))  # seconds
+    LEADERBOARD_CACHE_TTL = int(os.getenv('LEADERBOARD_CACHE_TTL', 30))  # seconds
+    LEADERBOARD_REFRESH_INTERVAL = int(os.getenv('LEADERBOARD_REFRESH_INTERVAL', 300))  # seconds
+    PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', 10))  # seconds
+    DOCUMENTATION_CACHE_TTL = int(os.getenv('DOCUMENTATION_CACHE_TTL', 300))  # seconds
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 300))  # modules, sections, paths, animations; seconds
+    ADMIN_CACHE_TTL = int(os.getenv('ADMIN_CACHE_TTL', 60))  # seconds
+    STATIC_PAGE_MAX_AGE = int(os.getenv('STATIC_PAGE_MAX_AGE', 3600))  # browser cache for static HTML pages, seconds
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'  # only behind a proxy that handles X-Sendfile
+
     # PostgreSQL Database Configuration
     DB_HOST = os.getenv('DB_HOST', 'localhost')
     DB_PORT = int(os.getenv('DB_PORT', 5432))
     DB_NAME = os.getenv('DB_NAME', 'owasp_training')
     DB_USER = os.getenv('DB_USER', 'owasp_user')
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'password')
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 4))  # idle connections kept open per process
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 32))
     
     # Database URL for SQLAlchemy (if needed later)
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
@@ -37,17 +56,19 @@ class Config:
     SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
     SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'True').lower() == 'true'
     EMAIL_ENABLED = os.getenv('EMAIL_ENABLED', 'False').lower() == 'true'
+    EMAIL_ASYNC = os.getenv('EMAIL_ASYNC', 'True').lower() == 'true'  # send from a background thread
     
     @classmethod
+    @lru_cache(maxsize=None)
     def get_db_params(cls):
-        """Get database connection parameters as a dictionary"""
-        return {
+        """Get database connection parameters as a read-only mapping, built once per config class"""
+        return MappingProxyType({
             'host': cls.DB_HOST,
             'port': cls.DB_PORT,
             'database': cls.DB_NAME,
             'user': cls.DB_USER,
             'password': cls.DB_PASSWORD
-        }
+        })
 
 class DevelopmentConfig(Config):
     """Development configuration"""
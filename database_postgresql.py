@@ -1,29 +1,147 @@
 # database_postgresql.py - PostgreSQL version of database module
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
-import hashlib
+import psycopg2.pool
 import os
-import json
+import copy
+import functools
+import ipaddress
+import logging
+import atexit
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from types import MappingProxyType
 from datetime import datetime, timedelta, date
 from config import Config
+from cache_utils import TTLCache, cached
+
+# OWASP Top 10 module sequence and a precomputed successor lookup
+MODULE_SEQUENCE = ("A01", "A02", "A03", "A04", "A05", "A06", "A07", "A08", "A09", "A10")
+NEXT_MODULE_ID = dict(zip(MODULE_SEQUENCE, MODULE_SEQUENCE[1:]))
+
+# Handlers are attached by the app (see app.py); scripts can call logging.basicConfig()
+logger = logging.getLogger('database_postgresql')
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection whose close() returns it to the pool instead of disconnecting.
+
+    Lets every existing ``conn.close()`` in a finally block release pooled
+    connections without changes at the call sites.
+    """
+    _releasing = False
+    prepared_statements = frozenset()  # replaced by a per-connection set on first PREPARE
+
+    def close(self):
+        pool = _connection_pool
+        if pool is None or self._releasing or self.closed:
+            return super().close()
+        self._releasing = True  # putconn() calls close() itself when the pool is full
+        try:
+            pool.putconn(self)
+        except psycopg2.pool.PoolError:
+            super().close()  # Not checked out from the current pool (e.g. after a fork)
+        finally:
+            self._releasing = False
+
+_connection_pool = None
+_connection_pool_pid = None
+_connection_pool_lock = threading.Lock()
+
+def _get_connection_pool():
+    """Create the process-wide connection pool on first use (and again after a fork)"""
+    global _connection_pool, _connection_pool_pid
+    if _connection_pool is None or _connection_pool_pid != os.getpid():
+        with _connection_pool_lock:
+            if _connection_pool is None or _connection_pool_pid != os.getpid():
+                _connection_pool = psycopg2.pool.ThreadedConnectionPool(
+                    Config.DB_POOL_MIN, Config.DB_POOL_MAX,
+                    connection_factory=PooledConnection,
+                    **Config.get_db_params()
+                )
+                _connection_pool_pid = os.getpid()
+    return _connection_pool
 
 def get_db_connection():
-    """Get PostgreSQL database connection with dict cursor"""
+    """Get a PostgreSQL connection from the pool; close() hands it back"""
     try:
-        conn = psycopg2.connect(**Config.get_db_params())
+        try:
+            conn = _get_connection_pool().getconn()
+        except psycopg2.pool.PoolError:
+            # Pool exhausted: fall back to a one-off connection rather than failing the request
+            conn = psycopg2.connect(connection_factory=PooledConnection, **Config.get_db_params())
         conn.autocommit = False  # Use transactions
         return conn
     except psycopg2.Error as e:
-        print(f"Database connection error: {e}")
+        logger.error("Database connection error: %s", e)
         raise
 
-def get_dict_cursor(conn):
-    """Get a dictionary cursor from connection"""
-    return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+def execute_prepared(cursor, name, sql, params):
+    """Execute sql (written with $1, $2... placeholders) as a named prepared statement.
+
+    The statement is PREPAREd the first time each connection sees it, so hot
+    lookups skip parsing and planning on every later call from the pool.
+    """
+    conn = cursor.connection
+    if name not in conn.prepared_statements:
+        cursor.execute(f'PREPARE {name} AS {sql}')
+        if not isinstance(conn.prepared_statements, set):
+            conn.prepared_statements = set()
+        conn.prepared_statements.add(name)
+    cursor.execute(f'EXECUTE {name} ({", ".join(["%s"] * len(params))})', params)
+
+@contextmanager
+def db_connection():
+    """Check out a pooled connection for a with-block; it goes back to the pool on exit"""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+@atexit.register
+def close_connection_pool():
+    """Close this process's pooled connections on shutdown"""
+    global _connection_pool
+    pool = _connection_pool
+    if pool is not None and _connection_pool_pid == os.getpid():
+        _connection_pool = None
+        pool.closeall()
+
+def get_dict_cursor(conn, name=None):
+    """Get a dictionary cursor from connection (server-side when a name is given)"""
+    return conn.cursor(name, cursor_factory=psycopg2.extras.RealDictCursor)
+
+def with_cursor(dict_cursor=True, default=None):
+    """Decorator: run fn(cursor, *args, **kwargs) on a pooled connection.
+
+    Commits on success. On error it rolls back, logs, and returns a copy of
+    default. The cursor is closed and the connection handed back either way.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with db_connection() as conn:
+                cursor = get_dict_cursor(conn) if dict_cursor else conn.cursor()
+                try:
+                    result = fn(cursor, *args, **kwargs)
+                    conn.commit()
+                    return result
+                except Exception:
+                    conn.rollback()
+                    logger.exception("Error in %s", fn.__name__)
+                    return copy.copy(default)
+                finally:
+                    cursor.close()
+        return wrapper
+    return decorator
 
 def hash_password(password):
-    """Hash password using SHA-256 (simple for demo)"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash password with bcrypt (same scheme as AuthSecurity.hash_password)"""
+    from auth_security import AuthSecurity
+    return AuthSecurity.hash_password(password)
 
 def init_database():
     """Initialize database with tables and default data"""
@@ -31,60 +149,44 @@ def init_database():
     cursor = get_dict_cursor(conn)
     
     try:
-        # Read and execute schema migration
-        schema_file = os.path.join(os.path.dirname(__file__), 'migrations', '001_initial_schema.sql')
-        if os.path.exists(schema_file):
-            with open(schema_file, 'r', encoding='utf-8') as f:
-                cursor.execute(f.read())
-        
-        # Read and execute default data migration
-        data_file = os.path.join(os.path.dirname(__file__), 'migrations', '002_default_data.sql')
-        if os.path.exists(data_file):
-            with open(data_file, 'r', encoding='utf-8') as f:
-                cursor.execute(f.read())
-        
-        # Apply moderator removal migration
-        moderator_removal_file = os.path.join(os.path.dirname(__file__), 'migrations', '003_remove_moderator.sql')
-        if os.path.exists(moderator_removal_file):
-            with open(moderator_removal_file, 'r', encoding='utf-8') as f:
-                cursor.execute(f.read())
-        
-        # Apply enhanced authentication migration
-        enhanced_auth_file = os.path.join(os.path.dirname(__file__), 'migrations', '004_enhanced_auth.sql')
-        if os.path.exists(enhanced_auth_file):
-            with open(enhanced_auth_file, 'r', encoding='utf-8') as f:
-                cursor.execute(f.read())
-        
-        # Apply assessments and documentation migration
-        assessments_file = os.path.join(os.path.dirname(__file__), 'migrations', '005_assessments_documentation.sql')
-        if os.path.exists(assessments_file):
-            with open(assessments_file, 'r', encoding='utf-8') as f:
-                cursor.execute(f.read())
-        
-        # Apply assessments and documentation data migration
-        assessments_data_file = os.path.join(os.path.dirname(__file__), 'migrations', '006_assessments_documentation_data.sql')
-        if os.path.exists(assessments_data_file):
-            with open(assessments_data_file, 'r', encoding='utf-8') as f:
-                cursor.execute(f.read())
-        
-        # Apply modules and animations migration
-        modules_file = os.path.join(os.path.dirname(__file__), 'migrations', '007_modules_animations.sql')
-        if os.path.exists(modules_file):
-            with open(modules_file, 'r', encoding='utf-8') as f:
-                cursor.execute(f.read())
-        
-        # Apply modules and animations data migration
-        modules_data_file = os.path.join(os.path.dirname(__file__), 'migrations', '008_modules_animations_data.sql')
-        if os.path.exists(modules_data_file):
-            with open(modules_data_file, 'r', encoding='utf-8') as f:
-                cursor.execute(f.read())
+        # Bootstrap is rerunnable, so don't wait on the WAL flush when it commits
+        cursor.execute("SET LOCAL synchronous_commit = OFF")
+        
+        # Same tracking table as run_migrations.py, so both skip what the other applied
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                id SERIAL PRIMARY KEY,
+                filename VARCHAR(255) UNIQUE NOT NULL,
+                executed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute('SELECT filename FROM schema_migrations')
+        applied = {row['filename'] for row in cursor.fetchall()}
+        
+        # Read every pending migration (numbered files, in order) and run them in one round trip
+        migrations_dir = os.path.join(os.path.dirname(__file__), 'migrations')
+        pending = sorted(
+            filename for filename in os.listdir(migrations_dir)
+            if filename.endswith('.sql') and filename not in applied
+        ) if os.path.isdir(migrations_dir) else []
+        
+        if pending:
+            parts = []
+            for filename in pending:
+                with open(os.path.join(migrations_dir, filename), 'r', encoding='utf-8') as f:
+                    parts.append(f.read())
+            cursor.execute("\n;\n".join(parts))
+            psycopg2.extras.execute_values(
+                cursor, 'INSERT INTO schema_migrations (filename) VALUES %s ON CONFLICT (filename) DO NOTHING',
+                [(filename,) for filename in pending]
+            )
         
         conn.commit()
-        print(f"PostgreSQL database initialized successfully")
+        logger.info("PostgreSQL database initialized successfully")
         
     except Exception as e:
         conn.rollback()
-        print(f"Error initializing database: {e}")
+        logger.exception("Error initializing database")
     finally:
         cursor.close()
         conn.close()
@@ -97,36 +199,38 @@ def create_user_enhanced(username, name, email, hashed_password, ip_address=None
     try:
         # Normalize empty email to None
         email = email if email else None
-        # Check if username or email already exists (ignore NULL emails)
-        cursor.execute('SELECT id FROM users WHERE username = %s OR (email = %s AND email IS NOT NULL)', (username, email))
-        if cursor.fetchone():
-            return None
-        # Insert required columns per schema
+        # Insert the user plus their level and streak rows in one statement; no row
+        # comes back if the username is taken (UNIQUE) or the email is already
+        # registered (NULL emails never match)
         cursor.execute(
             """
-            INSERT INTO users (username, name, email, password_hash, joined_date, xp)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
+            WITH new_user AS (
+                INSERT INTO users (username, name, email, password_hash, joined_date, xp)
+                SELECT %(username)s, %(name)s, %(email)s, %(password_hash)s, %(joined_date)s, 0
+                WHERE NOT EXISTS (SELECT 1 FROM users WHERE email = %(email)s)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            ), new_levels AS (
+                INSERT INTO user_levels (user_id, level, current_xp, total_xp)
+                SELECT id, 1, 0, 0 FROM new_user
+            )
+            INSERT INTO user_streaks (user_id, current_streak, longest_streak)
+            SELECT id, 0, 0 FROM new_user
+            RETURNING user_id AS id
             """,
-            (username, name, email, hashed_password, date.today(), 0)
+            {
+                'username': username,
+                'name': name,
+                'email': email,
+                'password_hash': hashed_password,
+                'joined_date': date.today()
+            }
         )
         result = cursor.fetchone()
-        user_id = result['id'] if result else None
-        if user_id:
-            cursor.execute(
-                """
-                INSERT INTO user_levels (user_id, level, current_xp, total_xp)
-                VALUES (%s, 1, 0, 0)
-                """,
-                (user_id,)
-            )
-            cursor.execute(
-                """
-                INSERT INTO user_streaks (user_id, current_streak, longest_streak)
-                VALUES (%s, 0, 0)
-                """,
-                (user_id,)
-            )
+        if result is None:
+            conn.rollback()
+            return None  # Username or email already taken
+        user_id = result['id']
         conn.commit()
         # Best-effort logging (don't fail user creation if this errors)
         try:
@@ -143,64 +247,37 @@ def create_user_enhanced(username, name, email, hashed_password, ip_address=None
     finally:
         cursor.close()
         conn.close()
-def get_user_by_email(email):
+@with_cursor()
+def get_user_by_email(cursor, email):
     """Get user by email address"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        cursor.execute('SELECT * FROM users WHERE email = %s AND is_active = TRUE', (email,))
-        user = cursor.fetchone()
-        return dict(user) if user else None
-    except Exception as e:
-        print(f"Error getting user by email: {e}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
+    execute_prepared(cursor, 'user_by_email', '''
+        SELECT * FROM users WHERE email = $1 AND is_active = TRUE
+    ''', (email,))
+    user = cursor.fetchone()
+    return user
 
 
-def get_user_by_username(username):
+@with_cursor()
+def get_user_by_username(cursor, username):
     """Get user by username"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    execute_prepared(cursor, 'user_by_username', '''
+        SELECT id, username, name, email, xp, joined_date, is_active
+        FROM users WHERE username = $1
+    ''', (username,))
     
-    try:
-        cursor.execute('''
-            SELECT id, username, name, email, xp, joined_date, is_active
-            FROM users WHERE username = %s
-        ''', (username,))
-        
-        user = cursor.fetchone()
-        return dict(user) if user else None
-        
-    except Exception as e:
-        print(f"Error getting user by username: {e}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
+    user = cursor.fetchone()
+    return user
 
-def get_user_by_id(user_id):
+@with_cursor()
+def get_user_by_id(cursor, user_id):
     """Get user by ID"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    execute_prepared(cursor, 'user_by_id', '''
+        SELECT id, username, name, email, xp, joined_date, is_active
+        FROM users WHERE id = $1
+    ''', (user_id,))
     
-    try:
-        cursor.execute('''
-            SELECT id, username, name, email, xp, joined_date, is_active
-            FROM users WHERE id = %s
-        ''', (user_id,))
-        
-        user = cursor.fetchone()
-        return dict(user) if user else None
-        
-    except Exception as e:
-        print(f"Error getting user by ID: {e}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
+    user = cursor.fetchone()
+    return user
 
 def update_user_password(user_id, hashed_password):
     """Update user password"""
@@ -221,7 +298,7 @@ def update_user_password(user_id, hashed_password):
         return cursor.rowcount > 0
     except Exception as e:
         conn.rollback()
-        print(f"Error updating password: {e}")
+        logger.exception("Error updating password")
         return False
     finally:
         cursor.close()
@@ -231,20 +308,34 @@ def update_user_password(user_id, hashed_password):
 # DOCUMENTATION FUNCTIONS
 # ================================
 
+# Published documentation, keyed by "all" / ("module", module_id); cleared on admin edits
+DOCUMENTATION_CACHE = TTLCache(ttl_seconds=Config.DOCUMENTATION_CACHE_TTL)
+_MISSING = object()
+
+def invalidate_documentation_cache():
+    """Drop cached documentation after it is created, edited or deleted"""
+    DOCUMENTATION_CACHE.clear()
+
 def get_documentation_by_module(module_id):
     """Get documentation for a specific module"""
+    cache_key = ('module', module_id)
+    doc = DOCUMENTATION_CACHE.get(cache_key, _MISSING)
+    if doc is not _MISSING:
+        return doc
+    
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
     try:
-        cursor.execute('''
+        execute_prepared(cursor, 'documentation_by_module', '''
             SELECT * FROM documentation 
-            WHERE module_id = %s AND is_published = TRUE
+            WHERE module_id = $1 AND is_published = TRUE
         ''', (module_id,))
         doc = cursor.fetchone()
-        return dict(doc) if doc else None
+        DOCUMENTATION_CACHE.set(cache_key, doc)
+        return doc
     except Exception as e:
-        print(f"Error getting documentation: {e}")
+        logger.exception("Error getting documentation")
         return None
     finally:
         cursor.close()
@@ -252,6 +343,10 @@ def get_documentation_by_module(module_id):
 
 def get_all_documentation():
     """Get all published documentation"""
+    docs = DOCUMENTATION_CACHE.get('all')
+    if docs is not None:
+        return docs
+    
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
@@ -262,9 +357,10 @@ def get_all_documentation():
             ORDER BY module_id
         ''')
         docs = cursor.fetchall()
-        return [dict(doc) for doc in docs] if docs else []
+        DOCUMENTATION_CACHE.set('all', docs)
+        return docs
     except Exception as e:
-        print(f"Error getting all documentation: {e}")
+        logger.exception("Error getting all documentation")
         return []
     finally:
         cursor.close()
@@ -301,7 +397,7 @@ def update_documentation_progress(user_id, module_id, progress_percentage, time_
         conn.commit()
         return True
     except Exception as e:
-        print(f"Error updating documentation progress: {e}")
+        logger.exception("Error updating documentation progress")
         conn.rollback()
         return False
     finally:
@@ -322,7 +418,7 @@ def get_user_documentation_progress(user_id, module_id=None):
                 WHERE udp.user_id = %s AND udp.module_id = %s
             ''', (user_id, module_id))
             progress = cursor.fetchone()
-            return dict(progress) if progress else None
+            return progress
         else:
             cursor.execute('''
                 SELECT udp.*, d.title, d.module_id
@@ -332,9 +428,9 @@ def get_user_documentation_progress(user_id, module_id=None):
                 ORDER BY udp.module_id
             ''', (user_id,))
             progress_list = cursor.fetchall()
-            return [dict(p) for p in progress_list] if progress_list else []
+            return progress_list
     except Exception as e:
-        print(f"Error getting documentation progress: {e}")
+        logger.exception("Error getting documentation progress")
         return None if module_id else []
     finally:
         cursor.close()
@@ -344,22 +440,51 @@ def get_user_documentation_progress(user_id, module_id=None):
 # ASSESSMENT FUNCTIONS
 # ================================
 
-def get_assessment_questions(module_id):
+@with_cursor(default=[])
+def get_assessment_questions(cursor, module_id):
     """Get all active assessment questions for a module"""
+    # Options and explanation live in the same row (options is JSONB),
+    # so this one query carries everything grading and review need
+    execute_prepared(cursor, 'assessment_questions_by_module', '''
+        SELECT id, module_id, question_text, question_type, options,
+               correct_answer, explanation, difficulty, points, order_index
+        FROM assessment_questions 
+        WHERE module_id = $1 AND is_active = TRUE 
+        ORDER BY order_index, id
+    ''', (module_id,))
+    # RealDictRow is already a dict; skip the per-row copy
+    return cursor.fetchall()
+
+def grade_quiz_answers(module_id, answers):
+    """Grade quiz answer indexes against the module's questions in SQL.
+
+    ``answers`` holds one option index per question in display order
+    (-1 for unanswered). Returns ``(correct_answers, total_questions)``.
+    """
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
     try:
         cursor.execute('''
-            SELECT * FROM assessment_questions 
-            WHERE module_id = %s AND is_active = TRUE 
-            ORDER BY order_index, id
-        ''', (module_id,))
-        questions = cursor.fetchall()
-        return [dict(q) for q in questions] if questions else []
+            WITH q AS (
+                SELECT correct_answer,
+                       ROW_NUMBER() OVER (ORDER BY order_index, id) AS ordinal
+                FROM assessment_questions
+                WHERE module_id = %s AND is_active = TRUE
+            )
+            SELECT COUNT(*) AS total_questions,
+                   COUNT(*) FILTER (
+                       WHERE (ARRAY['a', 'b', 'c', 'd'])[u.ans + 1] = q.correct_answer
+                   ) AS correct_answers
+            FROM q
+            LEFT JOIN unnest(%s::int[]) WITH ORDINALITY AS u(ans, ordinal)
+                ON u.ordinal = q.ordinal
+        ''', (module_id, answers))
+        row = cursor.fetchone()
+        return row['correct_answers'], row['total_questions']
     except Exception as e:
-        print(f"Error getting assessment questions: {e}")
-        return []
+        logger.exception("Error grading quiz answers")
+        return 0, 0
     finally:
         cursor.close()
         conn.close()
@@ -390,111 +515,13 @@ def create_assessment_attempt(user_id, module_id, total_questions):
         conn.commit()
         return attempt_id
     except Exception as e:
-        print(f"Error creating assessment attempt: {e}")
+        logger.exception("Error creating assessment attempt")
         conn.rollback()
         return None
     finally:
         cursor.close()
         conn.close()
 
-def is_module_completed(user_id, module_id):
-    """Check if a module is completed by the user"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        # Check if assessment is completed with passing score (70% or higher)
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM user_assessment_attempts 
-            WHERE user_id = %s AND module_id = %s AND is_completed = TRUE 
-            AND score_percentage >= 70
-        ''', (user_id, module_id))
-        
-        assessment_completed = cursor.fetchone()['count'] > 0
-        
-        # Check modern gamification system activities first
-        cursor.execute('''
-            SELECT COUNT(DISTINCT activity_type) as completed_types
-            FROM activity_completions 
-            WHERE user_id = %s AND module_id = %s
-        ''', (user_id, module_id))
-        
-        modern_activities = cursor.fetchone()['completed_types']
-        
-        # Fallback to legacy learning_activities table
-        cursor.execute('''
-            SELECT COUNT(DISTINCT activity_type) as completed_types
-            FROM learning_activities 
-            WHERE user_id = %s AND module_id = %s AND completed_at IS NOT NULL
-        ''', (user_id, module_id))
-        
-        legacy_activities = cursor.fetchone()['completed_types']
-        
-        # Use the higher count between modern and legacy systems
-        completed_activities = max(modern_activities, legacy_activities)
-        
-        # Module completion logic:
-        # Option 1: Assessment passed (70%+) AND at least 1 other activity
-        # Option 2: At least 2 activities completed (lowered since assessments aren't working)
-        return (assessment_completed and completed_activities >= 1) or (completed_activities >= 2)
-        
-    except Exception as e:
-        print(f"Error checking module completion: {e}")
-        return False
-    finally:
-        cursor.close()
-        conn.close()
-
-def get_next_module_id(current_module_id):
-    """Get the next module ID in sequence"""
-    modules = ["A01", "A02", "A03", "A04", "A05", "A06", "A07", "A08", "A09", "A10"]
-    
-    try:
-        current_index = modules.index(current_module_id)
-        if current_index < len(modules) - 1:
-            return modules[current_index + 1]
-        return None  # Last module
-    except ValueError:
-        return None
-
-def unlock_next_module(user_id, current_module_id):
-    """Unlock the next module for the user"""
-    next_module_id = get_next_module_id(current_module_id)
-    
-    if not next_module_id:
-        return None  # No next module to unlock
-    
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        # Check if next module is already unlocked
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM user_progress 
-            WHERE user_id = %s AND module_id = %s
-        ''', (user_id, next_module_id))
-        
-        if cursor.fetchone()['count'] > 0:
-            return next_module_id  # Already unlocked
-        
-        # Unlock the next module by creating a progress entry with 0 XP
-        cursor.execute('''
-            INSERT INTO user_progress (user_id, module_id, xp_earned)
-            VALUES (%s, %s, 0)
-            ON CONFLICT (user_id, module_id) DO NOTHING
-        ''', (user_id, next_module_id))
-        
-        conn.commit()
-        return next_module_id
-        
-    except Exception as e:
-        conn.rollback()
-        print(f"Error unlocking next module: {e}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
-
 def complete_assessment_attempt(attempt_id, answers, correct_answers, time_taken):
     """Complete an assessment attempt with results"""
     conn = get_db_connection()
@@ -514,180 +541,164 @@ def complete_assessment_attempt(attempt_id, answers, correct_answers, time_taken
                 is_completed = TRUE,
                 answers = %s
             WHERE id = %s
-        ''', (total_questions, correct_answers, score_percentage, time_taken, json.dumps(answers), attempt_id))
+        ''', (total_questions, correct_answers, score_percentage, time_taken, psycopg2.extras.Json(answers), attempt_id))
         
         conn.commit()
         return True
     except Exception as e:
-        print(f"Error completing assessment attempt: {e}")
+        logger.exception("Error completing assessment attempt")
         conn.rollback()
         return False
     finally:
         cursor.close()
         conn.close()
 
-def get_user_assessment_attempts(user_id, module_id=None):
+@with_cursor(default=[])
+def get_user_assessment_attempts(cursor, user_id, module_id=None):
     """Get user's assessment attempts"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    if module_id:
+        cursor.execute('''
+            SELECT * FROM user_assessment_attempts 
+            WHERE user_id = %s AND module_id = %s 
+            ORDER BY attempt_number DESC
+        ''', (user_id, module_id))
+    else:
+        cursor.execute('''
+            SELECT * FROM user_assessment_attempts 
+            WHERE user_id = %s 
+            ORDER BY module_id, attempt_number DESC
+        ''', (user_id,))
     
-    try:
-        if module_id:
-            cursor.execute('''
-                SELECT * FROM user_assessment_attempts 
-                WHERE user_id = %s AND module_id = %s 
-                ORDER BY attempt_number DESC
-            ''', (user_id, module_id))
-        else:
-            cursor.execute('''
-                SELECT * FROM user_assessment_attempts 
-                WHERE user_id = %s 
-                ORDER BY module_id, attempt_number DESC
-            ''', (user_id,))
-        
-        attempts = cursor.fetchall()
-        return [dict(a) for a in attempts] if attempts else []
-    except Exception as e:
-        print(f"Error getting assessment attempts: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+    attempts = cursor.fetchall()
+    return attempts
 
-def get_assessment_statistics(module_id=None):
+@with_cursor(default=[])
+def get_assessment_statistics(cursor, module_id=None):
     """Get assessment statistics"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    if module_id:
+        cursor.execute('''
+            SELECT 
+                module_id,
+                COUNT(*) as total_attempts,
+                COUNT(DISTINCT user_id) as unique_users,
+                AVG(score_percentage) as avg_score,
+                MAX(score_percentage) as max_score,
+                MIN(score_percentage) as min_score,
+                AVG(time_taken) as avg_time_taken
+            FROM user_assessment_attempts 
+            WHERE module_id = %s AND is_completed = TRUE
+            GROUP BY module_id
+        ''', (module_id,))
+    else:
+        cursor.execute('''
+            SELECT 
+                module_id,
+                COUNT(*) as total_attempts,
+                COUNT(DISTINCT user_id) as unique_users,
+                AVG(score_percentage) as avg_score,
+                MAX(score_percentage) as max_score,
+                MIN(score_percentage) as min_score,
+                AVG(time_taken) as avg_time_taken
+            FROM user_assessment_attempts 
+            WHERE is_completed = TRUE
+            GROUP BY module_id
+            ORDER BY module_id
+        ''')
     
-    try:
-        if module_id:
-            cursor.execute('''
-                SELECT 
-                    module_id,
-                    COUNT(*) as total_attempts,
-                    COUNT(DISTINCT user_id) as unique_users,
-                    AVG(score_percentage) as avg_score,
-                    MAX(score_percentage) as max_score,
-                    MIN(score_percentage) as min_score,
-                    AVG(time_taken) as avg_time_taken
-                FROM user_assessment_attempts 
-                WHERE module_id = %s AND is_completed = TRUE
-                GROUP BY module_id
-            ''', (module_id,))
-        else:
-            cursor.execute('''
-                SELECT 
-                    module_id,
-                    COUNT(*) as total_attempts,
-                    COUNT(DISTINCT user_id) as unique_users,
-                    AVG(score_percentage) as avg_score,
-                    MAX(score_percentage) as max_score,
-                    MIN(score_percentage) as min_score,
-                    AVG(time_taken) as avg_time_taken
-                FROM user_assessment_attempts 
-                WHERE is_completed = TRUE
-                GROUP BY module_id
-                ORDER BY module_id
-            ''')
-        
-        stats = cursor.fetchall()
-        return [dict(s) for s in stats] if stats else []
-    except Exception as e:
-        print(f"Error getting assessment statistics: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+    stats = cursor.fetchall()
+    return stats
 
 # ================================
 # BADGE SYSTEM FUNCTIONS
 # ================================
 
+# Badge awarded for each completed OWASP module (read-only; built once at import)
+MODULE_BADGES = MappingProxyType({
+    'A01': {
+        'id': 'a01_master',
+        'name': 'Access Control Master',
+        'description': 'Completed A01 - Broken Access Control module',
+        'icon': 'ðŸ”',
+        'color': '#EF4444',
+        'xp_reward': 100
+    },
+    'A02': {
+        'id': 'a02_master',
+        'name': 'Crypto Guardian',
+        'description': 'Completed A02 - Cryptographic Failures module',
+        'icon': 'ðŸ”‘',
+        'color': '#F59E0B',
+        'xp_reward': 100
+    },
+    'A03': {
+        'id': 'a03_master',
+        'name': 'Injection Hunter',
+        'description': 'Completed A03 - Injection module',
+        'icon': 'ðŸ’‰',
+        'color': '#DC2626',
+        'xp_reward': 100
+    },
+    'A04': {
+        'id': 'a04_master',
+        'name': 'Design Architect',
+        'description': 'Completed A04 - Insecure Design module',
+        'icon': 'ðŸ—ï¸',
+        'color': '#7C3AED',
+        'xp_reward': 100
+    },
+    'A05': {
+        'id': 'a05_master',
+        'name': 'Configuration Expert',
+        'description': 'Completed A05 - Security Misconfiguration module',
+        'icon': 'âš™ï¸',
+        'color': '#059669',
+        'xp_reward': 100
+    },
+    'A06': {
+        'id': 'a06_master',
+        'name': 'Component Auditor',
+        'description': 'Completed A06 - Vulnerable Components module',
+        'icon': 'ðŸ§©',
+        'color': '#0891B2',
+        'xp_reward': 100
+    },
+    'A07': {
+        'id': 'a07_master',
+        'name': 'Identity Guardian',
+        'description': 'Completed A07 - Authentication Failures module',
+        'icon': 'ðŸ›¡ï¸',
+        'color': '#DB2777',
+        'xp_reward': 100
+    },
+    'A08': {
+        'id': 'a08_master',
+        'name': 'Integrity Keeper',
+        'description': 'Completed A08 - Software Integrity Failures module',
+        'icon': 'ðŸ“œ',
+        'color': '#9333EA',
+        'xp_reward': 100
+    },
+    'A09': {
+        'id': 'a09_master',
+        'name': 'Monitoring Specialist',
+        'description': 'Completed A09 - Logging & Monitoring Failures module',
+        'icon': 'ðŸ“Š',
+        'color': '#EA580C',
+        'xp_reward': 100
+    },
+    'A10': {
+        'id': 'a10_master',
+        'name': 'SSRF Defender',
+        'description': 'Completed A10 - Server-Side Request Forgery module',
+        'icon': 'ðŸŒ',
+        'color': '#16A34A',
+        'xp_reward': 100
+    }
+})
+
 def get_module_badges():
     """Get all available module badges"""
-    badges = {
-        'A01': {
-            'id': 'a01_master',
-            'name': 'Access Control Master',
-            'description': 'Completed A01 - Broken Access Control module',
-            'icon': 'ðŸ”',
-            'color': '#EF4444',
-            'xp_reward': 100
-        },
-        'A02': {
-            'id': 'a02_master',
-            'name': 'Crypto Guardian',
-            'description': 'Completed A02 - Cryptographic Failures module',
-            'icon': 'ðŸ”‘',
-            'color': '#F59E0B',
-            'xp_reward': 100
-        },
-        'A03': {
-            'id': 'a03_master',
-            'name': 'Injection Hunter',
-            'description': 'Completed A03 - Injection module',
-            'icon': 'ðŸ’‰',
-            'color': '#DC2626',
-            'xp_reward': 100
-        },
-        'A04': {
-            'id': 'a04_master',
-            'name': 'Design Architect',
-            'description': 'Completed A04 - Insecure Design module',
-            'icon': 'ðŸ—ï¸',
-            'color': '#7C3AED',
-            'xp_reward': 100
-        },
-        'A05': {
-            'id': 'a05_master',
-            'name': 'Configuration Expert',
-            'description': 'Completed A05 - Security Misconfiguration module',
-            'icon': 'âš™ï¸',
-            'color': '#059669',
-            'xp_reward': 100
-        },
-        'A06': {
-            'id': 'a06_master',
-            'name': 'Component Auditor',
-            'description': 'Completed A06 - Vulnerable Components module',
-            'icon': 'ðŸ§©',
-            'color': '#0891B2',
-            'xp_reward': 100
-        },
-        'A07': {
-            'id': 'a07_master',
-            'name': 'Identity Guardian',
-            'description': 'Completed A07 - Authentication Failures module',
-            'icon': 'ðŸ›¡ï¸',
-            'color': '#DB2777',
-            'xp_reward': 100
-        },
-        'A08': {
-            'id': 'a08_master',
-            'name': 'Integrity Keeper',
-            'description': 'Completed A08 - Software Integrity Failures module',
-            'icon': 'ðŸ“œ',
-            'color': '#9333EA',
-            'xp_reward': 100
-        },
-        'A09': {
-            'id': 'a09_master',
-            'name': 'Monitoring Specialist',
-            'description': 'Completed A09 - Logging & Monitoring Failures module',
-            'icon': 'ðŸ“Š',
-            'color': '#EA580C',
-            'xp_reward': 100
-        },
-        'A10': {
-            'id': 'a10_master',
-            'name': 'SSRF Defender',
-            'description': 'Completed A10 - Server-Side Request Forgery module',
-            'icon': 'ðŸŒ',
-            'color': '#16A34A',
-            'xp_reward': 100
-        }
-    }
-    return badges
+    return MODULE_BADGES
 
 def award_module_badge(user_id, module_id):
     """Award badge for completing a module"""
@@ -695,27 +706,22 @@ def award_module_badge(user_id, module_id):
     cursor = conn.cursor()
     
     try:
-        badges = get_module_badges()
-        badge_info = badges.get(module_id)
+        badge_info = MODULE_BADGES.get(module_id)
         
         if not badge_info:
             return False
         
-        # Check if badge already awarded
-        cursor.execute('''
-            SELECT id FROM user_achievements 
-            WHERE user_id = %s AND achievement_id = %s
-        ''', (user_id, badge_info['id']))
-        
-        if cursor.fetchone():
-            return False  # Already has this badge
-        
-        # Award the badge
+        # Award the badge; RETURNING tells us whether it was new without a prior SELECT
         cursor.execute('''
             INSERT INTO user_achievements (user_id, achievement_id, achievement_name, description, icon, earned_at)
             VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id, achievement_id) DO NOTHING
+            RETURNING id
         ''', (user_id, badge_info['id'], badge_info['name'], badge_info['description'], badge_info['icon']))
         
+        if not cursor.fetchone():
+            return False  # Already has this badge
+        
         # Award badge XP bonus
         cursor.execute('''
             UPDATE users SET xp = xp + %s WHERE id = %s
@@ -735,34 +741,24 @@ def award_module_badge(user_id, module_id):
         
     except Exception as e:
         conn.rollback()
-        print(f"Error awarding badge: {e}")
+        logger.exception("Error awarding badge")
         return False
     finally:
         cursor.close()
         conn.close()
 
-def get_user_badges(user_id):
+@with_cursor(default=[])
+def get_user_badges(cursor, user_id):
     """Get all badges earned by a user"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    cursor.execute('''
+        SELECT achievement_id, achievement_name, description, icon, earned_at
+        FROM user_achievements 
+        WHERE user_id = %s
+        ORDER BY earned_at DESC
+    ''', (user_id,))
     
-    try:
-        cursor.execute('''
-            SELECT achievement_id, achievement_name, description, icon, earned_at
-            FROM user_achievements 
-            WHERE user_id = %s
-            ORDER BY earned_at DESC
-        ''', (user_id,))
-        
-        badges = cursor.fetchall()
-        return [dict(badge) for badge in badges] if badges else []
-        
-    except Exception as e:
-        print(f"Error getting user badges: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+    badges = cursor.fetchall()
+    return badges
 
 def start_module_tracking(user_id, module_id):
     """Start tracking when user begins a module"""
@@ -791,7 +787,7 @@ def start_module_tracking(user_id, module_id):
         
     except Exception as e:
         conn.rollback()
-        print(f"Error starting module tracking: {e}")
+        logger.exception("Error starting module tracking")
         return False
     finally:
         cursor.close()
@@ -801,44 +797,35 @@ def start_module_tracking(user_id, module_id):
 # LEARNING MODULES FUNCTIONS
 # ================================
 
-def get_all_learning_modules():
-    """Get all learning modules"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        cursor.execute('''
-            SELECT * FROM learning_modules 
-            WHERE is_active = TRUE 
-            ORDER BY order_index, module_id
-        ''')
-        modules = cursor.fetchall()
-        return [dict(module) for module in modules] if modules else []
-    except Exception as e:
-        print(f"Error getting learning modules: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+# Module/section/path/animation catalog rows; cleared whenever the catalog functions below write
+CATALOG_CACHE = TTLCache(ttl_seconds=Config.CATALOG_CACHE_TTL)
+
+def invalidate_catalog_cache():
+    """Drop cached modules, sections, learning paths and animations after an edit"""
+    CATALOG_CACHE.clear()
 
-def get_learning_module_by_id(module_id):
+@cached(CATALOG_CACHE, 'learning_modules')
+@with_cursor(default=[])
+def get_all_learning_modules(cursor):
+    """Get all learning modules"""
+    cursor.execute('''
+        SELECT * FROM learning_modules 
+        WHERE is_active = TRUE 
+        ORDER BY order_index, module_id
+    ''')
+    modules = cursor.fetchall()
+    return modules
+
+@cached(CATALOG_CACHE, 'learning_module_by_id')
+@with_cursor()
+def get_learning_module_by_id(cursor, module_id):
     """Get learning module by ID"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        cursor.execute('''
-            SELECT * FROM learning_modules 
-            WHERE module_id = %s AND is_active = TRUE
-        ''', (module_id,))
-        module = cursor.fetchone()
-        return dict(module) if module else None
-    except Exception as e:
-        print(f"Error getting learning module: {e}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
+    execute_prepared(cursor, 'learning_module_by_id', '''
+        SELECT * FROM learning_modules 
+        WHERE module_id = $1 AND is_active = TRUE
+    ''', (module_id,))
+    module = cursor.fetchone()
+    return module
 
 def create_learning_module(module_data):
     """Create a new learning module"""
@@ -866,44 +853,51 @@ def create_learning_module(module_data):
         
         module_id = cursor.fetchone()[0]
         conn.commit()
+        invalidate_catalog_cache()
         return module_id
     except Exception as e:
-        print(f"Error creating learning module: {e}")
+        logger.exception("Error creating learning module")
         conn.rollback()
         return None
     finally:
         cursor.close()
         conn.close()
 
+# Columns the update_* functions may set; anything else in the data dict is ignored
+LEARNING_MODULE_UPDATE_FIELDS = (
+    'title', 'description', 'category', 'difficulty', 'points', 'xp_reward',
+    'status', 'lab_available', 'order_index', 'icon', 'color', 'estimated_time',
+    'prerequisites', 'learning_objectives', 'tags'
+)
+ANIMATION_UPDATE_FIELDS = (
+    'title', 'description', 'animation_type', 'file_path', 'thumbnail_path',
+    'duration', 'difficulty', 'interactive_elements', 'script_content',
+    'learning_points', 'controls_config', 'is_published'
+)
+
+@functools.lru_cache(maxsize=128)
+def _update_sql(table, key_column, fields):
+    """Build an UPDATE that sets only the given columns (names come from the whitelists above)"""
+    assignments = ''.join(f'{field} = %s, ' for field in fields)
+    return f'UPDATE {table} SET {assignments}updated_at = CURRENT_TIMESTAMP WHERE {key_column} = %s'
+
 def update_learning_module(module_id, module_data):
-    """Update learning module"""
+    """Update learning module (only the fields present in module_data)"""
+    fields = tuple(field for field in LEARNING_MODULE_UPDATE_FIELDS if field in module_data)
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute('''
-            UPDATE learning_modules 
-            SET title = %s, description = %s, category = %s, difficulty = %s,
-                points = %s, xp_reward = %s, status = %s, lab_available = %s,
-                order_index = %s, icon = %s, color = %s, estimated_time = %s,
-                prerequisites = %s, learning_objectives = %s, tags = %s,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE module_id = %s
-        ''', (
-            module_data['title'], module_data.get('description'),
-            module_data.get('category'), module_data.get('difficulty'),
-            module_data.get('points'), module_data.get('xp_reward'),
-            module_data.get('status'), module_data.get('lab_available'),
-            module_data.get('order_index'), module_data.get('icon'),
-            module_data.get('color'), module_data.get('estimated_time'),
-            module_data.get('prerequisites', []), module_data.get('learning_objectives', []),
-            module_data.get('tags', []), module_id
-        ))
+        cursor.execute(
+            _update_sql('learning_modules', 'module_id', fields),
+            [module_data[field] for field in fields] + [module_id]
+        )
         
         conn.commit()
+        invalidate_catalog_cache()
         return cursor.rowcount > 0
     except Exception as e:
-        print(f"Error updating learning module: {e}")
+        logger.exception("Error updating learning module")
         conn.rollback()
         return False
     finally:
@@ -923,9 +917,10 @@ def delete_learning_module(module_id):
         ''', (module_id,))
         
         conn.commit()
+        invalidate_catalog_cache()
         return cursor.rowcount > 0
     except Exception as e:
-        print(f"Error deleting learning module: {e}")
+        logger.exception("Error deleting learning module")
         conn.rollback()
         return False
     finally:
@@ -936,63 +931,38 @@ def delete_learning_module(module_id):
 # ANIMATIONS FUNCTIONS
 # ================================
 
-def get_animations_by_module(module_id):
+@cached(CATALOG_CACHE, 'animations_by_module')
+@with_cursor(default=[])
+def get_animations_by_module(cursor, module_id):
     """Get all animations for a module"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        cursor.execute('''
-            SELECT * FROM animations 
-            WHERE module_id = %s AND is_published = TRUE 
-            ORDER BY id
-        ''', (module_id,))
-        animations = cursor.fetchall()
-        return [dict(animation) for animation in animations] if animations else []
-    except Exception as e:
-        print(f"Error getting animations: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
-
-def get_all_animations():
+    execute_prepared(cursor, 'animations_by_module', '''
+        SELECT * FROM animations 
+        WHERE module_id = $1 AND is_published = TRUE 
+        ORDER BY id
+    ''', (module_id,))
+    animations = cursor.fetchall()
+    return animations
+
+@with_cursor(default=[])
+def get_all_animations(cursor):
     """Get all animations"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        cursor.execute('''
-            SELECT a.*, lm.title as module_title 
-            FROM animations a
-            JOIN learning_modules lm ON a.module_id = lm.module_id
-            WHERE a.is_published = TRUE 
-            ORDER BY a.module_id, a.id
-        ''')
-        animations = cursor.fetchall()
-        return [dict(animation) for animation in animations] if animations else []
-    except Exception as e:
-        print(f"Error getting all animations: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
-
-def get_animation_by_id(animation_id):
+    cursor.execute('''
+        SELECT a.*, lm.title as module_title 
+        FROM animations a
+        JOIN learning_modules lm ON a.module_id = lm.module_id
+        WHERE a.is_published = TRUE 
+        ORDER BY a.module_id, a.id
+    ''')
+    animations = cursor.fetchall()
+    return animations
+
+@cached(CATALOG_CACHE, 'animation_by_id')
+@with_cursor()
+def get_animation_by_id(cursor, animation_id):
     """Get animation by ID"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        cursor.execute('SELECT * FROM animations WHERE id = %s', (animation_id,))
-        animation = cursor.fetchone()
-        return dict(animation) if animation else None
-    except Exception as e:
-        print(f"Error getting animation: {e}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
+    cursor.execute('SELECT * FROM animations WHERE id = %s', (animation_id,))
+    animation = cursor.fetchone()
+    return animation
 
 def create_animation(animation_data):
     """Create a new animation"""
@@ -1012,17 +982,18 @@ def create_animation(animation_data):
             animation_data.get('description'), animation_data.get('animation_type', 'interactive'),
             animation_data.get('file_path'), animation_data.get('thumbnail_path'),
             animation_data.get('duration', 0), animation_data.get('difficulty', 'Medium'),
-            json.dumps(animation_data.get('interactive_elements', {})),
+            psycopg2.extras.Json(animation_data.get('interactive_elements', {})),
             animation_data.get('script_content'), animation_data.get('learning_points', []),
-            json.dumps(animation_data.get('controls_config', {})),
+            psycopg2.extras.Json(animation_data.get('controls_config', {})),
             animation_data.get('is_published', True)
         ))
         
         animation_id = cursor.fetchone()[0]
         conn.commit()
+        invalidate_catalog_cache()
         return animation_id
     except Exception as e:
-        print(f"Error creating animation: {e}")
+        logger.exception("Error creating animation")
         conn.rollback()
         return None
     finally:
@@ -1030,33 +1001,24 @@ def create_animation(animation_data):
         conn.close()
 
 def update_animation(animation_id, animation_data):
-    """Update animation"""
+    """Update animation (only the fields present in animation_data)"""
+    fields = tuple(field for field in ANIMATION_UPDATE_FIELDS if field in animation_data)
+    values = [
+        psycopg2.extras.Json(animation_data[field]) if field in ('interactive_elements', 'controls_config')
+        else animation_data[field]
+        for field in fields
+    ]
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute('''
-            UPDATE animations 
-            SET title = %s, description = %s, animation_type = %s, file_path = %s,
-                thumbnail_path = %s, duration = %s, difficulty = %s,
-                interactive_elements = %s, script_content = %s, learning_points = %s,
-                controls_config = %s, is_published = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        ''', (
-            animation_data['title'], animation_data.get('description'),
-            animation_data.get('animation_type'), animation_data.get('file_path'),
-            animation_data.get('thumbnail_path'), animation_data.get('duration'),
-            animation_data.get('difficulty'), 
-            json.dumps(animation_data.get('interactive_elements', {})),
-            animation_data.get('script_content'), animation_data.get('learning_points', []),
-            json.dumps(animation_data.get('controls_config', {})),
-            animation_data.get('is_published', True), animation_id
-        ))
+        cursor.execute(_update_sql('animations', 'id', fields), values + [animation_id])
         
         conn.commit()
+        invalidate_catalog_cache()
         return cursor.rowcount > 0
     except Exception as e:
-        print(f"Error updating animation: {e}")
+        logger.exception("Error updating animation")
         conn.rollback()
         return False
     finally:
@@ -1071,9 +1033,10 @@ def delete_animation(animation_id):
     try:
         cursor.execute('DELETE FROM animations WHERE id = %s', (animation_id,))
         conn.commit()
+        invalidate_catalog_cache()
         return cursor.rowcount > 0
     except Exception as e:
-        print(f"Error deleting animation: {e}")
+        logger.exception("Error deleting animation")
         conn.rollback()
         return False
     finally:
@@ -1094,7 +1057,7 @@ def increment_animation_view_count(animation_id):
         conn.commit()
         return True
     except Exception as e:
-        print(f"Error updating view count: {e}")
+        logger.exception("Error updating view count")
         conn.rollback()
         return False
     finally:
@@ -1105,45 +1068,29 @@ def increment_animation_view_count(animation_id):
 # MODULE SECTIONS FUNCTIONS
 # ================================
 
-def get_module_sections(module_id):
+@cached(CATALOG_CACHE, 'module_sections')
+@with_cursor(default=[])
+def get_module_sections(cursor, module_id):
     """Get all sections for a module"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        cursor.execute('''
-            SELECT * FROM module_sections 
-            WHERE module_id = %s AND is_active = TRUE 
-            ORDER BY order_index, id
-        ''', (module_id,))
-        sections = cursor.fetchall()
-        return [dict(section) for section in sections] if sections else []
-    except Exception as e:
-        print(f"Error getting module sections: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
-
-def get_learning_paths():
+    cursor.execute('''
+        SELECT * FROM module_sections 
+        WHERE module_id = %s AND is_active = TRUE 
+        ORDER BY order_index, id
+    ''', (module_id,))
+    sections = cursor.fetchall()
+    return sections
+
+@cached(CATALOG_CACHE, 'learning_paths')
+@with_cursor(default=[])
+def get_learning_paths(cursor):
     """Get all active learning paths"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        cursor.execute('''
-            SELECT * FROM learning_paths 
-            WHERE is_active = TRUE 
-            ORDER BY is_default DESC, name
-        ''')
-        paths = cursor.fetchall()
-        return [dict(path) for path in paths] if paths else []
-    except Exception as e:
-        print(f"Error getting learning paths: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+    cursor.execute('''
+        SELECT * FROM learning_paths 
+        WHERE is_active = TRUE 
+        ORDER BY is_default DESC, name
+    ''')
+    paths = cursor.fetchall()
+    return paths
 
 if __name__ == "__main__":
     # Initialize database when run directly
@@ -1162,139 +1109,333 @@ def create_user(username, name, email, password):
     # Use the enhanced create_user function
     return create_user_enhanced(username, name, email, hashed_password)
 
+@with_cursor()
+def _get_login_user(cursor, username):
+    """Get an active user's row including password_hash"""
+    execute_prepared(cursor, 'auth_user', '''
+        SELECT id, username, name, email, xp, joined_date, is_active, password_hash
+        FROM users 
+        WHERE username = $1 AND is_active = TRUE
+    ''', (username,))
+    return cursor.fetchone()
+
+@with_cursor(default=False)
+def _upgrade_user_password_hash(cursor, user_id, password_hash):
+    """Store a re-hashed password (same password, stronger hash)"""
+    cursor.execute('''
+        UPDATE users SET password_hash = %s WHERE id = %s
+    ''', (password_hash, user_id))
+    return True
+
 def authenticate_user(username, password):
     """Authenticate user login with support for both old and new password hashes"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
-    try:
-        # Get user with password hash
-        cursor.execute('''
-            SELECT id, username, name, email, xp, joined_date, is_active, password_hash
-            FROM users 
-            WHERE username = %s AND is_active = TRUE
-        ''', (username,))
-        
-        user = cursor.fetchone()
-        if not user:
-            return None
-        
-        # Import AuthSecurity for password verification
-        from auth_security import AuthSecurity
-        
-        # Verify password using enhanced security (supports both bcrypt and SHA-256)
-        if AuthSecurity.verify_password(password, user['password_hash']):
-            # Remove password_hash from returned user data
-            user_dict = dict(user)
-            del user_dict['password_hash']
-            return user_dict
-        
+    # The row is fetched on its own short checkout so no pooled connection is
+    # held while bcrypt runs
+    user = _get_login_user(username)
+    if not user:
         return None
-        
-    except Exception as e:
-        print(f"Error authenticating user: {e}")
+    
+    # Import AuthSecurity for password verification
+    from auth_security import AuthSecurity
+    
+    # Verify password using enhanced security (supports both bcrypt and SHA-256)
+    if not AuthSecurity.verify_password(password, user['password_hash']):
         return None
-    finally:
-        cursor.close()
-        conn.close()
+    
+    # Upgrade legacy SHA hashes (or bcrypt below BCRYPT_ROUNDS) while the password is at hand
+    if AuthSecurity.needs_rehash(user['password_hash']):
+        _upgrade_user_password_hash(user['id'], AuthSecurity.hash_password(password))
+    
+    # Remove password_hash from returned user data
+    del user['password_hash']
+    return user
+
+# Admin rows by id for session lookups; the admins table is tiny. password_hash is
+# never cached: logins always read it fresh
+ADMIN_CACHE = TTLCache(ttl_seconds=Config.ADMIN_CACHE_TTL, max_entries=64)
+
+@with_cursor()
+def _get_login_admin(cursor, username):
+    """Get an active admin's row including password_hash"""
+    execute_prepared(cursor, 'auth_admin', '''
+        SELECT id, username, name, role, is_active, password_hash
+        FROM admins 
+        WHERE username = $1 AND is_active = TRUE
+    ''', (username,))
+    return cursor.fetchone()
+
+@with_cursor(default=False)
+def _upgrade_admin_password_hash(cursor, admin_id, password_hash):
+    """Store a re-hashed admin password (same password, stronger hash)"""
+    cursor.execute('''
+        UPDATE admins SET password_hash = %s WHERE id = %s
+    ''', (password_hash, admin_id))
+    return True
 
 def authenticate_admin(username, password):
     """Authenticate admin login"""
+    # Point lookup on the UNIQUE username; the connection is back in the pool before bcrypt runs
+    admin = _get_login_admin(username)
+    if not admin:
+        return None
+    
+    # Import AuthSecurity for password verification
+    from auth_security import AuthSecurity
+    
+    # Verify with bcrypt (or constant-time legacy SHA-256) instead of matching an unsalted hash in SQL
+    if not AuthSecurity.verify_password(password, admin['password_hash']):
+        return None
+    
+    # Upgrade the seeded SHA-256 admin hashes to bcrypt on first successful login
+    if AuthSecurity.needs_rehash(admin['password_hash']):
+        _upgrade_admin_password_hash(admin['id'], AuthSecurity.hash_password(password))
+    
+    del admin['password_hash']
+    return admin
+
+@cached(ADMIN_CACHE, 'admin_by_id')
+@with_cursor()
+def get_admin_by_id(cursor, admin_id):
+    """Get an admin's id, username, name and role (the cached row; callers copy it)"""
+    execute_prepared(cursor, 'admin_by_id', '''
+        SELECT id, username, name, role FROM admins WHERE id = $1
+    ''', (admin_id,))
+    return cursor.fetchone()
+
+@with_cursor(default=[])
+def get_user_progress(cursor, user_id):
+    """Get user's completed modules"""
+    cursor.execute('''
+        SELECT module_id, completed_at, xp_earned
+        FROM user_progress WHERE user_id = %s
+    ''', (user_id,))
+    
+    progress = cursor.fetchall()
+    return progress
+
+def mark_module_completed(user_id, module_id, xp_earned=100):
+    """Mark a module as completed for user (legacy function for compatibility)"""
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
     try:
+        # Insert progress record and update user's total XP in one round-trip;
+        # XP is only added when the progress row is new
         cursor.execute('''
-            SELECT id, username, name, role, is_active
-            FROM admins 
-            WHERE username = %s AND password_hash = %s AND is_active = TRUE
-        ''', (username, hash_password(password)))
+            WITH inserted AS (
+                INSERT INTO user_progress (user_id, module_id, xp_earned)
+                VALUES (%(user_id)s, %(module_id)s, %(xp_earned)s)
+                ON CONFLICT (user_id, module_id) DO NOTHING
+                RETURNING xp_earned
+            )
+            UPDATE users SET xp = xp + inserted.xp_earned
+            FROM inserted
+            WHERE users.id = %(user_id)s
+        ''', {'user_id': user_id, 'module_id': module_id, 'xp_earned': xp_earned})
         
-        admin = cursor.fetchone()
-        return dict(admin) if admin else None
+        conn.commit()
+        return True
         
     except Exception as e:
-        print(f"Error authenticating admin: {e}")
-        return None
+        conn.rollback()
+        logger.exception("Error marking module completed")
+        return False
     finally:
         cursor.close()
         conn.close()
 
-def get_user_progress(user_id):
-    """Get user's completed modules"""
+def get_all_users():
+    """Get all users for admin panel"""
     conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    # Grows with the user base, so stream it in batches instead of buffering the whole result
+    cursor = get_dict_cursor(conn, 'all_users')
+    cursor.itersize = 500
     
     try:
+        # Count progress rows per user first, then attach the counts, instead of
+        # grouping the joined rows by every selected users column
         cursor.execute('''
-            SELECT module_id, completed_at, xp_earned
-            FROM user_progress WHERE user_id = %s
-        ''', (user_id,))
+            SELECT u.id, u.username, u.name, u.email, u.xp, u.joined_date, u.is_active,
+                   COALESCE(up.modules_completed, 0) as modules_completed
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id, COUNT(module_id) as modules_completed
+                FROM user_progress
+                GROUP BY user_id
+            ) up ON u.id = up.user_id
+            ORDER BY u.created_at DESC
+        ''')
         
-        progress = cursor.fetchall()
-        return [dict(row) for row in progress]
+        return list(cursor)
         
     except Exception as e:
-        print(f"Error getting user progress: {e}")
+        logger.exception("Error getting all users")
         return []
     finally:
         cursor.close()
         conn.close()
 
-def mark_module_completed(user_id, module_id, xp_earned=100):
-    """Mark a module as completed for user (legacy function for compatibility)"""
+# Advisory lock key shared by every worker so only one rebuilds the rankings at a time
+LEADERBOARD_REFRESH_LOCK_ID = 7311001
+_leaderboard_refresher = None
+_leaderboard_refresher_pid = None
+_leaderboard_refresher_lock = threading.Lock()
+
+def _refresh_leaderboard_rankings(cursor, max_age_seconds=None, wait=False):
+    """Recompute leaderboard_rankings from the live aggregate (caller commits).
+
+    Returns False without rebuilding when another connection holds the refresh
+    lock (unless wait is set), or when the rankings are already younger than
+    max_age_seconds, e.g. because that connection just rebuilt them.
+    """
+    if wait:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (LEADERBOARD_REFRESH_LOCK_ID,))
+    else:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', (LEADERBOARD_REFRESH_LOCK_ID,))
+        if not cursor.fetchone()[0]:
+            return False
+    if max_age_seconds is not None:
+        cursor.execute('''
+            SELECT EXISTS (
+                SELECT 1 FROM leaderboard_rankings
+                WHERE refreshed_at >= CURRENT_TIMESTAMP - make_interval(secs => %s)
+            )
+        ''', (max_age_seconds,))
+        if cursor.fetchone()[0]:
+            return False
+    
+    cursor.execute('''
+        INSERT INTO leaderboard_rankings
+            (user_id, rank, name, username, total_xp, level, streak, modules_completed, refreshed_at)
+        SELECT id, ROW_NUMBER() OVER (ORDER BY total_xp DESC, id), name, username,
+               total_xp, level, streak, modules_completed, CURRENT_TIMESTAMP
+        FROM (
+            SELECT u.id, u.name, u.username,
+                   COALESCE(g.total_xp, 0) as total_xp,
+                   COALESCE(g.level, 1) as level,
+                   COALESCE(g.streak, 0) as streak,
+                   COUNT(DISTINCT up.module_id) as modules_completed
+            FROM users u
+            LEFT JOIN user_gamification g ON u.id = g.user_id
+            LEFT JOIN user_progress up ON u.id = up.user_id
+            WHERE u.is_active = TRUE
+            GROUP BY u.id, u.name, u.username, g.total_xp, g.level, g.streak
+        ) totals
+        ON CONFLICT (user_id) DO UPDATE SET
+            rank = EXCLUDED.rank,
+            name = EXCLUDED.name,
+            username = EXCLUDED.username,
+            total_xp = EXCLUDED.total_xp,
+            level = EXCLUDED.level,
+            streak = EXCLUDED.streak,
+            modules_completed = EXCLUDED.modules_completed,
+            refreshed_at = EXCLUDED.refreshed_at
+    ''')
+    # Rows not touched above belong to users who are no longer active
+    cursor.execute('DELETE FROM leaderboard_rankings WHERE refreshed_at < CURRENT_TIMESTAMP')
+    # Keep today's snapshot at the latest rank so yesterday's row holds its closing rank
+    cursor.execute('''
+        INSERT INTO leaderboard_snapshots (snap_date, user_id, rank)
+        SELECT CURRENT_DATE, user_id, rank FROM leaderboard_rankings
+        ON CONFLICT (snap_date, user_id) DO UPDATE SET rank = EXCLUDED.rank
+    ''')
+    return True
+
+def refresh_leaderboard_rankings(max_age_seconds=None):
+    """Rebuild the precomputed leaderboard unless another worker is already doing it"""
     conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    cursor = conn.cursor()
     
     try:
-        # Insert progress record
-        cursor.execute('''
-            INSERT INTO user_progress (user_id, module_id, xp_earned)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id, module_id) DO NOTHING
-        ''', (user_id, module_id, xp_earned))
-        
-        # Update user's total XP
-        cursor.execute('''
-            UPDATE users SET xp = xp + %s WHERE id = %s
-        ''', (xp_earned, user_id))
-        
+        refreshed = _refresh_leaderboard_rankings(cursor, max_age_seconds)
         conn.commit()
-        return True
-        
+        return refreshed
     except Exception as e:
         conn.rollback()
-        print(f"Error marking module completed: {e}")
+        logger.exception("Error refreshing leaderboard rankings")
         return False
     finally:
         cursor.close()
         conn.close()
 
-def get_all_users():
-    """Get all users for admin panel"""
+def _leaderboard_refresher_loop(interval):
+    """Refresh stale rankings every interval so daily snapshots don't depend on page views"""
+    while True:
+        try:
+            refresh_leaderboard_rankings(interval)
+        except Exception as e:
+            logger.exception("Error in scheduled leaderboard refresh")
+        time.sleep(interval)
+
+def start_leaderboard_refresher(interval=Config.LEADERBOARD_REFRESH_INTERVAL):
+    """Start the scheduled leaderboard refresh thread (once per process, and again after a fork)"""
+    global _leaderboard_refresher, _leaderboard_refresher_pid
+    if _leaderboard_refresher is None or _leaderboard_refresher_pid != os.getpid():
+        with _leaderboard_refresher_lock:
+            if _leaderboard_refresher is None or _leaderboard_refresher_pid != os.getpid():
+                _leaderboard_refresher = threading.Thread(target=_leaderboard_refresher_loop, args=(interval,),
+                                                          name="leaderboard-refresher", daemon=True)
+                _leaderboard_refresher.start()
+                _leaderboard_refresher_pid = os.getpid()
+
+def get_leaderboard_rankings(limit=50, max_age_seconds=300):
+    """Get top ranked users, rebuilding the rankings first if they are missing or stale.
+
+    Returns plain tuples of (user_id, rank, name, username, total_xp, level,
+    streak, modules_completed, trend) to skip per-row dict construction.
+    trend is the number of places gained since yesterday's snapshot (None if
+    the user has no snapshot for yesterday).
+    """
     conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    cursor = conn.cursor()
+    query = '''
+        SELECT lr.user_id, lr.rank, lr.name, lr.username, lr.total_xp, lr.level, lr.streak,
+               lr.modules_completed, ls.rank - lr.rank as trend,
+               lr.refreshed_at < CURRENT_TIMESTAMP - make_interval(secs => %s) as stale
+        FROM leaderboard_rankings lr
+        LEFT JOIN leaderboard_snapshots ls
+            ON ls.user_id = lr.user_id AND ls.snap_date = CURRENT_DATE - 1
+        ORDER BY lr.rank
+        LIMIT %s
+    '''
     
     try:
-        cursor.execute('''
-            SELECT u.id, u.username, u.name, u.email, u.xp, u.joined_date, u.is_active,
-                   COUNT(up.module_id) as modules_completed
-            FROM users u
-            LEFT JOIN user_progress up ON u.id = up.user_id
-            GROUP BY u.id, u.username, u.name, u.email, u.xp, u.joined_date, u.is_active
-            ORDER BY u.created_at DESC
-        ''')
-        
-        users = cursor.fetchall()
-        return [dict(row) for row in users]
-        
+        cursor.execute(query, (max_age_seconds, limit))
+        rankings = cursor.fetchall()
+        
+        if not rankings or rankings[0][-1]:
+            # One worker rebuilds stale rankings while the others keep serving the
+            # old rows; with nothing to serve yet, wait for the rebuild instead
+            refreshed = _refresh_leaderboard_rankings(cursor, max_age_seconds, wait=not rankings)
+            conn.commit()
+            if refreshed or not rankings:
+                cursor.execute(query, (max_age_seconds, limit))
+                rankings = cursor.fetchall()
+        
+        return [row[:-1] for row in rankings]
     except Exception as e:
-        print(f"Error getting all users: {e}")
+        conn.rollback()
+        logger.exception("Error getting leaderboard rankings")
         return []
     finally:
         cursor.close()
         conn.close()
 
+@with_cursor(default={})
+def get_user_gamification_data(cursor, user_id):
+    """Get a user's XP, level and streak from user_gamification (empty dict if none)"""
+    cursor.execute('''
+        SELECT level, current_xp, total_xp, streak, max_streak
+        FROM user_gamification 
+        WHERE user_id = %s
+    ''', (user_id,))
+    row = cursor.fetchone()
+    if not row:
+        return {}
+    
+    row['current_streak'] = row['streak']
+    return row
+
 def delete_user(user_id):
     """Delete a user (soft delete)"""
     conn = get_db_connection()
@@ -1306,7 +1447,7 @@ def delete_user(user_id):
         
     except Exception as e:
         conn.rollback()
-        print(f"Error deleting user: {e}")
+        logger.exception("Error deleting user")
     finally:
         cursor.close()
         conn.close()
@@ -1317,18 +1458,21 @@ def reset_user_progress(user_id):
     cursor = conn.cursor()
     
     try:
-        # Reset all progress tables
-        cursor.execute('DELETE FROM user_progress WHERE user_id = %s', (user_id,))
-        cursor.execute('DELETE FROM learning_activities WHERE user_id = %s', (user_id,))
-        
-        # Reset user stats
-        cursor.execute('UPDATE users SET xp = 0 WHERE id = %s', (user_id,))
+        # Clear the user's progress rows and reset their XP in one statement
+        cursor.execute('''
+            WITH cleared_progress AS (
+                DELETE FROM user_progress WHERE user_id = %(user_id)s
+            ), cleared_activities AS (
+                DELETE FROM learning_activities WHERE user_id = %(user_id)s
+            )
+            UPDATE users SET xp = 0 WHERE id = %(user_id)s
+        ''', {'user_id': user_id})
         
         conn.commit()
         
     except Exception as e:
         conn.rollback()
-        print(f"Error resetting user progress: {e}")
+        logger.exception("Error resetting user progress")
     finally:
         cursor.close()
         conn.close()
@@ -1339,44 +1483,93 @@ def reset_all_users_progress():
     cursor = conn.cursor()
     
     try:
-        # Reset all progress tables
-        cursor.execute('DELETE FROM user_progress')
-        cursor.execute('DELETE FROM learning_activities')
+        # Reset all progress tables; TRUNCATE skips the per-row delete work
+        cursor.execute('TRUNCATE user_progress, learning_activities RESTART IDENTITY')
         
         # Reset all user stats
         cursor.execute('UPDATE users SET xp = 0 WHERE is_active = TRUE')
         
         conn.commit()
-        print("✅ All user progress reset successfully")
+        logger.info("All user progress reset successfully")
         
     except Exception as e:
         conn.rollback()
-        print(f"❌ Error resetting all user progress: {e}")
+        logger.exception("Error resetting all user progress")
         raise e
     finally:
         cursor.close()
         conn.close()
 
-def log_activity(user_id, action, details=None, ip_address=None):
-    """Log user activity"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+def _inet_or_none(ip_address):
+    """Normalise an address for an INET column; get_client_ip may return 'unknown'"""
+    try:
+        return str(ipaddress.ip_address(ip_address))
+    except ValueError:
+        return None
+
+# Activity log entries are buffered and written in batches by a background flusher
+ACTIVITY_LOG_BATCH_SIZE = 100
+ACTIVITY_LOG_FLUSH_INTERVAL = 1.0  # seconds
+_activity_log_buffer = deque()
+_activity_log_lock = threading.Lock()
+_activity_log_wakeup = threading.Event()
+_activity_log_flusher = None
+_activity_log_flusher_pid = None
+
+def _flush_activity_log():
+    """Write every buffered activity log entry in one INSERT"""
+    with _activity_log_lock:
+        rows = list(_activity_log_buffer)
+        _activity_log_buffer.clear()
+    if not rows:
+        return
     
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        cursor.execute('''
+        psycopg2.extras.execute_values(cursor, '''
             INSERT INTO activity_log (user_id, action, details, ip_address)
-            VALUES (%s, %s, %s, %s)
-        ''', (user_id, action, details, ip_address))
-        
+            VALUES %s
+        ''', rows, page_size=ACTIVITY_LOG_BATCH_SIZE)
         conn.commit()
-        
     except Exception as e:
+        logger.exception("Error logging %d activity entries", len(rows))
         conn.rollback()
-        print(f"Error logging activity: {e}")
     finally:
         cursor.close()
         conn.close()
 
+def _activity_log_flusher_loop():
+    """Flush buffered activity entries every interval, or sooner once a batch fills up"""
+    while True:
+        _activity_log_wakeup.wait(ACTIVITY_LOG_FLUSH_INTERVAL)
+        _activity_log_wakeup.clear()
+        _flush_activity_log()
+
+def _ensure_activity_log_flusher():
+    """Start the flusher thread on first use (and again after a fork)"""
+    global _activity_log_flusher, _activity_log_flusher_pid
+    if _activity_log_flusher is None or _activity_log_flusher_pid != os.getpid():
+        with _activity_log_lock:
+            if _activity_log_flusher is None or _activity_log_flusher_pid != os.getpid():
+                _activity_log_flusher = threading.Thread(target=_activity_log_flusher_loop, name="activity-log-flusher", daemon=True)
+                _activity_log_flusher.start()
+                _activity_log_flusher_pid = os.getpid()
+
+atexit.register(_flush_activity_log)
+
+def log_activity(user_id, action, details=None, ip_address=None):
+    """Log user activity (written in batches by a background thread)"""
+    # One malformed row would fail the whole batch, so fit values to the column types
+    row = (user_id, action[:255], details, _inet_or_none(ip_address))
+    
+    _ensure_activity_log_flusher()
+    with _activity_log_lock:
+        _activity_log_buffer.append(row)
+        batch_full = len(_activity_log_buffer) >= ACTIVITY_LOG_BATCH_SIZE
+    if batch_full:
+        _activity_log_wakeup.set()
+
 # Stub functions for missing imports (to be implemented as needed)
 def record_learning_activity(*args, **kwargs):
     return {'success': True, 'message': 'Stub function'}
@@ -1384,11 +1577,35 @@ def record_learning_activity(*args, **kwargs):
 def update_documentation_progress(*args, **kwargs):
     return True
 
+@with_cursor(default=False)
+def _record_legacy_activity(cursor, user_id, module_id, activity_type, score, time_spent):
+    """Insert a completed learning_activities row unless one exists, crediting its XP only if inserted"""
+    cursor.execute('''
+        WITH inserted AS (
+            INSERT INTO learning_activities (user_id, module_id, activity_type, completed_at, time_spent, score, xp_earned)
+            SELECT %(user_id)s, %(module_id)s, %(activity_type)s, CURRENT_TIMESTAMP, %(time_spent)s, %(score)s, %(xp_earned)s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM learning_activities 
+                WHERE user_id = %(user_id)s AND module_id = %(module_id)s
+                AND activity_type = %(activity_type)s AND completed_at IS NOT NULL
+            )
+            RETURNING xp_earned
+        )
+        UPDATE users SET xp = xp + inserted.xp_earned
+        FROM inserted
+        WHERE users.id = %(user_id)s
+    ''', {
+        'user_id': user_id,
+        'module_id': module_id,
+        'activity_type': activity_type,
+        'time_spent': time_spent,
+        'score': score,
+        'xp_earned': get_activity_xp(activity_type)
+    })
+    return True
+
 def complete_learning_activity(user_id, module_id, activity_type, score=100, time_spent=0):
     """Complete a learning activity and check for module completion"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    
     try:
         # Use modern gamification system first
         from gamification_system import gamification_system
@@ -1397,72 +1614,53 @@ def complete_learning_activity(user_id, module_id, activity_type, score=100, tim
         gamification_result = gamification_system.complete_activity(
             user_id, module_id, activity_type, score, time_spent
         )
-        
-        # Also record in legacy system for compatibility
-        # Check if activity already completed in legacy system
-        cursor.execute('''
-            SELECT id FROM learning_activities 
-            WHERE user_id = %s AND module_id = %s AND activity_type = %s AND completed_at IS NOT NULL
-        ''', (user_id, module_id, activity_type))
-        
-        if not cursor.fetchone():
-            # Insert into legacy system
-            xp_earned = get_activity_xp(activity_type)
-            cursor.execute('''
-                INSERT INTO learning_activities (user_id, module_id, activity_type, completed_at, time_spent, score, xp_earned)
-                VALUES (%s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s)
-            ''', (user_id, module_id, activity_type, time_spent, score, xp_earned))
-            
-            # Update user's total XP in legacy system
-            cursor.execute('''
-                UPDATE users SET xp = xp + %s WHERE id = %s
-            ''', (xp_earned, user_id))
-        
-        print(f"✅ Activity {activity_type} completed for module {module_id}")
-        print(f"✅ Modern gamification result: {gamification_result}")
-        
-        # Check if module is now completed
-        module_completed = is_module_completed(user_id, module_id)
-        if module_completed:
-            print(f"🎉 Module {module_id} is now completed!")
-            # Trigger module completion in gamification system
-            try:
-                completion_result = gamification_system.complete_module(user_id, module_id)
-                print(f"✅ Module completion result: {completion_result}")
-                
-                # Unlock next module
-                next_module_unlocked = unlock_next_module(user_id, module_id)
-                if next_module_unlocked:
-                    print(f"🔓 Next module unlocked: {next_module_unlocked}")
-                else:
-                    print("ℹ️ No next module to unlock (last module or already unlocked)")
-                    
-            except Exception as e:
-                print(f"⚠️ Error in module completion process: {e}")
-        else:
-            print(f"ℹ️ Module {module_id} not yet completed")
-        
-        conn.commit()
-        return True
-        
     except Exception as e:
-        conn.rollback()
-        print(f"Error completing learning activity: {e}")
+        logger.exception("Error completing learning activity")
         return False
-    finally:
-        cursor.close()
-        conn.close()
+    
+    # Also record in legacy system for compatibility (one statement, committed
+    # straight away so the completion check below sees it)
+    if not _record_legacy_activity(user_id, module_id, activity_type, score, time_spent):
+        return False
+    
+    logger.info("Activity %s completed for module %s", activity_type, module_id)
+    logger.debug("Gamification result: %s", gamification_result)
+    
+    # Check if module is now completed
+    module_completed = is_module_completed(user_id, module_id)
+    if module_completed:
+        logger.info("Module %s is now completed", module_id)
+        # Trigger module completion in gamification system
+        try:
+            completion_result = gamification_system.complete_module(user_id, module_id)
+            logger.debug("Module completion result: %s", completion_result)
+            
+            # Unlock next module
+            next_module_unlocked = unlock_next_module(user_id, module_id)
+            if next_module_unlocked:
+                logger.info("Next module unlocked: %s", next_module_unlocked)
+            else:
+                logger.debug("No next module to unlock (last module or already unlocked)")
+                
+        except Exception as e:
+            logger.exception("Error in module completion process")
+    else:
+        logger.debug("Module %s not yet completed", module_id)
+    
+    return True
+
+# XP reward per learning activity type (25 for anything else)
+ACTIVITY_XP_REWARDS = MappingProxyType({
+    'documentation': 50,
+    'animation': 25,
+    'lab': 75,
+    'quiz': 50,
+    'assessment': 50
+})
 
 def get_activity_xp(activity_type):
     """Get XP reward for activity type"""
-    xp_rewards = {
-        'documentation': 50,
-        'animation': 25,
-        'lab': 75,
-        'quiz': 50,
-        'assessment': 50
-    }
-    return xp_rewards.get(activity_type, 25)
+    return ACTIVITY_XP_REWARDS.get(activity_type, 25)
 
 # Removed duplicate function - using the real one above
 
@@ -1484,7 +1682,7 @@ def create_assessment_attempt(user_id, module_id, total_questions=0):
         
     except Exception as e:
         conn.rollback()
-        print(f"Error creating assessment attempt: {e}")
+        logger.exception("Error creating assessment attempt")
         return None
     finally:
         cursor.close()
@@ -1493,77 +1691,148 @@ def create_assessment_attempt(user_id, module_id, total_questions=0):
 def complete_assessment_attempt(*args, **kwargs):
     return True
 
-def get_assessment_statistics(*args, **kwargs):
-    return {}
-
 def start_module_tracking(*args, **kwargs):
     return True
 
 def award_module_badge(*args, **kwargs):
     return True
 
-def get_module_badges(*args, **kwargs):
-    return {}
-
 def is_module_completed(user_id, module_id):
     """Check if a module is completed by the user"""
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
     try:
-        # Check if assessment is completed with passing score (70% or higher)
+        # Passing assessment (70% or higher), modern gamification activities and the
+        # legacy learning_activities fallback, all in one round trip
         cursor.execute('''
-            SELECT COUNT(*) as count FROM user_assessment_attempts 
-            WHERE user_id = %s AND module_id = %s AND is_completed = TRUE 
-            AND score_percentage >= 70
-        ''', (user_id, module_id))
+            SELECT
+                EXISTS (
+                    SELECT 1 FROM user_assessment_attempts 
+                    WHERE user_id = %(user_id)s AND module_id = %(module_id)s
+                    AND is_completed = TRUE AND score_percentage >= 70
+                ) as assessment_completed,
+                (SELECT COUNT(DISTINCT activity_type)
+                 FROM activity_completions 
+                 WHERE user_id = %(user_id)s AND module_id = %(module_id)s) as modern_activities,
+                (SELECT COUNT(DISTINCT activity_type)
+                 FROM learning_activities 
+                 WHERE user_id = %(user_id)s AND module_id = %(module_id)s
+                 AND completed_at IS NOT NULL) as legacy_activities
+        ''', {'user_id': user_id, 'module_id': module_id})
         
-        assessment_completed = cursor.fetchone()['count'] > 0
+        result = cursor.fetchone()
+        return _completion_rule_met(
+            result['assessment_completed'], result['modern_activities'], result['legacy_activities']
+        )
         
-        # Check modern gamification system activities first
-        cursor.execute('''
-            SELECT COUNT(DISTINCT activity_type) as completed_types
+    except Exception as e:
+        logger.exception("Error checking module completion")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+def _completion_rule_met(assessment_passed, modern_activities, legacy_activities):
+    """Module completion rule shared by the single-module and per-user checks"""
+    # Use the higher count between modern and legacy systems
+    completed_activities = max(modern_activities, legacy_activities)
+    
+    # Module completion logic:
+    # Option 1: Assessment passed (70%+) AND at least 1 other activity
+    # Option 2: At least 2 activities completed (lowered since assessments aren't working)
+    return (assessment_passed and completed_activities >= 1) or (completed_activities >= 2)
+
+def empty_module_completion():
+    """Completion details for a module the user has not touched"""
+    return {
+        'modern_activities': 0,
+        'legacy_activities': 0,
+        'legacy_activity_counts': {},
+        'assessment_attempts': 0,
+        'completed_attempts': 0,
+        'best_score': None,
+        'assessment_passed': False,
+        'completed': False
+    }
+
+def get_module_completion_details(user_id):
+    """Get completion inputs for every module a user has touched, keyed by module_id.
+
+    Uses one grouped query per source table instead of is_module_completed()
+    per module; modules without any rows are absent from the result.
+    """
+    conn = get_db_connection()
+    cursor = get_dict_cursor(conn)
+    details = {}
+    
+    try:
+        execute_prepared(cursor, 'completion_modern_activities', '''
+            SELECT module_id, COUNT(DISTINCT activity_type) as activity_count
             FROM activity_completions 
-            WHERE user_id = %s AND module_id = %s
-        ''', (user_id, module_id))
-        
-        modern_activities = cursor.fetchone()['completed_types']
+            WHERE user_id = $1
+            GROUP BY module_id
+        ''', (user_id,))
+        for row in cursor.fetchall():
+            details.setdefault(row['module_id'], empty_module_completion())['modern_activities'] = row['activity_count']
         
-        # Fallback to legacy learning_activities table
-        cursor.execute('''
-            SELECT COUNT(DISTINCT activity_type) as completed_types
+        execute_prepared(cursor, 'completion_legacy_activities', '''
+            SELECT module_id, activity_type, COUNT(*) as activity_count
             FROM learning_activities 
-            WHERE user_id = %s AND module_id = %s AND completed_at IS NOT NULL
-        ''', (user_id, module_id))
-        
-        legacy_activities = cursor.fetchone()['completed_types']
-        
-        # Use the higher count between modern and legacy systems
-        completed_activities = max(modern_activities, legacy_activities)
+            WHERE user_id = $1 AND completed_at IS NOT NULL
+            GROUP BY module_id, activity_type
+        ''', (user_id,))
+        for row in cursor.fetchall():
+            entry = details.setdefault(row['module_id'], empty_module_completion())
+            entry['legacy_activity_counts'][row['activity_type']] = row['activity_count']
+            entry['legacy_activities'] += 1
+        
+        execute_prepared(cursor, 'completion_assessments', '''
+            SELECT module_id,
+                   COUNT(*) as attempts,
+                   COUNT(*) FILTER (WHERE is_completed = TRUE) as completed_attempts,
+                   MAX(score_percentage) FILTER (WHERE is_completed = TRUE) as best_score,
+                   BOOL_OR(is_completed = TRUE AND score_percentage >= 70) as passed
+            FROM user_assessment_attempts 
+            WHERE user_id = $1
+            GROUP BY module_id
+        ''', (user_id,))
+        for row in cursor.fetchall():
+            entry = details.setdefault(row['module_id'], empty_module_completion())
+            entry['assessment_attempts'] = row['attempts']
+            entry['completed_attempts'] = row['completed_attempts']
+            entry['best_score'] = row['best_score']
+            entry['assessment_passed'] = bool(row['passed'])
+        
+        for entry in details.values():
+            entry['completed'] = _completion_rule_met(
+                entry['assessment_passed'], entry['modern_activities'], entry['legacy_activities']
+            )
         
-        # Module completion logic:
-        # Option 1: Assessment passed (70%+) AND at least 1 other activity
-        # Option 2: At least 2 activities completed (lowered since assessments aren't working)
-        return (assessment_completed and completed_activities >= 1) or (completed_activities >= 2)
+        return details
         
     except Exception as e:
-        print(f"Error checking module completion: {e}")
-        return False
+        logger.exception("Error getting module completion details")
+        return {}
     finally:
         cursor.close()
         conn.close()
 
+def get_completed_module_ids(user_id):
+    """Get the set of module IDs the user has completed"""
+    return {module_id for module_id, entry in get_module_completion_details(user_id).items() if entry['completed']}
+
+# Also used by module_manager.unlock_next_module_dynamic under the same statement name
+UNLOCK_MODULE_SQL = '''
+    INSERT INTO user_progress (user_id, module_id, xp_earned)
+    VALUES ($1, $2, 0)
+    ON CONFLICT (user_id, module_id) DO NOTHING
+    RETURNING id
+'''
+
 def get_next_module_id(current_module_id):
     """Get the next module ID in sequence"""
-    modules = ["A01", "A02", "A03", "A04", "A05", "A06", "A07", "A08", "A09", "A10"]
-    
-    try:
-        current_index = modules.index(current_module_id)
-        if current_index < len(modules) - 1:
-            return modules[current_index + 1]
-        return None  # Last module
-    except ValueError:
-        return None
+    return NEXT_MODULE_ID.get(current_module_id)  # None for the last or an unknown module
 
 def unlock_next_module(user_id, current_module_id):
     """Unlock the next module for the user"""
@@ -1576,29 +1845,20 @@ def unlock_next_module(user_id, current_module_id):
     cursor = get_dict_cursor(conn)
     
     try:
-        # Check if next module is already unlocked
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM user_progress 
-            WHERE user_id = %s AND module_id = %s
-        ''', (user_id, next_module_id))
+        # Unlock the next module by creating a progress entry with 0 XP;
+        # an existing row means it was already unlocked
+        execute_prepared(cursor, 'unlock_module', UNLOCK_MODULE_SQL, (user_id, next_module_id))
         
-        if cursor.fetchone()['count'] > 0:
+        if not cursor.fetchone():
             return next_module_id  # Already unlocked
         
-        # Unlock the next module by creating a progress entry with 0 XP
-        cursor.execute('''
-            INSERT INTO user_progress (user_id, module_id, xp_earned)
-            VALUES (%s, %s, 0)
-            ON CONFLICT (user_id, module_id) DO NOTHING
-        ''', (user_id, next_module_id))
-        
         conn.commit()
-        print(f"🔓 Module {next_module_id} unlocked for user {user_id}")
+        logger.info("Module %s unlocked for user %s", next_module_id, user_id)
         return next_module_id
         
     except Exception as e:
         conn.rollback()
-        print(f"Error unlocking next module: {e}")
+        logger.exception("Error unlocking next module")
         return None
     finally:
         cursor.close()
@@ -1,8 +1,11 @@
 # Modern Gamification System Backend
+import bisect
 import psycopg2
 import psycopg2.extras
-from datetime import datetime, date, timedelta
-from database_postgresql import get_db_connection, get_dict_cursor
+from datetime import datetime, date
+from database_postgresql import get_db_connection, get_dict_cursor, execute_prepared
+from cache_utils import TTLCache
+from config import Config
 import json
 import logging
 
@@ -33,6 +36,27 @@ class ModernGamificationSystem:
         self.streak_multipliers = {
             3: 1.1, 7: 1.2, 14: 1.3, 30: 1.5
         }
+        # Ascending thresholds and their multipliers, passed to the complete_activity query
+        self._streak_days = sorted(self.streak_multipliers)
+        self._streak_ladder = tuple(self.streak_multipliers[days] for days in self._streak_days)
+        
+        # Profiles keyed by user_id; dropped whenever the user earns XP
+        self._profile_cache = TTLCache(ttl_seconds=Config.PROFILE_CACHE_TTL, max_entries=10000)
+        # Ranked leaderboards keyed by limit; dropped on level-ups, otherwise left to expire
+        self._leaderboard_cache = TTLCache(ttl_seconds=Config.LEADERBOARD_CACHE_TTL, max_entries=32)
+        # Achievement definitions only change in _initialize_achievements; loaded on first use
+        self._achievements_cache = None
+        
+        # condition_type -> check(condition_value, stats, activity_counts). 'module_completion'
+        # would need additional logic to check a specific module, so it never matches
+        self._condition_handlers = {
+            'activity_count': lambda cv, stats, counts: stats['total_activities'] >= cv['min'],
+            'total_xp': lambda cv, stats, counts: stats['total_xp'] >= cv['min'],
+            'activity_type_count': lambda cv, stats, counts: counts.get(cv['activity_type'], 0) >= cv['min'],
+            'module_count': lambda cv, stats, counts: stats['modules_completed'] >= cv['min'],
+            'perfect_score': lambda cv, stats, counts: stats['perfect_scores'] >= cv['min'],
+            'streak': lambda cv, stats, counts: stats['max_streak'] >= cv['min'],
+        }
 
     def initialize_system(self):
         """Initialize gamification tables and data"""
@@ -51,6 +75,10 @@ class ModernGamificationSystem:
                     streak INTEGER DEFAULT 0,
                     max_streak INTEGER DEFAULT 0,
                     last_activity_date DATE,
+                    activities_count INTEGER DEFAULT 0,
+                    perfect_scores_count INTEGER DEFAULT 0,
+                    modules_completed_count INTEGER DEFAULT 0,
+                    achievements_earned_count INTEGER DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(user_id)
@@ -99,12 +127,18 @@ class ModernGamificationSystem:
                 CREATE INDEX IF NOT EXISTS idx_user_gamification_user_id ON user_gamification(user_id);
                 CREATE INDEX IF NOT EXISTS idx_activity_completions_user_id ON activity_completions(user_id);
                 CREATE INDEX IF NOT EXISTS idx_module_completions_user_id ON module_completions(user_id);
+                CREATE INDEX IF NOT EXISTS idx_activity_completions_user_module ON activity_completions(user_id, module_id, activity_type);
+                CREATE INDEX IF NOT EXISTS idx_activity_completions_user_type ON activity_completions(user_id, activity_type);
+                CREATE INDEX IF NOT EXISTS idx_user_gamification_total_xp ON user_gamification(total_xp DESC);
             """)
             
+            self._add_counter_columns(cursor)
+            
             # Initialize achievements
             self._initialize_achievements(cursor)
             
             conn.commit()
+            self._achievements_cache = None
             logger.info("✅ Modern gamification system initialized successfully")
             
         except Exception as e:
@@ -115,6 +149,30 @@ class ModernGamificationSystem:
             cursor.close()
             conn.close()
 
+    def _add_counter_columns(self, cursor):
+        """Add the per-user counter columns to older user_gamification tables and backfill them"""
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'user_gamification' AND column_name = 'activities_count'
+        """)
+        if cursor.fetchone():
+            return
+        
+        cursor.execute("""
+            ALTER TABLE user_gamification
+                ADD COLUMN IF NOT EXISTS activities_count INTEGER DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS perfect_scores_count INTEGER DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS modules_completed_count INTEGER DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS achievements_earned_count INTEGER DEFAULT 0;
+            
+            UPDATE user_gamification ug
+            SET activities_count = (SELECT COUNT(*) FROM activity_completions ac WHERE ac.user_id = ug.user_id),
+                perfect_scores_count = (SELECT COUNT(*) FROM activity_completions ac
+                                        WHERE ac.user_id = ug.user_id AND ac.score = 100),
+                modules_completed_count = (SELECT COUNT(*) FROM module_completions mc WHERE mc.user_id = ug.user_id),
+                achievements_earned_count = (SELECT COUNT(*) FROM user_achievements_new ua WHERE ua.user_id = ug.user_id);
+        """)
+
     def _initialize_achievements(self, cursor):
         """Initialize achievement definitions"""
         achievements = [
@@ -226,24 +284,25 @@ class ModernGamificationSystem:
             }
         ]
         
-        for achievement in achievements:
-            # Convert condition_value dict to JSON string
-            achievement_data = achievement.copy()
-            achievement_data['condition_value'] = json.dumps(achievement['condition_value'])
-            
-            cursor.execute("""
-                INSERT INTO achievements_new 
-                (name, description, icon, category, xp_reward, condition_type, condition_value)
-                VALUES (%(name)s, %(description)s, %(icon)s, %(category)s, %(xp_reward)s, 
-                        %(condition_type)s, %(condition_value)s)
-                ON CONFLICT (name) DO UPDATE SET
-                    description = EXCLUDED.description,
-                    icon = EXCLUDED.icon,
-                    category = EXCLUDED.category,
-                    xp_reward = EXCLUDED.xp_reward,
-                    condition_type = EXCLUDED.condition_type,
-                    condition_value = EXCLUDED.condition_value
-            """, achievement_data)
+        rows = [
+            (a['name'], a['description'], a['icon'], a['category'], a['xp_reward'],
+             a['condition_type'], psycopg2.extras.Json(a['condition_value']))
+            for a in achievements
+        ]
+        
+        # One multi-row upsert instead of a round-trip per achievement
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO achievements_new 
+            (name, description, icon, category, xp_reward, condition_type, condition_value)
+            VALUES %s
+            ON CONFLICT (name) DO UPDATE SET
+                description = EXCLUDED.description,
+                icon = EXCLUDED.icon,
+                category = EXCLUDED.category,
+                xp_reward = EXCLUDED.xp_reward,
+                condition_type = EXCLUDED.condition_type,
+                condition_value = EXCLUDED.condition_value
+        """, rows, page_size=100)
 
     def initialize_user(self, user_id):
         """Initialize gamification data for a new user"""
@@ -251,12 +310,7 @@ class ModernGamificationSystem:
         cursor = get_dict_cursor(conn)
         
         try:
-            cursor.execute("""
-                INSERT INTO user_gamification (user_id, level, current_xp, total_xp, streak, max_streak)
-                VALUES (%s, 1, 0, 0, 0, 0)
-                ON CONFLICT (user_id) DO NOTHING
-            """, (user_id,))
-            
+            self._ensure_user(cursor, user_id)
             conn.commit()
             
         except Exception as e:
@@ -267,6 +321,14 @@ class ModernGamificationSystem:
             cursor.close()
             conn.close()
 
+    def _ensure_user(self, cursor, user_id):
+        """Create the user's gamification row if missing, on the caller's transaction"""
+        execute_prepared(cursor, 'gamification_ensure_user', """
+            INSERT INTO user_gamification (user_id, level, current_xp, total_xp, streak, max_streak)
+            VALUES ($1, 1, 0, 0, 0, 0)
+            ON CONFLICT (user_id) DO NOTHING
+        """, (user_id,))
+
     def complete_activity(self, user_id, module_id, activity_type, score=0, time_spent=0):
         """Record activity completion and award XP"""
         conn = get_db_connection()
@@ -274,63 +336,100 @@ class ModernGamificationSystem:
         
         try:
             # Initialize user if needed
-            self.initialize_user(user_id)
-            
-            # Calculate XP
-            base_xp = self.xp_rewards.get(activity_type, 0)
-            bonus_xp = 0
-            
-            # Check if first time completing this activity type
-            cursor.execute("""
-                SELECT COUNT(*) as count FROM activity_completions
-                WHERE user_id = %s AND activity_type = %s
-            """, (user_id, activity_type))
-            
-            is_first_time = cursor.fetchone()['count'] == 0
-            if is_first_time:
-                bonus_xp += self.xp_rewards['first_time']
+            self._ensure_user(cursor, user_id)
             
             # Perfect score bonus
+            score_bonus = 0
             if score >= 100:
-                bonus_xp += self.xp_rewards['perfect_score']
+                score_bonus = self.xp_rewards['perfect_score']
             elif score >= 90:
-                bonus_xp += self.xp_rewards['perfect_score'] // 2
-            
-            # Get current streak for multiplier
-            cursor.execute("""
-                SELECT streak FROM user_gamification WHERE user_id = %s
-            """, (user_id,))
-            
-            current_streak = cursor.fetchone()['streak']
-            streak_multiplier = self._get_streak_multiplier(current_streak)
-            
-            total_xp = int((base_xp + bonus_xp) * streak_multiplier)
-            
-            # Record activity completion
-            cursor.execute("""
-                INSERT INTO activity_completions 
-                (user_id, module_id, activity_type, score, time_spent, xp_earned)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (user_id, module_id, activity_type, score, time_spent, total_xp))
-            
-            # Update user gamification data
-            result = self._update_user_xp(cursor, user_id, total_xp)
-            
-            # Update streak
-            self._update_streak(cursor, user_id)
+                score_bonus = self.xp_rewards['perfect_score'] // 2
+            
+            today = date.today()
+            
+            # First-time check, streak multiplier, activity insert, XP/level and
+            # streak update in one statement; FOR UPDATE serialises concurrent
+            # completions for the same user
+            execute_prepared(cursor, 'gamification_complete_activity', """
+                WITH prev AS (
+                    SELECT ug.level, ug.total_xp, ug.streak, ug.max_streak, ug.last_activity_date,
+                           NOT EXISTS (
+                               SELECT 1 FROM activity_completions
+                               WHERE user_id = $1::int AND activity_type = $3::varchar
+                           ) AS first_time,
+                           COALESCE((
+                               SELECT m.multiplier
+                               FROM unnest($10::int[], $11::float8[]) AS m(days, multiplier)
+                               WHERE ug.streak >= m.days
+                               ORDER BY m.days DESC
+                               LIMIT 1
+                           ), 1.0) AS streak_multiplier
+                    FROM user_gamification ug
+                    WHERE ug.user_id = $1::int
+                    FOR UPDATE
+                ),
+                calc AS (
+                    SELECT prev.*,
+                           floor(($7::int + $8::int
+                                  + CASE WHEN first_time THEN $9::int ELSE 0 END)
+                                 * streak_multiplier)::int AS xp_earned,
+                           CASE
+                               WHEN last_activity_date = $13::date THEN streak
+                               WHEN last_activity_date = $13::date - 1 THEN streak + 1
+                               ELSE 1
+                           END AS new_streak
+                    FROM prev
+                ),
+                recorded AS (
+                    INSERT INTO activity_completions
+                    (user_id, module_id, activity_type, score, time_spent, xp_earned)
+                    SELECT $1::int, $2::varchar, $3::varchar, $4::int, $6::int, xp_earned
+                    FROM calc
+                ),
+                leveled AS (
+                    SELECT calc.*,
+                           calc.total_xp + calc.xp_earned AS new_total_xp,
+                           (SELECT COUNT(*)::int FROM unnest($12::int[]) AS t(xp)
+                            WHERE t.xp <= calc.total_xp + calc.xp_earned) AS new_level
+                    FROM calc
+                )
+                UPDATE user_gamification ug
+                SET level = l.new_level,
+                    current_xp = l.new_total_xp - ($12::int[])[l.new_level],
+                    total_xp = l.new_total_xp,
+                    streak = l.new_streak,
+                    max_streak = GREATEST(l.max_streak, l.new_streak),
+                    last_activity_date = $13::date,
+                    activities_count = ug.activities_count + 1,
+                    perfect_scores_count = ug.perfect_scores_count + $5::int,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM leveled l
+                WHERE ug.user_id = $1::int
+                RETURNING l.level AS old_level, l.new_level, l.xp_earned, l.streak_multiplier
+            """, (
+                user_id, module_id, activity_type, score, 1 if score == 100 else 0, time_spent,
+                self.xp_rewards.get(activity_type, 0), score_bonus, self.xp_rewards['first_time'],
+                self._streak_days, list(self._streak_ladder), self.level_thresholds, today
+            ))
+            
+            result = cursor.fetchone()
+            level_up = result['new_level'] > result['old_level']
             
             # Check achievements
             new_achievements = self._check_achievements(cursor, user_id)
             
             conn.commit()
+            self._profile_cache.delete(user_id)
+            if level_up:
+                self._leaderboard_cache.clear()
             
             return {
                 'success': True,
-                'xp_earned': total_xp,
-                'level_up': result.get('level_up', False),
-                'new_level': result.get('new_level'),
+                'xp_earned': result['xp_earned'],
+                'level_up': level_up,
+                'new_level': result['new_level'],
                 'new_achievements': new_achievements,
-                'streak_multiplier': streak_multiplier
+                'streak_multiplier': result['streak_multiplier']
             }
             
         except Exception as e:
@@ -356,6 +455,9 @@ class ModernGamificationSystem:
             if cursor.fetchone():
                 return {'success': False, 'message': 'Module already completed'}
             
+            # Initialize user if needed (_update_user_xp expects the row)
+            self._ensure_user(cursor, user_id)
+            
             # Calculate total XP earned for this module
             cursor.execute("""
                 SELECT COALESCE(SUM(xp_earned), 0) as total_xp
@@ -368,8 +470,14 @@ class ModernGamificationSystem:
             
             # Record module completion
             cursor.execute("""
-                INSERT INTO module_completions (user_id, module_id, total_xp_earned)
-                VALUES (%s, %s, %s)
+                WITH completed AS (
+                    INSERT INTO module_completions (user_id, module_id, total_xp_earned)
+                    VALUES (%s, %s, %s)
+                    RETURNING user_id
+                )
+                UPDATE user_gamification
+                SET modules_completed_count = modules_completed_count + 1
+                WHERE user_id IN (SELECT user_id FROM completed)
             """, (user_id, module_id, module_xp + completion_bonus))
             
             # Award completion bonus
@@ -379,6 +487,9 @@ class ModernGamificationSystem:
             new_achievements = self._check_achievements(cursor, user_id)
             
             conn.commit()
+            self._profile_cache.delete(user_id)
+            if result['level_up']:
+                self._leaderboard_cache.clear()
             
             return {
                 'success': True,
@@ -398,60 +509,64 @@ class ModernGamificationSystem:
 
     def get_user_profile(self, user_id):
         """Get complete user gamification profile"""
+        cached = self._profile_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         conn = get_db_connection()
         cursor = get_dict_cursor(conn)
         
         try:
-            # Get user gamification data
-            cursor.execute("""
-                SELECT ug.*, u.username, u.name
+            # Gamification row plus activity stats, completed modules and earned
+            # achievements, aggregated to JSON so one round-trip returns everything
+            profile_query = """
+                SELECT ug.*, u.username, u.name,
+                    COALESCE((
+                        SELECT json_object_agg(s.activity_type, row_to_json(s))
+                        FROM (
+                            SELECT 
+                                activity_type,
+                                COUNT(*) as count,
+                                AVG(score) as avg_score,
+                                SUM(time_spent) as total_time,
+                                SUM(xp_earned) as total_xp
+                            FROM activity_completions
+                            WHERE user_id = ug.user_id
+                            GROUP BY activity_type
+                        ) s
+                    ), '{}') as activity_stats,
+                    COALESCE((
+                        SELECT json_agg(m ORDER BY m.completed_at)
+                        FROM (
+                            SELECT module_id, completed_at, total_xp_earned
+                            FROM module_completions
+                            WHERE user_id = ug.user_id
+                        ) m
+                    ), '[]') as completed_modules,
+                    COALESCE((
+                        SELECT json_agg(e ORDER BY e.earned_at DESC)
+                        FROM (
+                            SELECT a.name, a.description, a.icon, a.category, ua.earned_at
+                            FROM user_achievements_new ua
+                            JOIN achievements_new a ON ua.achievement_id = a.id
+                            WHERE ua.user_id = ug.user_id
+                        ) e
+                    ), '[]') as achievements
                 FROM user_gamification ug
                 JOIN users u ON ug.user_id = u.id
                 WHERE ug.user_id = %s
-            """, (user_id,))
+            """
+            cursor.execute(profile_query, (user_id,))
             
             profile = cursor.fetchone()
             if not profile:
-                self.initialize_user(user_id)
-                return self.get_user_profile(user_id)
-            
-            # Get activity stats
-            cursor.execute("""
-                SELECT 
-                    activity_type,
-                    COUNT(*) as count,
-                    AVG(score) as avg_score,
-                    SUM(time_spent) as total_time,
-                    SUM(xp_earned) as total_xp
-                FROM activity_completions
-                WHERE user_id = %s
-                GROUP BY activity_type
-            """, (user_id,))
-            
-            activity_stats = {row['activity_type']: dict(row) for row in cursor.fetchall()}
-            
-            # Get completed modules
-            cursor.execute("""
-                SELECT module_id, completed_at, total_xp_earned
-                FROM module_completions
-                WHERE user_id = %s
-                ORDER BY completed_at
-            """, (user_id,))
-            
-            completed_modules = [dict(row) for row in cursor.fetchall()]
+                # First visit: create the row on this connection and read it back
+                self._ensure_user(cursor, user_id)
+                conn.commit()
+                cursor.execute(profile_query, (user_id,))
+                profile = cursor.fetchone()
             
-            # Get earned achievements
-            cursor.execute("""
-                SELECT a.name, a.description, a.icon, a.category, ua.earned_at
-                FROM user_achievements_new ua
-                JOIN achievements_new a ON ua.achievement_id = a.id
-                WHERE ua.user_id = %s
-                ORDER BY ua.earned_at DESC
-            """, (user_id,))
-            
-            achievements = [dict(row) for row in cursor.fetchall()]
-            
-            return {
+            user_profile = {
                 'user_id': profile['user_id'],
                 'username': profile['username'],
                 'name': profile['name'],
@@ -462,10 +577,12 @@ class ModernGamificationSystem:
                 'max_streak': profile['max_streak'],
                 'last_activity_date': profile['last_activity_date'].isoformat() if profile['last_activity_date'] else None,
                 'next_level_xp': self._get_next_level_xp(profile['level']),
-                'activity_stats': activity_stats,
-                'completed_modules': completed_modules,
-                'achievements': achievements
+                'activity_stats': profile['activity_stats'],
+                'completed_modules': profile['completed_modules'],
+                'achievements': profile['achievements']
             }
+            self._profile_cache.set(user_id, user_profile)
+            return user_profile
             
         except Exception as e:
             logger.error(f"Error getting user profile: {e}")
@@ -476,6 +593,10 @@ class ModernGamificationSystem:
 
     def get_leaderboard(self, limit=10):
         """Get leaderboard with top users"""
+        leaderboard = self._leaderboard_cache.get(limit)
+        if leaderboard is not None:
+            return leaderboard
+        
         conn = get_db_connection()
         cursor = get_dict_cursor(conn)
         
@@ -488,24 +609,21 @@ class ModernGamificationSystem:
                     ug.total_xp,
                     ug.streak,
                     ug.max_streak,
-                    COUNT(DISTINCT mc.module_id) as modules_completed,
-                    COUNT(DISTINCT ua.achievement_id) as achievements_earned
+                    ug.modules_completed_count as modules_completed,
+                    ug.achievements_earned_count as achievements_earned
                 FROM users u
                 JOIN user_gamification ug ON u.id = ug.user_id
-                LEFT JOIN module_completions mc ON u.id = mc.user_id
-                LEFT JOIN user_achievements_new ua ON u.id = ua.user_id
                 WHERE u.is_active = TRUE
-                GROUP BY u.id, u.username, u.name, ug.level, ug.total_xp, ug.streak, ug.max_streak
                 ORDER BY ug.total_xp DESC, ug.level DESC
                 LIMIT %s
             """, (limit,))
             
             leaderboard = []
-            for i, row in enumerate(cursor.fetchall(), 1):
-                entry = dict(row)
+            for i, entry in enumerate(cursor.fetchall(), 1):
                 entry['rank'] = i
                 leaderboard.append(entry)
             
+            self._leaderboard_cache.set(limit, leaderboard)
             return leaderboard
             
         except Exception as e:
@@ -535,7 +653,7 @@ class ModernGamificationSystem:
                 ORDER BY ua.earned_at DESC
             """, (user_id,))
             
-            achievements = [dict(row) for row in cursor.fetchall()]
+            achievements = cursor.fetchall()
             return achievements
             
         except Exception as e:
@@ -548,9 +666,9 @@ class ModernGamificationSystem:
     def _update_user_xp(self, cursor, user_id, xp_amount):
         """Update user XP and handle level progression"""
         # Get current data
-        cursor.execute("""
+        execute_prepared(cursor, 'gamification_user_xp', """
             SELECT level, current_xp, total_xp FROM user_gamification
-            WHERE user_id = %s
+            WHERE user_id = $1
         """, (user_id,))
         
         data = cursor.fetchone()
@@ -563,10 +681,10 @@ class ModernGamificationSystem:
         new_current_xp = new_total_xp - level_base_xp
         
         # Update user data
-        cursor.execute("""
+        execute_prepared(cursor, 'gamification_set_xp', """
             UPDATE user_gamification
-            SET level = %s, current_xp = %s, total_xp = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE user_id = %s
+            SET level = $1, current_xp = $2, total_xp = $3, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = $4
         """, (new_level, new_current_xp, new_total_xp, user_id))
         
         return {
@@ -576,145 +694,111 @@ class ModernGamificationSystem:
             'new_total_xp': new_total_xp
         }
 
-    def _update_streak(self, cursor, user_id):
-        """Update user's learning streak"""
-        today = date.today()
-        yesterday = today - timedelta(days=1)
-        
-        cursor.execute("""
-            SELECT streak, max_streak, last_activity_date
-            FROM user_gamification
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        data = cursor.fetchone()
-        current_streak = data['streak']
-        max_streak = data['max_streak']
-        last_activity = data['last_activity_date']
-        
-        if last_activity == today:
-            # Already active today
-            return
-        elif last_activity == yesterday:
-            # Consecutive day
-            new_streak = current_streak + 1
-        else:
-            # Streak broken or first activity
-            new_streak = 1
-        
-        new_max_streak = max(max_streak, new_streak)
-        
-        cursor.execute("""
-            UPDATE user_gamification
-            SET streak = %s, max_streak = %s, last_activity_date = %s
-            WHERE user_id = %s
-        """, (new_streak, new_max_streak, today, user_id))
-
     def _check_achievements(self, cursor, user_id):
         """Check and award new achievements"""
-        # Get user stats
-        cursor.execute("""
+        # Get user stats, per-type activity counts and already earned achievement
+        # ids as one row rather than a dict per activity type/achievement
+        execute_prepared(cursor, 'gamification_achievement_stats', """
             SELECT 
-                ug.total_xp,
-                ug.streak,
-                ug.max_streak,
-                COUNT(DISTINCT ac.id) as total_activities,
-                COUNT(DISTINCT mc.module_id) as modules_completed,
-                COUNT(CASE WHEN ac.score = 100 THEN 1 END) as perfect_scores
-            FROM user_gamification ug
-            LEFT JOIN activity_completions ac ON ug.user_id = ac.user_id
-            LEFT JOIN module_completions mc ON ug.user_id = mc.user_id
-            WHERE ug.user_id = %s
-            GROUP BY ug.user_id, ug.total_xp, ug.streak, ug.max_streak
+                total_xp,
+                streak,
+                max_streak,
+                activities_count as total_activities,
+                modules_completed_count as modules_completed,
+                perfect_scores_count as perfect_scores,
+                COALESCE((
+                    SELECT json_object_agg(activity_type, count)
+                    FROM (
+                        SELECT activity_type, COUNT(*) as count
+                        FROM activity_completions
+                        WHERE user_id = $1
+                        GROUP BY activity_type
+                    ) c
+                ), '{}') as activity_counts,
+                ARRAY(
+                    SELECT achievement_id FROM user_achievements_new WHERE user_id = $1
+                ) as earned_ids
+            FROM user_gamification
+            WHERE user_id = $1
         """, (user_id,))
         
         stats = cursor.fetchone()
+        activity_counts = stats['activity_counts']
+        earned_ids = set(stats['earned_ids'])
         
-        # Get activity type counts
-        cursor.execute("""
-            SELECT activity_type, COUNT(*) as count
-            FROM activity_completions
-            WHERE user_id = %s
-            GROUP BY activity_type
-        """, (user_id,))
-        
-        activity_counts = {row['activity_type']: row['count'] for row in cursor.fetchall()}
-        
-        # Get already earned achievements
-        cursor.execute("""
-            SELECT achievement_id FROM user_achievements_new WHERE user_id = %s
-        """, (user_id,))
+        unlocked = [
+            achievement for achievement in self._get_achievements(cursor)
+            if achievement['id'] not in earned_ids
+            and self._check_achievement_condition(achievement, stats, activity_counts)
+        ]
+        if not unlocked:
+            return []
         
-        earned_ids = {row['achievement_id'] for row in cursor.fetchall()}
+        # Award every unlocked achievement in one statement; rows another request
+        # already inserted are skipped and earn no XP here
+        inserted = psycopg2.extras.execute_values(cursor, """
+            WITH earned AS (
+                INSERT INTO user_achievements_new (user_id, achievement_id)
+                VALUES %s
+                ON CONFLICT (user_id, achievement_id) DO NOTHING
+                RETURNING user_id, achievement_id
+            ),
+            counted AS (
+                UPDATE user_gamification
+                SET achievements_earned_count = achievements_earned_count + (SELECT COUNT(*) FROM earned)
+                WHERE user_id IN (SELECT user_id FROM earned)
+            )
+            SELECT achievement_id FROM earned
+        """, [(user_id, achievement['id']) for achievement in unlocked], fetch=True)
+        inserted_ids = {row['achievement_id'] for row in inserted}
         
-        # Check all achievements
-        cursor.execute("SELECT * FROM achievements_new")
-        all_achievements = cursor.fetchall()
+        new_achievements = [
+            {
+                'name': achievement['name'],
+                'description': achievement['description'],
+                'icon': achievement['icon'],
+                'category': achievement['category'],
+                'xp_reward': achievement['xp_reward']
+            }
+            for achievement in unlocked if achievement['id'] in inserted_ids
+        ]
         
-        new_achievements = []
-        for achievement in all_achievements:
-            if achievement['id'] in earned_ids:
-                continue
-            
-            if self._check_achievement_condition(achievement, stats, activity_counts):
-                # Award achievement
-                cursor.execute("""
-                    INSERT INTO user_achievements_new (user_id, achievement_id)
-                    VALUES (%s, %s)
-                """, (user_id, achievement['id']))
-                
-                # Award achievement XP
-                if achievement['xp_reward'] > 0:
-                    self._update_user_xp(cursor, user_id, achievement['xp_reward'])
-                
-                new_achievements.append({
-                    'name': achievement['name'],
-                    'description': achievement['description'],
-                    'icon': achievement['icon'],
-                    'category': achievement['category'],
-                    'xp_reward': achievement['xp_reward']
-                })
+        # Award achievement XP
+        bonus_xp = sum(achievement['xp_reward'] for achievement in new_achievements)
+        if bonus_xp > 0:
+            self._update_user_xp(cursor, user_id, bonus_xp)
         
         return new_achievements
 
+    def _get_achievements(self, cursor):
+        """Return the achievement definitions, reading them from the database once"""
+        if self._achievements_cache is None:
+            cursor.execute("""
+                SELECT id, name, description, icon, category, xp_reward, condition_type, condition_value
+                FROM achievements_new
+            """)
+            achievements = cursor.fetchall()
+            # JSONB arrives as a dict; parse any legacy string value once here
+            for achievement in achievements:
+                if isinstance(achievement['condition_value'], str):
+                    try:
+                        achievement['condition_value'] = json.loads(achievement['condition_value'])
+                    except (json.JSONDecodeError, TypeError):
+                        achievement['condition_value'] = None
+            self._achievements_cache = achievements
+        return self._achievements_cache
+
     def _check_achievement_condition(self, achievement, stats, activity_counts):
         """Check if achievement condition is met"""
-        condition_type = achievement['condition_type']
+        handler = self._condition_handlers.get(achievement['condition_type'])
         condition_value = achievement['condition_value']
-        
-        # Parse JSON condition_value if it's a string
-        if isinstance(condition_value, str):
-            try:
-                condition_value = json.loads(condition_value)
-            except (json.JSONDecodeError, TypeError):
-                return False
-        
-        if condition_type == 'activity_count':
-            return stats['total_activities'] >= condition_value['min']
-        elif condition_type == 'total_xp':
-            return stats['total_xp'] >= condition_value['min']
-        elif condition_type == 'activity_type_count':
-            activity_type = condition_value['activity_type']
-            count = activity_counts.get(activity_type, 0)
-            return count >= condition_value['min']
-        elif condition_type == 'module_count':
-            return stats['modules_completed'] >= condition_value['min']
-        elif condition_type == 'perfect_score':
-            return stats['perfect_scores'] >= condition_value['min']
-        elif condition_type == 'streak':
-            return stats['max_streak'] >= condition_value['min']
-        elif condition_type == 'module_completion':
-            # This would need additional logic to check specific module
+        if handler is None or condition_value is None:
             return False
-        
-        return False
+        return handler(condition_value, stats, activity_counts)
 
     def _calculate_level(self, total_xp):
         """Calculate level based on total XP"""
-        for i in range(len(self.level_thresholds) - 1, -1, -1):
-            if total_xp >= self.level_thresholds[i]:
-                return i + 1
-        return 1
+        return max(bisect.bisect_right(self.level_thresholds, total_xp), 1)
 
     def _get_next_level_xp(self, current_level):
         """Get XP required for next level"""
@@ -722,13 +806,6 @@ class ModernGamificationSystem:
             return self.level_thresholds[current_level]
         return self.level_thresholds[-1] + 1000
 
-    def _get_streak_multiplier(self, streak):
-        """Get streak multiplier based on current streak"""
-        for days in sorted(self.streak_multipliers.keys(), reverse=True):
-            if streak >= days:
-                return self.streak_multipliers[days]
-        return 1.0
-
 # Initialize global gamification system
 gamification_system = ModernGamificationSystem()
 
@@ -0,0 +1,20 @@
+-- Migration: 009_leaderboard_rankings.sql
+-- Description: Precomputed leaderboard so the API reads ranked rows instead of aggregating per request
+-- Date: 2026-10-15
+
+-- One row per active user, rewritten by refresh_leaderboard_rankings()
+CREATE TABLE IF NOT EXISTS leaderboard_rankings (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    rank INTEGER NOT NULL,
+    name VARCHAR(100),
+    username VARCHAR(50) NOT NULL,
+    total_xp INTEGER DEFAULT 0,
+    level INTEGER DEFAULT 1,
+    streak INTEGER DEFAULT 0,
+    modules_completed INTEGER DEFAULT 0,
+    refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_leaderboard_rankings_rank ON leaderboard_rankings(rank);
+
+COMMENT ON TABLE leaderboard_rankings IS 'Materialized leaderboard, refreshed periodically from user_gamification and user_progress';
@@ -0,0 +1,14 @@
+-- Migration: 010_completion_indexes.sql
+-- Description: Composite indexes for the per-user module completion lookups
+-- Date: 2026-10-15
+
+-- Completed legacy activities per user/module (is_module_completed, debug endpoints)
+CREATE INDEX IF NOT EXISTS idx_learning_activities_user_module_done
+    ON learning_activities(user_id, module_id, activity_type)
+    WHERE completed_at IS NOT NULL;
+
+-- Passing-assessment checks filter on user, module, completion and score
+CREATE INDEX IF NOT EXISTS idx_user_assessment_attempts_user_module_completed
+    ON user_assessment_attempts(user_id, module_id, is_completed, score_percentage);
+
+-- user_progress(user_id, module_id) is already covered by its UNIQUE constraint
@@ -0,0 +1,13 @@
+-- Migration: 011_leaderboard_snapshots.sql
+-- Description: Daily leaderboard rank snapshots for rank trend indicators
+-- Date: 2026-10-15
+
+-- Last rank each user held on a given day, written by refresh_leaderboard_rankings()
+CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+    snap_date DATE NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (snap_date, user_id)
+);
+
+COMMENT ON TABLE leaderboard_snapshots IS 'Daily leaderboard ranks; trend = yesterday''s rank minus today''s rank';
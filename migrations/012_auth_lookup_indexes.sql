@@ -0,0 +1,10 @@
+-- Migration: 012_auth_lookup_indexes.sql
+-- Description: Drop auth lookup indexes that duplicate UNIQUE constraints
+-- Date: 2026-10-15
+
+-- users.username, password_reset_tokens.token and email_verification_tokens.token
+-- are UNIQUE, so PostgreSQL already serves the login/lockout/reset-token lookups
+-- from the constraint's B-tree index. These extra copies only slow down writes.
+DROP INDEX IF EXISTS idx_users_username;
+DROP INDEX IF EXISTS idx_password_reset_tokens_token;
+DROP INDEX IF EXISTS idx_email_verification_tokens_token;
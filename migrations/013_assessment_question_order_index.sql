@@ -0,0 +1,9 @@
+-- Migration: 013_assessment_question_order_index.sql
+-- Description: Partial index serving the active-question listing in display order
+-- Date: 2026-10-15
+
+-- get_assessment_questions/grade_quiz_answers filter on module_id AND is_active and
+-- order by (order_index, id); this returns the rows pre-sorted with no Sort step
+CREATE INDEX IF NOT EXISTS idx_assessment_questions_module_active_order
+    ON assessment_questions(module_id, order_index, id)
+    WHERE is_active = TRUE;
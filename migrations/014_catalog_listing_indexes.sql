@@ -0,0 +1,17 @@
+-- Migration: 014_catalog_listing_indexes.sql
+-- Description: Partial indexes serving the published-animation and active-section listings
+-- Date: 2026-10-15
+
+-- get_animations_by_module/get_all_animations filter on is_published and order by id
+CREATE INDEX IF NOT EXISTS idx_animations_module_published
+    ON animations(module_id, id)
+    WHERE is_published = TRUE;
+
+-- get_module_sections filters on module_id AND is_active and orders by (order_index, id)
+CREATE INDEX IF NOT EXISTS idx_module_sections_module_active_order
+    ON module_sections(module_id, order_index, id)
+    WHERE is_active = TRUE;
+
+-- user_progress(user_id, module_id) is covered by its UNIQUE constraint,
+-- activity_completions(user_id, module_id, activity_type) by gamification_system's
+-- setup and user_assessment_attempts by 010_completion_indexes.sql
@@ -4,65 +4,75 @@ Dynamic Module Management System
 Replaces hardcoded module logic with database-driven functionality
 """
 
-from database_postgresql import get_all_learning_modules, is_module_completed
+import logging
+import sys
 
-def get_module_order():
-    """Get module order from database dynamically"""
+from cache_utils import cached
+from database_postgresql import (
+    CATALOG_CACHE, MODULE_SEQUENCE, NEXT_MODULE_ID, UNLOCK_MODULE_SQL, execute_prepared,
+    get_all_learning_modules, get_completed_module_ids, get_db_connection, get_dict_cursor
+)
+
+logger = logging.getLogger('module_manager')
+
+@cached(CATALOG_CACHE, 'module_order')
+def _load_module_order():
+    """Sorted module ids and each one's successor, kept with the module catalog so edits invalidate both"""
+    modules = get_all_learning_modules()
+    if not modules:
+        return None
+    # Sort by order_index, then by module_id as fallback
+    sorted_modules = sorted(modules, key=lambda x: (x.get('order_index', 999), x.get('module_id', '')))
+    # Interned so the many membership checks against these ids compare by identity first
+    module_order = tuple(sys.intern(m['module_id']) for m in sorted_modules)
+    return module_order, dict(zip(module_order, module_order[1:]))
+
+def _module_order_and_successors():
+    """(module order, {module_id: next module_id}) from the database, or the OWASP Top 10 defaults"""
     try:
-        modules = get_all_learning_modules()
-        if modules:
-            # Sort by order_index, then by module_id as fallback
-            sorted_modules = sorted(modules, key=lambda x: (x.get('order_index', 999), x.get('module_id', '')))
-            return [m['module_id'] for m in sorted_modules]
+        loaded = _load_module_order()
+        if loaded:
+            return loaded
     except Exception as e:
-        print(f"Error getting module order from database: {e}")
+        logger.exception("Error getting module order from database")
     
     # Fallback to OWASP Top 10 order
-    return ["A01", "A02", "A03", "A04", "A05", "A06", "A07", "A08", "A09", "A10"]
+    return MODULE_SEQUENCE, NEXT_MODULE_ID
+
+def get_module_order():
+    """Get module order from database dynamically"""
+    return list(_module_order_and_successors()[0])
 
 def get_next_module_id_dynamic(current_module_id):
     """Get the next module ID in sequence from database"""
-    try:
-        module_order = get_module_order()
-        current_index = module_order.index(current_module_id)
-        if current_index < len(module_order) - 1:
-            return module_order[current_index + 1]
-        return None  # Last module
-    except (ValueError, Exception) as e:
-        print(f"Error getting next module ID: {e}")
-        return None
+    # None for the last or an unknown module
+    return _module_order_and_successors()[1].get(current_module_id)
 
 def get_user_unlocked_modules(user_id):
     """Get dynamically calculated unlocked modules for a user"""
     try:
         module_order = get_module_order()
-        unlocked_modules = [module_order[0]] if module_order else []  # First module always unlocked
-        
-        # Unlock next module for each completed one
-        for i, module_id in enumerate(module_order[:-1]):  # Exclude last module
-            if is_module_completed(user_id, module_id):
-                next_module = module_order[i + 1]
-                if next_module not in unlocked_modules:
-                    unlocked_modules.append(next_module)
+        completed_ids = get_completed_module_ids(user_id)  # one batch lookup for every module
         
-        return unlocked_modules
+        # First module always unlocked, then the successor of each completed one;
+        # module ids are unique, so no successor can repeat or be the first module
+        return module_order[:1] + [
+            next_module for module_id, next_module in zip(module_order, module_order[1:])
+            if module_id in completed_ids
+        ]
     except Exception as e:
-        print(f"Error calculating unlocked modules: {e}")
+        logger.exception("Error calculating unlocked modules")
         return ["A01"]  # Safe fallback
 
 def get_user_completed_modules(user_id):
     """Get dynamically calculated completed modules for a user"""
     try:
         module_order = get_module_order()
-        completed_modules = []
-        
-        for module_id in module_order:
-            if is_module_completed(user_id, module_id):
-                completed_modules.append(module_id)
+        completed_ids = get_completed_module_ids(user_id)  # one batch lookup for every module
         
-        return completed_modules
+        return [module_id for module_id in module_order if module_id in completed_ids]
     except Exception as e:
-        print(f"Error calculating completed modules: {e}")
+        logger.exception("Error calculating completed modules")
         return []
 
 def unlock_next_module_dynamic(user_id, current_module_id):
@@ -72,33 +82,21 @@ def unlock_next_module_dynamic(user_id, current_module_id):
     if not next_module_id:
         return None  # No next module to unlock
     
-    from database_postgresql import get_db_connection, get_dict_cursor
     conn = get_db_connection()
     cursor = get_dict_cursor(conn)
     
     try:
-        # Check if next module is already unlocked
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM user_progress 
-            WHERE user_id = %s AND module_id = %s
-        ''', (user_id, next_module_id))
+        # Unlock the next module by creating a progress entry with 0 XP;
+        # an existing row means it was already unlocked
+        execute_prepared(cursor, 'unlock_module', UNLOCK_MODULE_SQL, (user_id, next_module_id))
         
-        if cursor.fetchone()['count'] > 0:
-            return next_module_id  # Already unlocked
-        
-        # Unlock the next module by creating a progress entry with 0 XP
-        cursor.execute('''
-            INSERT INTO user_progress (user_id, module_id, xp_earned)
-            VALUES (%s, %s, 0)
-            ON CONFLICT (user_id, module_id) DO NOTHING
-        ''', (user_id, next_module_id))
-        
-        conn.commit()
+        if cursor.fetchone():
+            conn.commit()
         return next_module_id
         
     except Exception as e:
         conn.rollback()
-        print(f"Error unlocking next module: {e}")
+        logger.exception("Error unlocking next module")
         return None
     finally:
         cursor.close()
@@ -108,32 +106,43 @@ def get_module_progress_summary(user_id):
     """Get a complete summary of user's module progress"""
     try:
         module_order = get_module_order()
-        completed_modules = get_user_completed_modules(user_id)
-        unlocked_modules = get_user_unlocked_modules(user_id)
+        completed_ids = get_completed_module_ids(user_id)  # the only query; order is cached
+        
+        # First module always unlocked, plus the successor of each completed module
+        unlocked_ids = set(module_order[:1])
+        unlocked_ids.update(
+            next_module for module_id, next_module in zip(module_order, module_order[1:])
+            if module_id in completed_ids
+        )
         
         progress_summary = []
+        completed_count = 0
         for module_id in module_order:
+            is_completed = module_id in completed_ids
+            is_unlocked = module_id in unlocked_ids
+            completed_count += is_completed
+            
             status = "locked"
-            if module_id in completed_modules:
+            if is_completed:
                 status = "completed"
-            elif module_id in unlocked_modules:
+            elif is_unlocked:
                 status = "unlocked"
             
             progress_summary.append({
                 "module_id": module_id,
                 "status": status,
-                "is_completed": module_id in completed_modules,
-                "is_unlocked": module_id in unlocked_modules
+                "is_completed": is_completed,
+                "is_unlocked": is_unlocked
             })
         
         return {
             "modules": progress_summary,
-            "completed_count": len(completed_modules),
-            "unlocked_count": len(unlocked_modules),
+            "completed_count": completed_count,
+            "unlocked_count": len(unlocked_ids),
             "total_count": len(module_order)
         }
     except Exception as e:
-        print(f"Error getting module progress summary: {e}")
+        logger.exception("Error getting module progress summary")
         return {
             "modules": [],
             "completed_count": 0,
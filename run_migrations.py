@@ -9,34 +9,33 @@ import sys
 import psycopg2
 from database_postgresql import get_db_connection
 
-def run_migration_file(filepath):
-    """Run a single migration file"""
-    print(f"Running migration: {os.path.basename(filepath)}")
+def run_migration_file(conn, filepath):
+    """Run a single migration file and record it in schema_migrations, in one transaction"""
+    filename = os.path.basename(filepath)
+    print(f"Running migration: {filename}")
     
+    cursor = conn.cursor()
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             sql_content = f.read()
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Execute the migration
+        # Execute the migration; a failure rolls back the bookkeeping row with it
         cursor.execute(sql_content)
+        cursor.execute(
+            'INSERT INTO schema_migrations (filename) VALUES (%s)',
+            (filename,)
+        )
         conn.commit()
         
-        print(f"✅ Successfully executed: {os.path.basename(filepath)}")
+        print(f"✅ Successfully executed: {filename}")
         return True
         
     except Exception as e:
-        print(f"❌ Error executing {os.path.basename(filepath)}: {e}")
-        if conn:
-            conn.rollback()
+        print(f"❌ Error executing {filename}: {e}")
+        conn.rollback()
         return False
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        cursor.close()
 
 def get_migration_files():
     """Get all migration files in order"""
@@ -46,23 +45,17 @@ def get_migration_files():
         print(f"❌ Migrations directory not found: {migrations_dir}")
         return []
     
-    # Get all .sql files and sort them
-    migration_files = []
-    for filename in os.listdir(migrations_dir):
-        if filename.endswith('.sql'):
-            filepath = os.path.join(migrations_dir, filename)
-            migration_files.append(filepath)
-    
-    # Sort by filename (assumes numbered naming like 001_, 002_, etc.)
-    migration_files.sort()
-    return migration_files
+    # Get all .sql files sorted by filename (assumes numbered naming like 001_, 002_, etc.)
+    with os.scandir(migrations_dir) as entries:
+        return sorted(
+            entry.path for entry in entries
+            if entry.name.endswith('.sql') and entry.is_file()
+        )
 
-def check_migration_table():
+def check_migration_table(conn):
     """Create migrations tracking table if it doesn't exist"""
+    cursor = conn.cursor()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS schema_migrations (
                 id SERIAL PRIMARY KEY,
@@ -76,97 +69,63 @@ def check_migration_table():
         
     except Exception as e:
         print(f"❌ Error creating migrations table: {e}")
+        conn.rollback()
         return False
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-def is_migration_executed(filename):
-    """Check if a migration has already been executed"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'SELECT COUNT(*) FROM schema_migrations WHERE filename = %s',
-            (filename,)
-        )
-        
-        count = cursor.fetchone()[0]
-        return count > 0
-        
-    except Exception as e:
-        print(f"❌ Error checking migration status: {e}")
-        return False
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        cursor.close()
 
-def mark_migration_executed(filename):
-    """Mark a migration as executed"""
+def get_executed_migrations(conn):
+    """Get the filenames of every migration that has already been executed"""
+    cursor = conn.cursor()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT INTO schema_migrations (filename) VALUES (%s)',
-            (filename,)
-        )
-        
-        conn.commit()
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error marking migration as executed: {e}")
-        return False
+        cursor.execute('SELECT filename FROM schema_migrations')
+        return {row[0] for row in cursor.fetchall()}
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        cursor.close()
 
 def main():
     """Main migration runner"""
     print("🚀 Starting database migrations...")
     print("=" * 50)
     
-    # Check/create migrations table
-    if not check_migration_table():
-        print("❌ Failed to create migrations tracking table")
-        sys.exit(1)
-    
-    # Get all migration files
-    migration_files = get_migration_files()
-    
-    if not migration_files:
-        print("ℹ️  No migration files found")
-        return
-    
-    executed_count = 0
-    skipped_count = 0
-    
-    # Run each migration
-    for filepath in migration_files:
-        filename = os.path.basename(filepath)
+    # One connection for the whole run
+    conn = get_db_connection()
+    try:
+        # Check/create migrations table
+        if not check_migration_table(conn):
+            print("❌ Failed to create migrations tracking table")
+            sys.exit(1)
         
-        # Check if already executed
-        if is_migration_executed(filename):
-            print(f"⏭️  Skipping (already executed): {filename}")
-            skipped_count += 1
-            continue
+        # Get all migration files
+        migration_files = get_migration_files()
         
-        # Run the migration
-        if run_migration_file(filepath):
-            mark_migration_executed(filename)
-            executed_count += 1
-        else:
-            print(f"❌ Migration failed: {filename}")
-            print("🛑 Stopping migration process")
-            sys.exit(1)
+        if not migration_files:
+            print("ℹ️  No migration files found")
+            return
+        
+        executed = get_executed_migrations(conn)
+        executed_count = 0
+        skipped_count = 0
+        
+        # Run each migration
+        for filepath in migration_files:
+            filename = os.path.basename(filepath)
+            
+            # Check if already executed
+            if filename in executed:
+                print(f"⏭️  Skipping (already executed): {filename}")
+                skipped_count += 1
+                continue
+            
+            # Run the migration
+            if run_migration_file(conn, filepath):
+                executed_count += 1
+            else:
+                print(f"❌ Migration failed: {filename}")
+                print("🛑 Stopping migration process")
+                sys.exit(1)
+    finally:
+        conn.close()
     
     print("=" * 50)
     print(f"✅ Migration process completed!")
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Test that assessment statistics are served from the stats cache
+"""
+
+from app import app, ASSESSMENT_STATS_CACHE
+
+def test_assessment_statistics_cache(module_id='A01'):
+    """Check the statistics endpoint fills ASSESSMENT_STATS_CACHE"""
+    print(f"Testing assessment statistics cache for module {module_id}")
+    ASSESSMENT_STATS_CACHE.clear()
+    
+    client = app.test_client()
+    for path, key in [('/api/assessments/statistics', 'stats:all'),
+                      (f'/api/assessments/{module_id}/statistics', f'stats:{module_id}')]:
+        data = client.get(path).get_json()
+        print(f"{path}: success={data.get('success')}, rows={len(data.get('data') or [])}")
+        
+        cached = ASSESSMENT_STATS_CACHE.get(key)
+        if data.get('data'):
+            assert cached == data['data'], f"{key} was not cached"
+            print(f"  cached under {key}")
+        else:
+            assert cached is None, f"empty result cached under {key}"
+            print(f"  no completed attempts yet, nothing cached under {key}")
+
+if __name__ == "__main__":
+    test_assessment_statistics_cache()
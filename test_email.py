@@ -6,6 +6,7 @@ Run this to test if email sending is working properly
 
 import os
 import sys
+import logging
 from dotenv import load_dotenv
 
 # Add the current directory to Python path
@@ -14,6 +15,9 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # Load environment variables
 load_dotenv()
 
+# EmailService reports sends (and the console fallback) through logging
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
 from config import Config
 from auth_security import EmailService
 
@@ -75,6 +79,29 @@ def test_email_sending():
         print(f"❌ Email test error: {e}")
         return False
 
+def test_bulk_sending():
+    """Test sending a batch of emails over one SMTP session"""
+    print("\n📨 Testing Bulk Sending")
+    print("=" * 50)
+    
+    test_email = Config.SMTP_USERNAME  # Send to yourself for testing
+    messages = [
+        (test_email, f"{Config.APP_NAME} bulk test {i}", f"Bulk test message {i} of 2.")
+        for i in (1, 2)
+    ]
+    
+    try:
+        sent = EmailService.send_bulk(messages)
+        print(f"Sent {sent} of {len(messages)} messages over one SMTP session")
+        if sent == len(messages):
+            print("✅ Bulk sending completed successfully!")
+            return True
+        print("❌ Bulk sending failed (is email enabled and configured?)")
+        return False
+    except Exception as e:
+        print(f"❌ Bulk sending error: {e}")
+        return False
+
 def main():
     """Main test function"""
     print("🚀 OWASP Training Platform - Email Test")
@@ -86,13 +113,17 @@ def main():
     # Test email sending
     email_ok = test_email_sending()
     
+    # Test batch sending
+    bulk_ok = test_bulk_sending()
+    
     print("\n" + "=" * 60)
     print("📊 TEST RESULTS")
     print("=" * 60)
     print(f"Configuration: {'✅ PASS' if config_ok else '❌ FAIL'}")
     print(f"Email Sending: {'✅ PASS' if email_ok else '❌ FAIL'}")
+    print(f"Bulk Sending: {'✅ PASS' if bulk_ok else '❌ FAIL'}")
     
-    if config_ok and email_ok:
+    if config_ok and email_ok and bulk_ok:
         print("\n🎉 All tests passed! Email functionality is working.")
     else:
         print("\n⚠️  Some tests failed. Check the configuration above.")
@@ -105,6 +136,7 @@ def main():
     print("\n📧 Email Types Tested:")
     print("• Password Reset Email - Sent when users request password reset")
     print("• Welcome Email - Sent automatically after successful registration")
+    print("• Bulk Emails - Several messages sent over one SMTP session")
 
 if __name__ == "__main__":
     main()
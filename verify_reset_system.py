@@ -4,19 +4,17 @@ Verify Reset System - Test the user progress reset functionality
 """
 
 from database_postgresql import (
-    get_db_connection, get_dict_cursor, 
+    db_connection, get_dict_cursor, 
     reset_all_users_progress, complete_learning_activity
 )
 
 def test_database_connection():
     """Test if database connection works"""
     try:
-        conn = get_db_connection()
-        cursor = get_dict_cursor(conn)
-        cursor.execute('SELECT COUNT(*) as user_count FROM users WHERE is_active = TRUE')
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        # The connection goes back to the pool even if the query fails
+        with db_connection() as conn, get_dict_cursor(conn) as cursor:
+            cursor.execute('SELECT COUNT(*) as user_count FROM users WHERE is_active = TRUE')
+            result = cursor.fetchone()
         return True, result['user_count'] if result else 0
     except Exception as e:
         return False, str(e)
@@ -24,35 +22,31 @@ def test_database_connection():
 def get_user_stats_summary():
     """Get summary of current user stats"""
     try:
-        conn = get_db_connection()
-        cursor = get_dict_cursor(conn)
-        
-        # Get user stats
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_users,
-                SUM(xp) as total_xp,
-                AVG(xp) as avg_xp,
-                MAX(xp) as max_xp
-            FROM users WHERE is_active = TRUE
-        ''')
-        user_stats = cursor.fetchone()
-        
-        # Get progress stats
-        cursor.execute('SELECT COUNT(*) as total_progress FROM user_progress')
-        progress_stats = cursor.fetchone()
-        
-        # Get activity stats
-        cursor.execute('SELECT COUNT(*) as total_activities FROM learning_activities')
-        activity_stats = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
+        with db_connection() as conn, get_dict_cursor(conn) as cursor:
+            # User, progress and activity stats in one round trip
+            cursor.execute('''
+                SELECT 
+                    u.total_users,
+                    u.total_xp,
+                    u.avg_xp,
+                    u.max_xp,
+                    (SELECT COUNT(*) FROM user_progress) as total_progress,
+                    (SELECT COUNT(*) FROM learning_activities) as total_activities
+                FROM (
+                    SELECT 
+                        COUNT(*) as total_users,
+                        SUM(xp) as total_xp,
+                        AVG(xp) as avg_xp,
+                        MAX(xp) as max_xp
+                    FROM users WHERE is_active = TRUE
+                ) u
+            ''')
+            stats = cursor.fetchone()
         
         return {
-            'users': dict(user_stats) if user_stats else {},
-            'progress': dict(progress_stats) if progress_stats else {},
-            'activities': dict(activity_stats) if activity_stats else {}
+            'users': {key: stats[key] for key in ('total_users', 'total_xp', 'avg_xp', 'max_xp')},
+            'progress': {'total_progress': stats['total_progress']},
+            'activities': {'total_activities': stats['total_activities']}
         }
     except Exception as e:
         return {'error': str(e)}
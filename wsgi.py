@@ -0,0 +1,21 @@
+"""
+WSGI entry point for production deployments
+Run with: gunicorn -k gevent -w 4 --worker-connections 1000 -b 0.0.0.0:8855 wsgi:app
+"""
+
+# Patch the standard library before anything imports sockets, threads or psycopg2
+from gevent import monkey
+monkey.patch_all()
+
+# psycopg2 talks to PostgreSQL from C; make its waits yield to other greenlets
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+from app import app, start_log_listener  # noqa: E402
+
+start_log_listener()
+
+if __name__ == "__main__":
+    from gevent.pywsgi import WSGIServer
+    from config import Config
+    WSGIServer(("0.0.0.0", Config.PORT), app).serve_forever()